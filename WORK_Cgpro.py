@@ -1,12 +1,49 @@
+import time
+STARTED = time.perf_counter()  # for --startup-profile
 import tkinter as tk
-from tkinter import ttk, colorchooser, messagebox, filedialog, simpledialog
+from tkinter import ttk, messagebox
+import argparse
 import math
-import json
 import os
-from PIL import Image, ImageTk
+import sys
+from functools import partial
+from instrument import Probe, StartupProfile, instrumented
+from history import (History, CreateCommand, DeleteCommand, MoveCommand, GroupMoveCommand,
+                     RestyleCommand, ClearCommand, AddLayerCommand, RemoveLayerCommand,
+                     MoveLayerCommand, ChangeLayerCommand, diff_scene)
+from scene import Scene, Shape, Layer, CanvasView
+from layercache import LayerCache
+from memory import MemoryMonitor
+from journal import Journal, journal_path, pending_recovery, read_journal
+from scheduler import FrameScheduler
+from spatial import HIT_TOLERANCE
+from viewport import ZOOM_STEP
+# NumPy, Pillow, the file formats and the other dialogs are imported on first
+# use (see the functions below), so they do not slow down startup
+IMPORTED = time.perf_counter()
+
+# Undo history budget. Steps older than HISTORY_KEEP_STEPS are merged into
+# checkpoints and the oldest ones are dropped once either limit is exceeded.
+HISTORY_MAX_BYTES = 32 * 1024 * 1024
+HISTORY_MAX_ENTRIES = 2000
+HISTORY_KEEP_STEPS = 200
+
+# Mouse motion is handled at most this many times per second
+EVENT_FRAME_RATE = 60
+
+# While handler timings are shown, the overlay or status bar is updated this often
+HUD_MS = 500
+HUD_TAG = "hud"
+
+# Canvas tag of the markers of the polygon being drawn
+VERTEX_TAG = "vertex"
+
+# How the drawing is shown: "canvas" keeps a canvas item per shape on screen,
+# "raster" renders it into a single image
+RENDERERS = ("canvas", "raster")
 
 class DrawingApp:
-    def __init__(self, root):
+    def __init__(self, root, renderer="canvas", timings="off", trace_memory=False):
         self.root = root
         self.root.title("2D Drawing Application")
         
@@ -30,10 +67,11 @@ class DrawingApp:
         self.fill_color = "#ffffff"     # White
         self.start_x = None
         self.start_y = None
-        self.drawn_items = []
+        self.scene = Scene()  # the drawing itself; the canvas mirrors it
         self.line_width = 2
-        self.undo_stack = []
-        self.redo_stack = []
+        self.history = History(self.scene, max_bytes=HISTORY_MAX_BYTES, max_entries=HISTORY_MAX_ENTRIES,
+                               keep_steps=HISTORY_KEEP_STEPS)
+        self.frames = FrameScheduler(root, EVENT_FRAME_RATE)
         
         # Main frame
         self.main_frame = ttk.Frame(root, padding="10")
@@ -45,6 +83,17 @@ class DrawingApp:
         
         self.canvas = tk.Canvas(self.canvas_frame, width=800, height=600, bg="white")
         self.canvas.pack(expand=True, fill=tk.BOTH)
+        if renderer == "raster":
+            # One image, rendered again only where the drawing changed
+            from rasterview import RasterView
+            self.view = self.scene.view = RasterView(self.canvas)
+        else:
+            # Layers other than the active one are shown as cached images
+            self.view = self.scene.view = CanvasView(self.canvas, cache=LayerCache())
+        # Help > Memory Report; polygon markers and the timings overlay are the canvas items outside the view
+        self.memory = MemoryMonitor(self.scene, self.history, self.view, self.canvas, tags=(VERTEX_TAG, HUD_TAG))
+        if trace_memory:
+            self.memory.start_tracing()
         
         # Create menu bar
         self.menu_bar = tk.Menu(root)
@@ -55,15 +104,62 @@ class DrawingApp:
         self.menu_bar.add_cascade(label="File", menu=self.file_menu)
         self.file_menu.add_command(label="New", command=self.clear_canvas, accelerator="Ctrl+N")
         self.file_menu.add_command(label="Save", command=self.save_drawing, accelerator="Ctrl+S")
+        self.file_menu.add_command(label="Save Binary", command=self.save_drawing_binary)
         self.file_menu.add_command(label="Open", command=self.open_drawing, accelerator="Ctrl+O")
+        self.file_menu.add_command(label="Export PNG", command=self.export_png)
+        self.file_menu.add_command(label="Cancel Loading", command=self.cancel_loading, accelerator="Esc")
         self.file_menu.add_separator()
-        self.file_menu.add_command(label="Exit", command=root.quit, accelerator="Alt+F4")
+        self.file_menu.add_command(label="Exit", command=self.exit_app, accelerator="Alt+F4")
         
         # Edit menu
         self.edit_menu = tk.Menu(self.menu_bar, tearoff=0)
         self.menu_bar.add_cascade(label="Edit", menu=self.edit_menu)
         self.edit_menu.add_command(label="Undo", command=self.undo, accelerator="Ctrl+Z")
         self.edit_menu.add_command(label="Redo", command=self.redo, accelerator="Ctrl+Y")
+        self.edit_menu.add_separator()
+        self.edit_menu.add_command(label="History Usage", command=self.show_history_usage)
+        self.edit_menu.add_command(label="Event Statistics", command=self.show_event_statistics)
+        
+        # View menu
+        self.view_menu = tk.Menu(self.menu_bar, tearoff=0)
+        self.menu_bar.add_cascade(label="View", menu=self.view_menu)
+        self.view_menu.add_command(label="Zoom In", command=lambda: self.zoom(ZOOM_STEP), accelerator="Ctrl+=")
+        self.view_menu.add_command(label="Zoom Out", command=lambda: self.zoom(1 / ZOOM_STEP), accelerator="Ctrl+-")
+        self.view_menu.add_command(label="Reset View", command=self.reset_view, accelerator="Ctrl+0")
+        self.view_menu.add_separator()
+        
+        # Handler timings (see instrument.py), recorded only while they are shown
+        self.hud_mode = tk.StringVar(value=timings)
+        self.timings_menu = tk.Menu(self.view_menu, tearoff=0)
+        self.view_menu.add_cascade(label="Timings", menu=self.timings_menu)
+        self.timings_menu.add_radiobutton(label="Off", variable=self.hud_mode, value="off", command=self.set_hud)
+        self.timings_menu.add_radiobutton(label="In Status Bar", variable=self.hud_mode, value="status",
+                                          command=self.set_hud)
+        self.timings_menu.add_radiobutton(label="Overlay", variable=self.hud_mode, value="overlay",
+                                          command=self.set_hud)
+        self.timings_menu.add_separator()
+        self.timings_menu.add_command(label="Export Timings...", command=self.export_timings)
+        self.timings_menu.add_command(label="Export Trace...", command=lambda: self.export_timings(trace=True))
+        
+        # Layer menu; all but the active layer are drawn as cached images
+        self.layer_menu = tk.Menu(self.menu_bar, tearoff=0)
+        self.menu_bar.add_cascade(label="Layer", menu=self.layer_menu)
+        self.layer_menu.add_command(label="New Layer", command=self.new_layer)
+        self.layer_menu.add_command(label="Delete Layer", command=self.delete_layer)
+        self.layer_menu.add_command(label="Rename Layer...", command=self.rename_layer)
+        self.layer_menu.add_separator()
+        self.layer_menu.add_command(label="Move Layer Up", command=lambda: self.move_layer(1))
+        self.layer_menu.add_command(label="Move Layer Down", command=lambda: self.move_layer(-1))
+        self.layer_menu.add_separator()
+        self.layer_menu.add_command(label="Show/Hide Layer", command=self.toggle_layer_visible)
+        self.layer_menu.add_command(label="Lock/Unlock Layer", command=self.toggle_layer_locked)
+        
+        # Help menu
+        self.help_menu = tk.Menu(self.menu_bar, tearoff=0)
+        self.menu_bar.add_cascade(label="Help", menu=self.help_menu)
+        self.help_menu.add_command(label="Memory Report", command=self.show_memory_report)
+        self.help_menu.add_command(label="Mark Memory Snapshot", command=self.mark_memory)
+        self.help_menu.add_command(label="Export Memory Diff...", command=self.export_memory_diff)
         
         # Create toolbar with sections
         self.toolbar = ttk.Frame(self.main_frame)
@@ -98,6 +194,10 @@ class DrawingApp:
                                               command=lambda: self.set_shape("circle"), style='Tool.TButton')
         self.tool_buttons["circle"].pack(side=tk.LEFT, padx=2, pady=2)
         
+        self.tool_buttons["select"] = ttk.Button(self.tools_frame, text="Select", width=10,
+                                              command=lambda: self.set_shape("select"), style='Tool.TButton')
+        self.tool_buttons["select"].pack(side=tk.LEFT, padx=2, pady=2)
+        
         self.tool_buttons["polygon"] = ttk.Button(self.tools_frame, text="Polygon", width=10,
                                                command=lambda: self.set_shape("polygon"), style='Tool.TButton')
         self.tool_buttons["polygon"].pack(side=tk.LEFT, padx=2, pady=2)
@@ -137,6 +237,16 @@ class DrawingApp:
         
         add_separator()
         
+        # Layer section: the layer being edited
+        self.layer_frame = ttk.LabelFrame(self.toolbar, text="Layer")
+        self.layer_frame.pack(side=tk.LEFT, padx=5, pady=5, fill='y')
+        
+        self.layer_box = ttk.Combobox(self.layer_frame, state="readonly", width=18)
+        self.layer_box.pack(side=tk.LEFT, padx=5, pady=5)
+        self.layer_box.bind("<<ComboboxSelected>>", self.on_layer_selected)
+        
+        add_separator()
+        
         # Actions section
         self.actions_frame = ttk.LabelFrame(self.toolbar, text="Actions")
         self.actions_frame.pack(side=tk.LEFT, padx=5, pady=5, fill='y')
@@ -157,10 +267,19 @@ class DrawingApp:
         
         # Bind mouse events
         self.canvas.bind("<ButtonPress-1>", self.on_press)
+        self.canvas.bind("<Shift-ButtonPress-1>", lambda event: self.on_press(event, add=True))
         self.canvas.bind("<B1-Motion>", self.on_drag)
         self.canvas.bind("<ButtonRelease-1>", self.on_release)
         self.canvas.bind("<Double-1>", self.on_double_click)
         
+        # Zoom with the wheel (buttons 4 and 5 on X11), pan by dragging with the middle button
+        self.canvas.bind("<MouseWheel>", self.on_wheel)
+        self.canvas.bind("<Button-4>", self.on_wheel)
+        self.canvas.bind("<Button-5>", self.on_wheel)
+        self.canvas.bind("<ButtonPress-2>", self.on_pan_start)
+        self.canvas.bind("<B2-Motion>", self.on_pan)
+        self.canvas.bind("<Configure>", self.on_resize)
+        
         # Bind keyboard shortcuts
         self.root.bind("<Control-z>", lambda event: self.undo())
         self.root.bind("<Control-y>", lambda event: self.redo())
@@ -168,6 +287,10 @@ class DrawingApp:
         self.root.bind("<Control-n>", lambda event: self.clear_canvas())
         self.root.bind("<Control-s>", lambda event: self.save_drawing())
         self.root.bind("<Control-o>", lambda event: self.open_drawing())
+        self.root.bind("<Escape>", lambda event: self.cancel_loading())
+        self.root.bind("<Control-equal>", lambda event: self.zoom(ZOOM_STEP))
+        self.root.bind("<Control-minus>", lambda event: self.zoom(1 / ZOOM_STEP))
+        self.root.bind("<Control-0>", lambda event: self.reset_view())
         
         # Status bar
         self.status_frame = ttk.Frame(self.main_frame)
@@ -180,20 +303,101 @@ class DrawingApp:
         self.coords_label = ttk.Label(self.status_frame, text="", relief=tk.SUNKEN, width=15)
         self.coords_label.pack(side=tk.RIGHT)
         
+        # Undo history size display
+        self.history_label = ttk.Label(self.status_frame, text="", relief=tk.SUNKEN, width=24)
+        self.history_label.pack(side=tk.RIGHT)
+        
         # Update coordinates on mouse movement
-        self.canvas.bind("<Motion>", self.update_coords)
+        self.canvas.bind("<Motion>", self.frames.coalesce(self.update_coords))
         
         # Temporary shape for preview
         self.temp_shape = None
-        self.selected_item = None
+        self.selected_shape = None  # the shape last added to the selection
+        self.selection = set()  # every selected shape
+        self.dragging = False  # True while the selection is being dragged
+        self.marquee = None  # rubber-band rectangle of the Select tool
+        self.move_dx = 0  # Total movement of the selection during a drag
+        self.move_dy = 0
         self.polygon_points = []
+        self.pan_x = self.pan_y = None  # last pointer position of a middle-button pan
+        self.loader = None  # DrawingLoader while a file is being opened
+        self.saver = None  # DrawingSaver while a file is being written
+        self.queued_save = None  # (path, snapshot) of a save waiting for the current one
+        self.exporter = None  # DrawingSaver while a PNG is being exported
+        self.file_path = None  # the document last opened or saved
+        self.journal = None
+        self.probe = None  # instrument.Probe timing the handlers while View > Timings is on
+        self.timings = None  # the last Probe, kept for export after timing stops
+        self.hud_after = None  # after() id of the next timings update
         
         # Update initial UI state
         self.update_tool_buttons()
+        self.update_layer_list()
+        
+        # Autosave every change, after offering to recover a crashed session
+        self.root.protocol("WM_DELETE_WINDOW", self.exit_app)
+        self.recover_journal()
+        self.start_journal()
+        self.set_hud()
     
     def update_coords(self, event):
         """Update coordinates display in status bar"""
-        self.coords_label.config(text=f"X: {event.x}, Y: {event.y}")
+        x, y = self.to_world(event)
+        self.coords_label.config(text=f"X: {x:.0f}, Y: {y:.0f}")
+    
+    def to_world(self, event):
+        """Return the drawing coordinates under the mouse"""
+        return self.view.viewport.to_world(event.x, event.y)
+    
+    def on_wheel(self, event):
+        # Windows and macOS report a wheel delta, X11 buttons 4 (up) and 5 (down)
+        up = event.num == 4 if event.num in (4, 5) else event.delta > 0
+        self.zoom(ZOOM_STEP if up else 1 / ZOOM_STEP, event.x, event.y)
+    
+    def zoom(self, factor, x=None, y=None):
+        """Zoom around a window point, by default the middle of the window"""
+        viewport = self.view.viewport
+        if x is None:
+            x, y = viewport.width / 2, viewport.height / 2
+        viewport.zoom_at(x, y, factor)
+        self.frames.submit(self.refresh_view, None)
+    
+    def reset_view(self):
+        self.view.viewport.reset()
+        self.frames.submit(self.refresh_view, None)
+    
+    def on_pan_start(self, event):
+        self.pan_x, self.pan_y = event.x, event.y
+    
+    def on_pan(self, event):
+        if self.pan_x is None:
+            return
+        self.view.viewport.pan(event.x - self.pan_x, event.y - self.pan_y)
+        self.pan_x, self.pan_y = event.x, event.y
+        self.frames.submit(self.refresh_view, event)
+    
+    def on_resize(self, event):
+        self.view.viewport.resize(event.width, event.height)
+        self.frames.submit(self.refresh_view, event)
+    
+    @instrumented()
+    def refresh_view(self, event):
+        """Redraw the canvas after the viewport zoomed, panned or resized; at most once per frame"""
+        self.view.refresh()
+        self.canvas.delete(VERTEX_TAG)
+        for x, y in zip(self.polygon_points[0::2], self.polygon_points[1::2]):
+            self.draw_vertex(x, y)
+        self.status_bar.config(text=f"Zoom {self.view.viewport.zoom:.0%}")
+    
+    def draw_vertex(self, x, y):
+        """Draw a small circle marking a polygon point"""
+        sx, sy = self.view.viewport.to_screen((x, y))
+        self.canvas.create_oval(sx-3, sy-3, sx+3, sy+3, fill=self.current_color, outline="", tags=VERTEX_TAG)
+        
+    def clear_polygon(self):
+        """Forget the points of the polygon being drawn, and their markers"""
+        self.canvas.delete(VERTEX_TAG)
+        self.polygon_points = []
         
     def update_tool_buttons(self):
         """Update tool button styling based on selected shape"""
@@ -212,19 +416,27 @@ class DrawingApp:
         
         # Reset polygon points if changing from polygon
         if shape != "polygon":
-            self.polygon_points = []
+            self.clear_polygon()
     
     def choose_color(self):
+        from tkinter import colorchooser
         color = colorchooser.askcolor(initialcolor=self.current_color)
         if color[1]:
             self.current_color = color[1]
             self.outline_preview.config(bg=self.current_color)
+            # Recolor the selected shape as well
+            if self.selected_shape:
+                key = "fill" if self.selected_shape.kind == "line" else "outline"
+                self.restyle_selected(**{key: self.current_color})
     
     def choose_fill_color(self):
+        from tkinter import colorchooser
         color = colorchooser.askcolor(initialcolor=self.fill_color if self.fill_color else "#ffffff")
         if color[1]:
             self.fill_color = color[1]
             self.fill_preview.config(bg=self.fill_color)
+            if self.selected_shape and self.selected_shape.kind != "line":
+                self.restyle_selected(fill=self.fill_color)
     
     def update_line_width(self):
         try:
@@ -232,274 +444,612 @@ class DrawingApp:
         except ValueError:
             self.line_width = 2
             self.width_var.set("2")
+        if self.selected_shape:
+            self.restyle_selected(width=self.line_width)
+    
+    def restyle_selected(self, **style):
+        """Apply style options to the selected shape as one undoable edit"""
+        shape = self.selected_shape
+        if shape not in self.scene:
+            return
+        before = {key: getattr(shape, key) for key in style}
+        self.scene.restyle(shape, **style)
+        self.view.highlight(shape, True)
+        self.save_state(RestyleCommand(shape, before, style))
+    
+    def layer_label(self, layer):
+        flags = [word for word, on in (("hidden", not layer.visible), ("locked", layer.locked)) if on]
+        return layer.name + (f" ({', '.join(flags)})" if flags else "")
+    
+    def update_layer_list(self):
+        """List the layers, top first, with the active one chosen"""
+        layers = self.scene.layers[::-1]
+        self.layer_box.config(values=[self.layer_label(layer) for layer in layers])
+        self.layer_box.current(layers.index(self.scene.active))
+    
+    def on_layer_selected(self, event):
+        self.set_active_layer(self.scene.layers[-1 - self.layer_box.current()])
+    
+    def set_active_layer(self, layer):
+        """Edit another layer; the one left is drawn as an image from now on"""
+        if self.loader:
+            self.update_layer_list()
+            return
+        self.deselect()
+        self.scene.activate(layer)
+        self.update_layer_list()
+        self.status_bar.config(text=f"Editing {self.layer_label(layer)}")
+    
+    def new_layer(self):
+        """Add an empty layer above the active one and edit it"""
+        if self.loader:
+            return
+        names = {layer.name for layer in self.scene.layers}
+        number = len(self.scene.layers) + 1
+        while f"Layer {number}" in names:
+            number += 1
+        layer = Layer(f"Layer {number}")
+        position = self.scene.layers.index(self.scene.active) + 1
+        self.scene.add_layer(layer, position)
+        self.save_state(AddLayerCommand(layer, position))
+        self.set_active_layer(layer)
+    
+    def delete_layer(self):
+        """Delete the active layer and its shapes"""
+        if self.loader:
+            return
+        layer = self.scene.active
+        if len(self.scene.layers) == 1:
+            messagebox.showinfo("Delete Layer", "A drawing needs at least one layer.")
+            return
+        if layer.shapes and not messagebox.askyesno(
+                "Confirm", f"Delete {layer.name} and its {len(layer.shapes)} shapes?"):
+            return
+        self.deselect()
+        position = self.scene.layers.index(layer)
+        removed = sorted(layer.shapes, key=lambda shape: shape.seq)
+        for shape in removed:
+            self.scene.remove(shape)
+        self.scene.remove_layer(layer)
+        self.save_state(RemoveLayerCommand(layer, position, removed))
+        self.update_layer_list()
+    
+    def move_layer(self, step):
+        """Restack the active layer ``step`` places up (or down, if negative)"""
+        layer = self.scene.active
+        old = self.scene.layers.index(layer)
+        position = old + step
+        if self.loader or not 0 <= position < len(self.scene.layers):
+            return
+        self.scene.move_layer(layer, position)
+        self.save_state(MoveLayerCommand(layer, old, position))
+        self.update_layer_list()
+    
+    def change_layer(self, **props):
+        """Change the active layer's name, visibility or lock as one undoable edit"""
+        if self.loader:
+            return
+        layer = self.scene.active
+        before = {key: getattr(layer, key) for key in props}
+        self.deselect()
+        self.scene.change_layer(layer, **props)
+        self.save_state(ChangeLayerCommand(layer, before, props))
+        self.update_layer_list()
+    
+    def rename_layer(self):
+        from tkinter import simpledialog
+        name = simpledialog.askstring("Rename Layer", "Layer name:", initialvalue=self.scene.active.name)
+        if name:
+            self.change_layer(name=name)
+    
+    def toggle_layer_visible(self):
+        self.change_layer(visible=not self.scene.active.visible)
+    
+    def toggle_layer_locked(self):
+        self.change_layer(locked=not self.scene.active.locked)
     
     def clear_canvas(self):
-        if self.drawn_items and messagebox.askyesno("Confirm", "Are you sure you want to clear the canvas?"):
-            self.save_state()
-            self.canvas.delete("all")
-            self.drawn_items = []
-            self.polygon_points = []
+        if self.loader:
+            return
+        if len(self.scene) and messagebox.askyesno("Confirm", "Are you sure you want to clear the canvas?"):
+            self.deselect()
+            removed = self.scene.ordered()
+            for shape in removed:
+                self.scene.remove(shape)
+            self.save_state(ClearCommand(removed))
+            self.clear_polygon()
     
+    @instrumented()
     def delete_selected(self):
-        if self.selected_item:
-            self.save_state()
-            self.canvas.delete(self.selected_item)
-            if self.selected_item in self.drawn_items:
-                self.drawn_items.remove(self.selected_item)
-            self.selected_item = None
-    
-    def save_state(self):
-        # Save current state for undo
-        state = []
-        for item_id in self.drawn_items:
-            item_type = self.canvas.type(item_id)
-            coords = self.canvas.coords(item_id)
-            options = {}
-            
-            if item_type in ["line", "oval", "rectangle", "polygon"]:  # Remove "text"
-                options["fill"] = self.canvas.itemcget(item_id, "fill")
-                options["width"] = self.canvas.itemcget(item_id, "width")
-                
-                if item_type != "line":
-                    options["outline"] = self.canvas.itemcget(item_id, "outline")
-            
-            state.append((item_type, coords, options))
-        
-        self.undo_stack.append(state)
-        self.redo_stack = []  # Clear redo stack when a new action is performed
+        if self.selection and not self.loader:
+            shapes = sorted(self.selection, key=lambda shape: shape.seq)
+            self.deselect()
+            for shape in shapes:
+                self.scene.remove(shape)
+            self.save_state(DeleteCommand(shapes[0]) if len(shapes) == 1 else ClearCommand(shapes))
     
+    def select(self, shape, add=False):
+        """Select a shape; with ``add`` (Shift+click) toggle it in the current selection"""
+        if not add:
+            self.deselect()
+        elif shape in self.selection:
+            self.selection.discard(shape)
+            self.view.select([shape], False)
+            if shape is self.selected_shape:
+                self.selected_shape = next(iter(self.selection), None)
+            return
+        self.select_shapes([shape])
+    
+    def select_shapes(self, shapes):
+        """Add shapes to the selection"""
+        shapes = [shape for shape in shapes if shape not in self.selection]
+        if not shapes:
+            return
+        self.selection.update(shapes)
+        self.selected_shape = shapes[-1]
+        self.move_dx = self.move_dy = 0
+        # Highlight the selected shapes and tag them for group moves
+        self.view.select(shapes, True)
+    
+    def deselect(self):
+        """Clear the selection and its highlight"""
+        if self.selection:
+            self.view.select(self.selection, False)
+            self.selection.clear()
+        self.selected_shape = None
+    
+    def add_shape(self, shape):
+        """Add a newly drawn shape to the drawing and record it for undo"""
+        self.scene.add(shape)
+        self.save_state(CreateCommand(shape))
+    
+    @instrumented()
+    def save_state(self, command):
+        """Record an edit on the undo history"""
+        self.history.push(command)
+        self.update_history_label()
+    
+    @instrumented()
     def undo(self):
-        if not self.undo_stack:
+        if self.loader:
             return
-        
-        # Save current state for redo
-        current_state = []
-        for item_id in self.drawn_items:
-            item_type = self.canvas.type(item_id)
-            coords = self.canvas.coords(item_id)
-            options = {}
-            
-            if item_type in ["line", "oval", "rectangle", "polygon"]:  # Remove "text"
-                options["fill"] = self.canvas.itemcget(item_id, "fill")
-                options["width"] = self.canvas.itemcget(item_id, "width")
-                
-                if item_type != "line":
-                    options["outline"] = self.canvas.itemcget(item_id, "outline")
-            
-            current_state.append((item_type, coords, options))
-        
-        self.redo_stack.append(current_state)
-        
-        # Restore previous state
-        previous_state = self.undo_stack.pop()
-        self.canvas.delete("all")
-        self.drawn_items = []
-        
-        for item_type, coords, options in previous_state:
-            if item_type == "line":
-                item = self.canvas.create_line(coords, fill=options["fill"], width=options["width"])
-            elif item_type == "rectangle":
-                item = self.canvas.create_rectangle(coords, outline=options["outline"], 
-                                                  fill=options["fill"], width=options["width"])
-            elif item_type == "oval":
-                item = self.canvas.create_oval(coords, outline=options["outline"], 
-                                             fill=options["fill"], width=options["width"])
-            elif item_type == "polygon":
-                item = self.canvas.create_polygon(coords, outline=options["outline"], 
-                                                fill=options["fill"], width=options["width"])
-            
-            self.drawn_items.append(item)
+        self.deselect()
+        self.history.undo()
+        self.update_history_label()
+        self.update_layer_list()
     
+    @instrumented()
     def redo(self):
-        if not self.redo_stack:
+        if self.loader:
             return
-        
-        # Save current state for undo
-        current_state = []
-        for item_id in self.drawn_items:
-            item_type = self.canvas.type(item_id)
-            coords = self.canvas.coords(item_id)
-            options = {}
-            
-            if item_type in ["line", "oval", "rectangle", "polygon"]:  # Remove "text"
-                options["fill"] = self.canvas.itemcget(item_id, "fill")
-                options["width"] = self.canvas.itemcget(item_id, "width")
-                
-                if item_type != "line":
-                    options["outline"] = self.canvas.itemcget(item_id, "outline")
-            
-            current_state.append((item_type, coords, options))
-        
-        self.undo_stack.append(current_state)
-        
-        # Restore next state
-        next_state = self.redo_stack.pop()
-        self.canvas.delete("all")
-        self.drawn_items = []
-        
-        for item_type, coords, options in next_state:
-            if item_type == "line":
-                item = self.canvas.create_line(coords, fill=options["fill"], width=options["width"])
-            elif item_type == "rectangle":
-                item = self.canvas.create_rectangle(coords, outline=options["outline"], 
-                                                  fill=options["fill"], width=options["width"])
-            elif item_type == "oval":
-                item = self.canvas.create_oval(coords, outline=options["outline"], 
-                                             fill=options["fill"], width=options["width"])
-            elif item_type == "polygon":
-                item = self.canvas.create_polygon(coords, outline=options["outline"], 
-                                                fill=options["fill"], width=options["width"])
-            
-            self.drawn_items.append(item)
+        self.deselect()
+        self.history.redo()
+        self.update_history_label()
+        self.update_layer_list()
+    
+    def update_history_label(self):
+        """Show how many undo steps the history holds and its estimated size"""
+        report = self.history.report()
+        self.history_label.config(text=f"Undo: {report['undo_steps']} ({report['bytes'] / 1024:.0f} KB)")
+    
+    def show_history_usage(self):
+        report = self.history.report()
+        messagebox.showinfo("History Usage",
+                            f"Undo steps: {report['undo_steps']} ({report['checkpoints']} checkpoints)\n"
+                            f"Redo steps: {report['redo_steps']}\n"
+                            f"Dropped steps: {report['dropped']}\n"
+                            f"Removed shapes kept for undo: {report['removed_shapes']}\n"
+                            f"Estimated size: {report['bytes'] / 1024:.1f} KB "
+                            f"of {HISTORY_MAX_BYTES / (1024 * 1024):.0f} MB")
+    
+    def show_event_statistics(self):
+        report = self.frames.report()
+        messagebox.showinfo("Event Statistics",
+                            f"Motion events: {report['events']}\n"
+                            f"Handled: {report['handled']} in {report['frames']} frames "
+                            f"(at most {report['rate']} per second)\n"
+                            f"Coalesced: {report['coalesced']}\n"
+                            f"Dropped: {report['dropped']}")
+    
+    def show_memory_report(self):
+        messagebox.showinfo("Memory Report", "\n".join(self.memory.summary()))
     
-    def save_drawing(self):
-        file_path = filedialog.asksaveasfilename(defaultextension=".json", 
-                                               filetypes=[("JSON files", "*.json"), ("All files", "*.*")])
+    def mark_memory(self):
+        """Remember the memory now, for Export Memory Diff to compare with"""
+        self.memory.mark()
+        self.status_bar.config(text="Memory snapshot taken; allocations are traced from now on")
+    
+    def export_memory_diff(self):
+        """Write what changed in memory since Mark Memory Snapshot to a text file"""
+        lines = self.memory.diff()
+        if lines is None:
+            messagebox.showinfo("Memory", "Take a snapshot with Help > Mark Memory Snapshot first.")
+            return
+        from tkinter import filedialog
+        file_path = filedialog.asksaveasfilename(defaultextension=".txt",
+                                                 filetypes=[("Text files", "*.txt"), ("All files", "*.*")])
         if not file_path:
             return
-        
-        drawing_data = []
-        for item_id in self.drawn_items:
-            item_type = self.canvas.type(item_id)
-            coords = self.canvas.coords(item_id)
-            options = {}
-            
-            if item_type in ["line", "oval", "rectangle", "polygon"]:  # Remove "text"
-                options["fill"] = self.canvas.itemcget(item_id, "fill")
-                options["width"] = self.canvas.itemcget(item_id, "width")
-                
-                if item_type != "line":
-                    options["outline"] = self.canvas.itemcget(item_id, "outline")
-            
-            drawing_data.append({"type": item_type, "coords": coords, "options": options})
-        
-        with open(file_path, 'w') as f:
-            json.dump(drawing_data, f)
-        
-        messagebox.showinfo("Success", f"Drawing saved to {file_path}")
+        try:
+            with open(file_path, "w") as f:
+                f.write("\n".join(lines) + "\n")
+            self.status_bar.config(text=f"Memory diff exported to {file_path}")
+        except OSError as e:
+            messagebox.showerror("Error", f"Failed to export the memory diff: {str(e)}")
     
-    def open_drawing(self):
-        file_path = filedialog.askopenfilename(filetypes=[("JSON files", "*.json"), ("All files", "*.*")])
+    def set_hud(self):
+        """Start or stop timing the handlers as View > Timings says"""
+        self.canvas.delete(HUD_TAG)
+        if self.hud_mode.get() == "off":
+            if self.probe:
+                self.probe.stop()
+                self.probe = None
+                self.status_bar.config(text="Ready")
+            return
+        if self.probe is None:
+            self.probe = self.timings = Probe(self.canvas, self.view)
+            self.probe.start()
+        if self.hud_after is None:
+            self.update_hud()
+    
+    def update_hud(self):
+        """Show the latest timings in the overlay or the status bar, every HUD_MS while they are on"""
+        self.hud_after = None
+        if self.probe is None:
+            return
+        if self.hud_mode.get() == "overlay":
+            if not self.canvas.find_withtag(HUD_TAG):
+                self.canvas.create_rectangle(0, 0, 0, 0, fill="#ffffe0", outline="#808080", tags=(HUD_TAG, "hud_box"))
+                self.canvas.create_text(8, 8, anchor="nw", font=("Courier", 9), tags=(HUD_TAG, "hud_text"))
+            self.canvas.itemconfig("hud_text", text="\n".join(self.probe.summary()))
+            x1, y1, x2, y2 = self.canvas.bbox("hud_text")
+            self.canvas.coords("hud_box", x1 - 4, y1 - 4, x2 + 4, y2 + 4)
+            self.canvas.tag_raise(HUD_TAG)
+        else:
+            self.status_bar.config(text=self.probe.status())
+        self.hud_after = self.root.after(HUD_MS, self.update_hud)
+    
+    def export_timings(self, trace=False):
+        """Write the handler timings as JSON, or the latest calls as a Chrome trace"""
+        if self.timings is None:
+            messagebox.showinfo("Timings", "Turn on View > Timings to record handler timings first.")
+            return
+        from tkinter import filedialog
+        file_path = filedialog.asksaveasfilename(defaultextension=".json",
+                                                 filetypes=[("JSON files", "*.json"), ("All files", "*.*")])
         if not file_path:
             return
-        
         try:
-            with open(file_path, 'r') as f:
-                drawing_data = json.load(f)
-            
-            self.save_state()  # Save current state for undo
-            self.canvas.delete("all")
-            self.drawn_items = []
-            
-            for item_data in drawing_data:
-                item_type = item_data["type"]
-                coords = item_data["coords"]
-                options = item_data["options"]
-                
-                if item_type == "line":
-                    item = self.canvas.create_line(coords, fill=options["fill"], width=options["width"])
-                elif item_type == "rectangle":
-                    item = self.canvas.create_rectangle(coords, outline=options["outline"], 
-                                                      fill=options["fill"], width=options["width"])
-                elif item_type == "oval":
-                    item = self.canvas.create_oval(coords, outline=options["outline"], 
-                                                 fill=options["fill"], width=options["width"])
-                elif item_type == "polygon":
-                    item = self.canvas.create_polygon(coords, outline=options["outline"], 
-                                                    fill=options["fill"], width=options["width"])
-                
-                self.drawn_items.append(item)
-            
-            messagebox.showinfo("Success", f"Drawing loaded from {file_path}")
+            if trace:
+                self.timings.write_trace(file_path)
+            else:
+                self.timings.write_json(file_path)
+            self.status_bar.config(text=f"Timings exported to {file_path}")
+        except OSError as e:
+            messagebox.showerror("Error", f"Failed to export timings: {str(e)}")
+    
+    def save_drawing(self, default_extension=".json"):
+        if self.loader:
+            return
+        from tkinter import filedialog
+        import binformat
+        file_path = filedialog.asksaveasfilename(defaultextension=default_extension, 
+                                               filetypes=[("JSON files", "*.json"),
+                                                          ("Binary drawings", "*" + binformat.EXTENSION),
+                                                          ("All files", "*.*")])
+        if not file_path:
+            return
         
+        # The snapshot is immutable, so the file is written in the background while editing goes on
+        snapshot = self.snapshot()
+        if self.saver:
+            # Saves are written one at a time so an older one can never land last
+            self.queued_save = (file_path, snapshot)
+            self.status_bar.config(text=f"Save of {os.path.basename(file_path)} queued...")
+            return
+        self.start_save(file_path, snapshot)
+    
+    def start_journal(self, base=None):
+        """Record every change in a journal next to the current document
+
+        ``base`` is the drawing the journal starts from, if already known (see Journal.start).
+        """
+        if self.journal:
+            self.journal.close(discard=True)
+        self.journal = Journal(self.scene, journal_path(self.file_path), self.file_path)
+        self.journal.start(base)
+        self.scene.journal = self.journal
+    
+    def recover_journal(self):
+        """Offer to replay the journal of a session that did not exit cleanly"""
+        recovery = pending_recovery()
+        if not recovery:
+            return
+        if not messagebox.askyesno("Recover Drawing", "The application did not close properly last time.\n"
+                                                      "Do you want to recover the unsaved drawing?"):
+            recovery.discard()
+            return
+        try:
+            self.file_path, items = read_journal(recovery.path)
+            self.save_state(diff_scene(self.scene, items))
+            self.update_layer_list()
+            self.status_bar.config(text=f"Recovered {len(self.scene)} shapes from {recovery.path}")
         except Exception as e:
-            messagebox.showerror("Error", f"Failed to load drawing: {str(e)}")
-    
-    def on_press(self, event):
-        self.start_x = event.x
-        self.start_y = event.y
-        
-        # Check if clicking on an existing item
-        clicked_items = self.canvas.find_withtag("current")
-        if clicked_items and self.current_shape != "polygon":  # Remove text check
-            self.selected_item = clicked_items[0]
-            # Highlight the selected item
-            self.canvas.itemconfig(self.selected_item, width=self.line_width+2)
+            recovery.release()
+            messagebox.showerror("Error", f"Failed to recover drawing: {str(e)}")
+            return
+        # The journal started next replaces the recovered one
+        recovery.adopt()
+    
+    def exit_app(self):
+        # A clean exit leaves nothing to recover
+        if self.journal:
+            self.journal.close(discard=True)
+        self.root.quit()
+    
+    @instrumented()
+    def snapshot(self):
+        """Return the snapshot of the scene a save or export writes"""
+        return self.scene.snapshot()
+    
+    def start_save(self, file_path, snapshot):
+        from saver import DrawingSaver
+        self.saver = DrawingSaver(self.root, file_path, snapshot, self.on_save_done)
+        self.saver.probe = self.probe
+        self.status_bar.config(text=f"Saving {os.path.basename(file_path)}...")
+        self.saver.start()
+    
+    @instrumented()
+    def on_save_done(self, saver, error):
+        self.saver = None
+        if error is not None:
+            self.status_bar.config(text="Save failed")
+            messagebox.showerror("Error", f"Failed to save drawing: {str(error)}")
+        else:
+            self.status_bar.config(text=f"Drawing saved to {saver.path}")
+            if saver.path != self.file_path:
+                # The journal follows the document; its writer moves it without a new snapshot
+                self.file_path = saver.path
+                if self.journal:
+                    self.journal.relocate(saver.path)
+                else:
+                    self.start_journal()
+        if self.queued_save:
+            file_path, snapshot = self.queued_save
+            self.queued_save = None
+            self.start_save(file_path, snapshot)
+    
+    def export_png(self):
+        if self.loader:
+            return
+        if self.exporter:
+            self.status_bar.config(text="An export is already running")
+            return
+        from tkinter import filedialog
+        file_path = filedialog.asksaveasfilename(defaultextension=".png",
+                                                 filetypes=[("PNG images", "*.png"), ("All files", "*.*")])
+        if not file_path:
+            return
+        # The image holds the whole drawing and at least what the window shows
+        x1, y1, x2, y2 = self.view.viewport.visible()
+        canvas_box = (math.floor(x1), math.floor(y1), math.ceil(x2), math.ceil(y2))
+        import render
+        from saver import DrawingSaver
+        self.exporter = DrawingSaver(self.root, file_path, self.snapshot(), self.on_export_done,
+                                     save=partial(render.export_snapshot, canvas_box=canvas_box))
+        self.exporter.probe = self.probe
+        self.status_bar.config(text=f"Exporting {os.path.basename(file_path)}...")
+        self.exporter.start()
+    
+    def on_export_done(self, exporter, error):
+        self.exporter = None
+        if error is not None:
+            self.status_bar.config(text="Export failed")
+            messagebox.showerror("Error", f"Failed to export image: {str(error)}")
+        else:
+            self.status_bar.config(text=f"Image exported to {exporter.path}")
+    
+    def save_drawing_binary(self):
+        import binformat
+        self.save_drawing(default_extension=binformat.EXTENSION)
+    
+    def open_drawing(self):
+        if self.loader:
+            return
+        from tkinter import filedialog
+        import binformat
+        file_path = filedialog.askopenfilename(filetypes=[("Drawings", "*.json *" + binformat.EXTENSION),
+                                                          ("All files", "*.*")])
+        if not file_path:
+            return
+        
+        self.deselect()
+        self.clear_polygon()
+        # The file is parsed in the background and drawn in batches; edits wait until it is done.
+        # Only the shapes that differ from the current drawing are touched.
+        # The journal restarts from the loaded drawing instead of logging every shape.
+        self.scene.journal = None
+        from loader import DrawingLoader
+        self.loader = DrawingLoader(self.root, self.scene, file_path,
+                                    self.on_loading_progress, self.on_loading_done)
+        self.loader.probe = self.probe
+        self.status_bar.config(text=f"Loading {os.path.basename(file_path)}... (Esc to cancel)")
+        self.loader.start()
+    
+    def on_loading_progress(self, loaded, fraction):
+        name = os.path.basename(self.loader.path)
+        self.status_bar.config(text=f"Loading {name}: {fraction:.0%} ({loaded} shapes, Esc to cancel)")
+    
+    @instrumented()
+    def on_loading_done(self, command, error):
+        path = self.loader.path
+        name = os.path.basename(path)
+        diff = self.loader.diff
+        self.loader = None
+        if command is not None:
+            self.save_state(command)
+            self.update_layer_list()
+            self.status_bar.config(text=f"Loaded {name} ({len(self.scene)} shapes)")
+            self.file_path = path
+            # The loader collected the drawing as it went: no walk over the scene here
+            self.start_journal(diff.base())
+            return
+        self.scene.journal = self.journal
+        if error is not None:
+            self.status_bar.config(text="Ready")
+            messagebox.showerror("Error", f"Failed to load drawing: {str(error)}")
+        else:
+            self.status_bar.config(text="Loading cancelled")
+    
+    def cancel_loading(self):
+        """Stop opening a file and keep the previous drawing"""
+        if self.loader:
+            self.loader.cancel()
+    
+    def layer_editable(self):
+        """Return True if the active layer can be edited, else say why not"""
+        layer = self.scene.active
+        if not layer.editable():
+            self.status_bar.config(text=f"{self.layer_label(layer)} cannot be edited")
+        return layer.editable()
+    
+    @instrumented()
+    def on_press(self, event, add=False):
+        if self.loader or not self.layer_editable():
+            return
+        x, y = self.to_world(event)
+        self.start_x = x
+        self.start_y = y
+        
+        # Check if clicking on an existing shape; the hit tolerance is in window pixels
+        clicked = self.scene.index.shape_at(x, y, HIT_TOLERANCE / self.view.viewport.zoom)
+        if clicked and self.current_shape != "polygon":  # Remove text check
+            # Pressing a selected shape keeps the selection, so the whole group can be dragged
+            if add or clicked not in self.selection:
+                self.select(clicked, add)
+            self.dragging = clicked in self.selection
+            if not self.dragging:
+                # Shift+click took the shape out of the selection: nothing to drag
+                self.start_x = self.start_y = None
+        elif add or self.current_shape == "select":
+            # Rubber-band selection; Shift adds to the current selection
+            if not add:
+                self.deselect()
+            self.marquee = self.canvas.create_rectangle(event.x, event.y, event.x, event.y,
+                                                        outline="#3366ff", dash=(4, 2))
         else:
             # Deselect previously selected item
-            if self.selected_item:
-                self.canvas.itemconfig(self.selected_item, width=self.line_width)
-                self.selected_item = None
+            self.deselect()
             
             # For polygon, add point
             if self.current_shape == "polygon":
-                self.polygon_points.extend([event.x, event.y])
-                # Draw a small circle to mark the point
-                self.canvas.create_oval(event.x-3, event.y-3, event.x+3, event.y+3, 
-                                      fill=self.current_color, outline="")
+                self.polygon_points.extend([x, y])
+                self.draw_vertex(x, y)
+            else:
+                self.start_preview(x, y)
     
+    @instrumented()
     def on_double_click(self, event):
+        if self.loader or not self.layer_editable():
+            return
         if self.current_shape == "polygon" and len(self.polygon_points) >= 6:  # At least 3 points (6 coordinates)
-            self.save_state()
-            item = self.canvas.create_polygon(self.polygon_points, outline=self.current_color, 
-                                            fill=self.fill_color, width=self.line_width)
-            self.drawn_items.append(item)
-            self.polygon_points = []  # Reset for next polygon
+            self.add_shape(Shape("polygon", self.polygon_points, outline=self.current_color, 
+                                 fill=self.fill_color, width=self.line_width))
+            self.clear_polygon()  # Reset for next polygon
     
+    @instrumented()
     def on_drag(self, event):
+        # Mice can report motion much faster than the screen refreshes: only
+        # the latest event of each frame is handled
+        self.frames.submit(self.drag_to, event)
+    
+    @instrumented()
+    def drag_to(self, event):
         if self.start_x is None or self.start_y is None:
             return
+        x, y = self.to_world(event)
         
-        # If an item is selected, move it
-        if self.selected_item and self.current_shape != "polygon":  # Remove text check
+        # If shapes are selected, move them: one canvas call for the shared tag,
+        # the drawing itself is only updated on release
+        if self.dragging:
             # Calculate movement
-            dx = event.x - self.start_x
-            dy = event.y - self.start_y
-            self.canvas.move(self.selected_item, dx, dy)
-            self.start_x = event.x
-            self.start_y = event.y
+            dx = x - self.start_x
+            dy = y - self.start_y
+            self.view.drag_selection(dx, dy)
+            self.move_dx += dx
+            self.move_dy += dy
+            self.start_x = x
+            self.start_y = y
             return
         
-        # Skip preview for polygon
-        if self.current_shape == "polygon":  # Remove text check
+        if self.marquee:
+            self.canvas.coords(self.marquee, *self.view.viewport.to_screen((self.start_x, self.start_y, x, y)))
             return
         
-        # Delete previous temporary shape
+        # Move the preview created on press
+        if self.temp_shape:
+            self.canvas.coords(self.temp_shape, *self.view.viewport.to_screen(self.preview_coords(x, y)))
+    
+    def preview_coords(self, x, y):
+        """Return the coords of the drag preview with the pointer at (x, y)"""
+        if self.current_shape == "circle":
+            # Calculate radius for circle (using DDA-like approach)
+            radius = math.sqrt((x - self.start_x)**2 + (y - self.start_y)**2)
+            return (self.start_x - radius, self.start_y - radius,
+                    self.start_x + radius, self.start_y + radius)
+        return (self.start_x, self.start_y, x, y)
+    
+    def start_preview(self, x, y):
+        """Create the drag preview item once; dragging only updates its coords"""
         if self.temp_shape:
             self.canvas.delete(self.temp_shape)
-        
-        # Draw temporary shape based on current selection
+            self.temp_shape = None
+        coords = self.view.viewport.to_screen(self.preview_coords(x, y))
+        width = self.line_width * self.view.viewport.zoom
         if self.current_shape == "line":
             self.temp_shape = self.canvas.create_line(
-                self.start_x, self.start_y, event.x, event.y, 
-                fill=self.current_color, width=self.line_width
+                *coords, fill=self.current_color, width=width
             )
         elif self.current_shape == "rectangle":
             self.temp_shape = self.canvas.create_rectangle(
-                self.start_x, self.start_y, event.x, event.y, 
-                outline=self.current_color, fill=self.fill_color, width=self.line_width
-            )
-        elif self.current_shape == "oval":
-            self.temp_shape = self.canvas.create_oval(
-                self.start_x, self.start_y, event.x, event.y, 
-                outline=self.current_color, fill=self.fill_color, width=self.line_width
+                *coords, outline=self.current_color, fill=self.fill_color, width=width
             )
-        elif self.current_shape == "circle":
-            # Calculate radius for circle (using DDA-like approach)
-            radius = math.sqrt((event.x - self.start_x)**2 + (event.y - self.start_y)**2)
+        elif self.current_shape in ("oval", "circle"):
             self.temp_shape = self.canvas.create_oval(
-                self.start_x - radius, self.start_y - radius,
-                self.start_x + radius, self.start_y + radius,
-                outline=self.current_color, fill=self.fill_color, width=self.line_width
+                *coords, outline=self.current_color, fill=self.fill_color, width=width
             )
     
+    @instrumented()
     def on_release(self, event):
         if self.start_x is None or self.start_y is None:
+            self.frames.discard(self.drag_to)
+            return
+        self.frames.flush(self.drag_to)
+        x, y = self.to_world(event)
+        
+        # If the selection was being moved, apply and record the move
+        if self.dragging:
+            self.dragging = False
+            dx, dy = self.move_dx, self.move_dy
+            self.move_dx = self.move_dy = 0
+            if dx or dy:
+                # Take back the preview; the scene moves the items for real
+                self.view.drag_selection(-dx, -dy)
+                if len(self.selection) == 1:
+                    self.scene.move(self.selected_shape, dx, dy)
+                    self.save_state(MoveCommand(self.selected_shape, dx, dy))
+                else:
+                    shapes = tuple(self.selection)
+                    self.scene.move_group(shapes, dx, dy)
+                    self.save_state(GroupMoveCommand(shapes, dx, dy))
+            self.start_x = self.start_y = None
             return
         
-        # If an item was being moved, save the state
-        if self.selected_item and self.current_shape != "polygon":  # Remove text check
-            self.save_state()
+        if self.marquee:
+            self.canvas.delete(self.marquee)
+            self.marquee = None
+            self.select_shapes(self.scene.index.query_rect(self.start_x, self.start_y, x, y, inside=True))
+            self.start_x = self.start_y = None
             return
         
         # Skip for polygon
@@ -511,76 +1061,77 @@ class DrawingApp:
             self.canvas.delete(self.temp_shape)
             self.temp_shape = None
         
-        # Save state before drawing final shape
-        self.save_state()
-        
         # Draw final shape
         if self.current_shape == "line":
-            # DDA Line Algorithm
+            # Lines keep just their endpoints; the canvas, or Pillow off screen, draws the pixels between
             x1, y1 = self.start_x, self.start_y
-            x2, y2 = event.x, event.y
-            
-            dx = x2 - x1
-            dy = y2 - y1
-            
-            if abs(dx) > abs(dy):
-                steps = abs(dx)
-            else:
-                steps = abs(dy)
+            x2, y2 = x, y
             
-            if steps == 0:
+            if x1 == x2 and y1 == y2:
                 # Just a point
-                item = self.canvas.create_line(x1, y1, x1+1, y1, fill=self.current_color, width=self.line_width)
-                self.drawn_items.append(item)
+                self.add_shape(Shape("line", (x1, y1, x1+1, y1), fill=self.current_color, width=self.line_width))
                 return
-                
-            x_increment = dx / steps
-            y_increment = dy / steps
             
-            x, y = x1, y1
-            
-            points = []
-            for i in range(int(steps) + 1):
-                points.extend([round(x), round(y)])
-                x += x_increment
-                y += y_increment
-            
-            if len(points) >= 4:  # Need at least 2 points (4 coordinates)
-                item = self.canvas.create_line(points, fill=self.current_color, width=self.line_width)
-                self.drawn_items.append(item)
+            self.add_shape(Shape("line", (x1, y1, x2, y2), fill=self.current_color, width=self.line_width))
             
         elif self.current_shape == "rectangle":
-            item = self.canvas.create_rectangle(
-                self.start_x, self.start_y, event.x, event.y, 
+            self.add_shape(Shape(
+                "rectangle", (self.start_x, self.start_y, x, y), 
                 outline=self.current_color, fill=self.fill_color, width=self.line_width
-            )
-            self.drawn_items.append(item)
+            ))
             
         elif self.current_shape == "oval":
-            item = self.canvas.create_oval(
-                self.start_x, self.start_y, event.x, event.y, 
+            self.add_shape(Shape(
+                "oval", (self.start_x, self.start_y, x, y), 
                 outline=self.current_color, fill=self.fill_color, width=self.line_width
-            )
-            self.drawn_items.append(item)
+            ))
             
         elif self.current_shape == "circle":
             # Calculate radius for circle
-            radius = math.sqrt((event.x - self.start_x)**2 + (event.y - self.start_y)**2)
+            radius = math.sqrt((x - self.start_x)**2 + (y - self.start_y)**2)
             
-            # Draw circle using midpoint circle algorithm
+            # Stored as the oval around it; the canvas, or Pillow off screen, draws the outline
             if radius > 0:
-                item = self.canvas.create_oval(
-                    self.start_x - radius, self.start_y - radius,
-                    self.start_x + radius, self.start_y + radius,
+                self.add_shape(Shape(
+                    "oval", (self.start_x - radius, self.start_y - radius,
+                             self.start_x + radius, self.start_y + radius),
                     outline=self.current_color, fill=self.fill_color, width=self.line_width
-                )
-                self.drawn_items.append(item)
+                ))
         
         # Reset starting point
         self.start_x = None
         self.start_y = None
 
 if __name__ == "__main__":
+    if getattr(sys, "frozen", False):
+        # PNG export renders on spawned processes, which frozen builds must support
+        import multiprocessing
+        multiprocessing.freeze_support()
+    parser = argparse.ArgumentParser(description="2D Drawing Application")
+    parser.add_argument("--renderer", choices=RENDERERS, default="canvas",
+                        help="draw shapes as canvas items or render them into one image")
+    parser.add_argument("--timings", choices=("off", "status", "overlay"), default="off",
+                        help="time the event handlers from the start, as View > Timings does")
+    parser.add_argument("--trace-memory", action="store_true",
+                        help="trace Python allocations from the start, for Help > Memory Report")
+    parser.add_argument("--startup-profile", nargs="?", const="-", metavar="FILE",
+                        help="report how long importing, building the window and the first frame took, "
+                             "as JSON to FILE or as text to stderr")
+    args = parser.parse_args()
+    profile = StartupProfile(STARTED)
+    profile.mark("imports", IMPORTED)
     root = tk.Tk()
-    app = DrawingApp(root)
+    profile.mark("Tk")
+    app = DrawingApp(root, renderer=args.renderer, timings=args.timings, trace_memory=args.trace_memory)
+    profile.mark("DrawingApp")
+    if args.startup_profile:
+        def first_frame(event):
+            # The canvas is on screen; it is interactive once Tk drew it and is idle
+            app.canvas.unbind("<Expose>", binding)
+            root.after_idle(finish)
+        def finish():
+            profile.mark("first frame")
+            app.status_bar.config(text=f"Started in {profile.total() * 1000:.0f} ms")
+            profile.write(args.startup_profile)
+        binding = app.canvas.bind("<Expose>", first_frame, add="+")
     root.mainloop()
@@ -4,6 +4,8 @@ import math
 import json
 import os
 from PIL import Image, ImageTk
+import parametric
+from scheduler import FrameScheduler
 
 class DrawingApp:
     def __init__(self, root):
@@ -28,14 +30,13 @@ class DrawingApp:
         self.current_shape = "line"
         self.current_color = "#000000"  # Black
         self.fill_color = "#ffffff"     # White
+        self.frames = FrameScheduler(root)  # paces mouse motion handling
         self.start_x = None
         self.start_y = None
         self.drawn_items = []
         self.line_width = 2
         self.undo_stack = []
         self.redo_stack = []
-        self.third_point_x = None  # For triangle
-        self.third_point_y = None  # For triangle
         
         # Main frame
         self.main_frame = ttk.Frame(root, padding="10")
@@ -83,34 +84,15 @@ class DrawingApp:
         # Button dict to keep track of tool buttons
         self.tool_buttons = {}
         
-        # Shape buttons
-        self.tool_buttons["line"] = ttk.Button(self.tools_frame, text="Line", width=10, 
-                                            command=lambda: self.set_shape("line"), style='Tool.TButton')
-        self.tool_buttons["line"].pack(side=tk.LEFT, padx=2, pady=2)
-        
-        self.tool_buttons["rectangle"] = ttk.Button(self.tools_frame, text="Rectangle", width=10,
-                                                 command=lambda: self.set_shape("rectangle"), style='Tool.TButton')
-        self.tool_buttons["rectangle"].pack(side=tk.LEFT, padx=2, pady=2)
-        
-        self.tool_buttons["oval"] = ttk.Button(self.tools_frame, text="Oval", width=10,
-                                            command=lambda: self.set_shape("oval"), style='Tool.TButton')
-        self.tool_buttons["oval"].pack(side=tk.LEFT, padx=2, pady=2)
-        
-        self.tool_buttons["circle"] = ttk.Button(self.tools_frame, text="Circle", width=10,
-                                              command=lambda: self.set_shape("circle"), style='Tool.TButton')
-        self.tool_buttons["circle"].pack(side=tk.LEFT, padx=2, pady=2)
-        
-        self.tool_buttons["triangle"] = ttk.Button(self.tools_frame, text="Triangle", width=10,
-                                               command=lambda: self.set_shape("triangle"), style='Tool.TButton')
-        self.tool_buttons["triangle"].pack(side=tk.LEFT, padx=2, pady=2)
-        
-        self.tool_buttons["star"] = ttk.Button(self.tools_frame, text="Star", width=10,
-                                           command=lambda: self.set_shape("star"), style='Tool.TButton')
-        self.tool_buttons["star"].pack(side=tk.LEFT, padx=2, pady=2)
-        
-        self.tool_buttons["polygon"] = ttk.Button(self.tools_frame, text="Polygon", width=10,
-                                               command=lambda: self.set_shape("polygon"), style='Tool.TButton')
-        self.tool_buttons["polygon"].pack(side=tk.LEFT, padx=2, pady=2)
+        # Shape buttons; each registered parametric shape gets one too
+        tools = [("line", "Line"), ("rectangle", "Rectangle"), ("oval", "Oval"), ("circle", "Circle")]
+        tools += [(shape.name, shape.label) for shape in parametric.SHAPES.values()]
+        tools.append(("polygon", "Polygon"))
+        for shape, label in tools:
+            self.tool_buttons[shape] = ttk.Button(self.tools_frame, text=label, width=10,
+                                                  command=lambda shape=shape: self.set_shape(shape),
+                                                  style='Tool.TButton')
+            self.tool_buttons[shape].pack(side=tk.LEFT, padx=2, pady=2)
         
         # Highlight the default tool
         self.tool_buttons["line"].state(['pressed'])
@@ -191,7 +173,7 @@ class DrawingApp:
         self.coords_label.pack(side=tk.RIGHT)
         
         # Update coordinates on mouse movement
-        self.canvas.bind("<Motion>", self.update_coords)
+        self.canvas.bind("<Motion>", self.frames.coalesce(self.update_coords))
         
         # Temporary shape for preview
         self.temp_shape = None
@@ -258,24 +240,29 @@ class DrawingApp:
                 self.drawn_items.remove(self.selected_item)
             self.selected_item = None
     
+    def item_state(self, item_id):
+        """Return the (type, coords, options) of a drawn canvas item"""
+        item_type = self.canvas.type(item_id)
+        options = {"fill": self.canvas.itemcget(item_id, "fill"), "width": self.canvas.itemcget(item_id, "width")}
+        if item_type != "line":
+            options["outline"] = self.canvas.itemcget(item_id, "outline")
+        return item_type, self.canvas.coords(item_id), options
+    
+    def create_item(self, item_type, coords, options):
+        """Create a canvas item from its (type, coords, options) and add it to the drawing"""
+        create = getattr(self.canvas, "create_" + item_type)
+        self.drawn_items.append(create(coords, **options))
+    
+    def restore(self, state):
+        """Replace the drawing with the items of a saved state"""
+        self.canvas.delete("all")
+        self.drawn_items = []
+        for item_type, coords, options in state:
+            self.create_item(item_type, coords, options)
+    
     def save_state(self):
         # Save current state for undo
-        state = []
-        for item_id in self.drawn_items:
-            item_type = self.canvas.type(item_id)
-            coords = self.canvas.coords(item_id)
-            options = {}
-            
-            if item_type in ["line", "oval", "rectangle", "polygon"]:
-                options["fill"] = self.canvas.itemcget(item_id, "fill")
-                options["width"] = self.canvas.itemcget(item_id, "width")
-                
-                if item_type != "line":
-                    options["outline"] = self.canvas.itemcget(item_id, "outline")
-            
-            state.append((item_type, coords, options))
-        
-        self.undo_stack.append(state)
+        self.undo_stack.append([self.item_state(item_id) for item_id in self.drawn_items])
         self.redo_stack = []  # Clear redo stack when a new action is performed
     
     def undo(self):
@@ -283,84 +270,20 @@ class DrawingApp:
             return
         
         # Save current state for redo
-        current_state = []
-        for item_id in self.drawn_items:
-            item_type = self.canvas.type(item_id)
-            coords = self.canvas.coords(item_id)
-            options = {}
-            
-            if item_type in ["line", "oval", "rectangle", "polygon"]:  # Remove "text"
-                options["fill"] = self.canvas.itemcget(item_id, "fill")
-                options["width"] = self.canvas.itemcget(item_id, "width")
-                
-                if item_type != "line":
-                    options["outline"] = self.canvas.itemcget(item_id, "outline")
-            
-            current_state.append((item_type, coords, options))
-        
-        self.redo_stack.append(current_state)
+        self.redo_stack.append([self.item_state(item_id) for item_id in self.drawn_items])
         
         # Restore previous state
-        previous_state = self.undo_stack.pop()
-        self.canvas.delete("all")
-        self.drawn_items = []
-        
-        for item_type, coords, options in previous_state:
-            if item_type == "line":
-                item = self.canvas.create_line(coords, fill=options["fill"], width=options["width"])
-            elif item_type == "rectangle":
-                item = self.canvas.create_rectangle(coords, outline=options["outline"], 
-                                                  fill=options["fill"], width=options["width"])
-            elif item_type == "oval":
-                item = self.canvas.create_oval(coords, outline=options["outline"], 
-                                             fill=options["fill"], width=options["width"])
-            elif item_type == "polygon":
-                item = self.canvas.create_polygon(coords, outline=options["outline"], 
-                                                fill=options["fill"], width=options["width"])
-            
-            self.drawn_items.append(item)
+        self.restore(self.undo_stack.pop())
     
     def redo(self):
         if not self.redo_stack:
             return
         
         # Save current state for undo
-        current_state = []
-        for item_id in self.drawn_items:
-            item_type = self.canvas.type(item_id)
-            coords = self.canvas.coords(item_id)
-            options = {}
-            
-            if item_type in ["line", "oval", "rectangle", "polygon"]:  # Remove "text"
-                options["fill"] = self.canvas.itemcget(item_id, "fill")
-                options["width"] = self.canvas.itemcget(item_id, "width")
-                
-                if item_type != "line":
-                    options["outline"] = self.canvas.itemcget(item_id, "outline")
-            
-            current_state.append((item_type, coords, options))
-        
-        self.undo_stack.append(current_state)
+        self.undo_stack.append([self.item_state(item_id) for item_id in self.drawn_items])
         
         # Restore next state
-        next_state = self.redo_stack.pop()
-        self.canvas.delete("all")
-        self.drawn_items = []
-        
-        for item_type, coords, options in next_state:
-            if item_type == "line":
-                item = self.canvas.create_line(coords, fill=options["fill"], width=options["width"])
-            elif item_type == "rectangle":
-                item = self.canvas.create_rectangle(coords, outline=options["outline"], 
-                                                  fill=options["fill"], width=options["width"])
-            elif item_type == "oval":
-                item = self.canvas.create_oval(coords, outline=options["outline"], 
-                                             fill=options["fill"], width=options["width"])
-            elif item_type == "polygon":
-                item = self.canvas.create_polygon(coords, outline=options["outline"], 
-                                                fill=options["fill"], width=options["width"])
-            
-            self.drawn_items.append(item)
+        self.restore(self.redo_stack.pop())
     
     def save_drawing(self):
         file_path = filedialog.asksaveasfilename(defaultextension=".json", 
@@ -370,17 +293,7 @@ class DrawingApp:
         
         drawing_data = []
         for item_id in self.drawn_items:
-            item_type = self.canvas.type(item_id)
-            coords = self.canvas.coords(item_id)
-            options = {}
-            
-            if item_type in ["line", "oval", "rectangle", "polygon"]:  # Remove "text"
-                options["fill"] = self.canvas.itemcget(item_id, "fill")
-                options["width"] = self.canvas.itemcget(item_id, "width")
-                
-                if item_type != "line":
-                    options["outline"] = self.canvas.itemcget(item_id, "outline")
-            
+            item_type, coords, options = self.item_state(item_id)
             drawing_data.append({"type": item_type, "coords": coords, "options": options})
         
         with open(file_path, 'w') as f:
@@ -398,27 +311,8 @@ class DrawingApp:
                 drawing_data = json.load(f)
             
             self.save_state()  # Save current state for undo
-            self.canvas.delete("all")
-            self.drawn_items = []
-            
-            for item_data in drawing_data:
-                item_type = item_data["type"]
-                coords = item_data["coords"]
-                options = item_data["options"]
-                
-                if item_type == "line":
-                    item = self.canvas.create_line(coords, fill=options["fill"], width=options["width"])
-                elif item_type == "rectangle":
-                    item = self.canvas.create_rectangle(coords, outline=options["outline"], 
-                                                      fill=options["fill"], width=options["width"])
-                elif item_type == "oval":
-                    item = self.canvas.create_oval(coords, outline=options["outline"], 
-                                                 fill=options["fill"], width=options["width"])
-                elif item_type == "polygon":
-                    item = self.canvas.create_polygon(coords, outline=options["outline"], 
-                                                    fill=options["fill"], width=options["width"])
-                
-                self.drawn_items.append(item)
+            self.restore([(item_data["type"], item_data["coords"], item_data["options"])
+                          for item_data in drawing_data])
             
             messagebox.showinfo("Success", f"Drawing loaded from {file_path}")
         
@@ -447,6 +341,8 @@ class DrawingApp:
                 # Draw a small circle to mark the point
                 self.canvas.create_oval(event.x-3, event.y-3, event.x+3, event.y+3, 
                                       fill=self.current_color, outline="")
+            else:
+                self.start_preview(event.x, event.y)
     
     def on_double_click(self, event):
         if self.current_shape == "polygon" and len(self.polygon_points) >= 6:  # At least 3 points (6 coordinates)
@@ -457,6 +353,11 @@ class DrawingApp:
             self.polygon_points = []  # Reset for next polygon
     
     def on_drag(self, event):
+        # Mice can report motion much faster than the screen refreshes: only
+        # the latest event of each frame is handled
+        self.frames.submit(self.drag_to, event)
+    
+    def drag_to(self, event):
         if self.start_x is None or self.start_y is None:
             return
         
@@ -470,92 +371,51 @@ class DrawingApp:
             self.start_y = event.y
             return
         
-        # Skip preview for polygon
-        if self.current_shape == "polygon":
-            return
-        
-        # Delete previous temporary shape
+        # Move the preview created on press
+        if self.temp_shape:
+            self.canvas.coords(self.temp_shape, *self.preview_coords(event.x, event.y))
+    
+    def preview_coords(self, x, y):
+        """Return the coords of the drag preview with the pointer at (x, y)"""
+        if self.current_shape == "circle":
+            # Calculate radius for circle (using DDA-like approach)
+            radius = math.sqrt((x - self.start_x)**2 + (y - self.start_y)**2)
+            return (self.start_x - radius, self.start_y - radius,
+                    self.start_x + radius, self.start_y + radius)
+        shape = parametric.SHAPES.get(self.current_shape)
+        if shape:
+            # The shape's template, fitted to the drag by one affine transform
+            return shape.coords(self.start_x, self.start_y, x, y)
+        return (self.start_x, self.start_y, x, y)
+    
+    def start_preview(self, x, y):
+        """Create the drag preview item once; dragging only updates its coords"""
         if self.temp_shape:
             self.canvas.delete(self.temp_shape)
-        
-        # Draw temporary shape based on current selection
+            self.temp_shape = None
+        coords = self.preview_coords(x, y)
         if self.current_shape == "line":
             self.temp_shape = self.canvas.create_line(
-                self.start_x, self.start_y, event.x, event.y, 
-                fill=self.current_color, width=self.line_width
+                *coords, fill=self.current_color, width=self.line_width
             )
         elif self.current_shape == "rectangle":
             self.temp_shape = self.canvas.create_rectangle(
-                self.start_x, self.start_y, event.x, event.y, 
-                outline=self.current_color, fill=self.fill_color, width=self.line_width
+                *coords, outline=self.current_color, fill=self.fill_color, width=self.line_width
             )
-        elif self.current_shape == "oval":
+        elif self.current_shape in ("oval", "circle"):
             self.temp_shape = self.canvas.create_oval(
-                self.start_x, self.start_y, event.x, event.y, 
-                outline=self.current_color, fill=self.fill_color, width=self.line_width
-            )
-        elif self.current_shape == "circle":
-            # Calculate radius for circle (using DDA-like approach)
-            radius = math.sqrt((event.x - self.start_x)**2 + (event.y - self.start_y)**2)
-            self.temp_shape = self.canvas.create_oval(
-                self.start_x - radius, self.start_y - radius,
-                self.start_x + radius, self.start_y + radius,
-                outline=self.current_color, fill=self.fill_color, width=self.line_width
-            )
-        elif self.current_shape == "triangle":
-            # For triangle, we'll create an isosceles triangle where the base
-            # is determined by the drag distance and the apex is above/below the midpoint
-            x1, y1 = self.start_x, self.start_y  # First point
-            x2, y2 = event.x, event.y            # Second point
-            
-            # Calculate midpoint of the base
-            mid_x = (x1 + x2) / 2
-            
-            # Calculate the height of the triangle (perpendicular to base)
-            # Use the drag distance for height too for a visually pleasing triangle
-            base_length = math.sqrt((x2 - x1)**2 + (y2 - y1)**2)
-            # Determine direction based on drag
-            if y2 > y1:  # Dragging downward
-                apex_y = y1 - base_length
-            else:  # Dragging upward
-                apex_y = y1 + base_length
-                
-            # Store the third point
-            self.third_point_x = mid_x
-            self.third_point_y = apex_y
-            
-            # Create triangle
-            self.temp_shape = self.canvas.create_polygon(
-                x1, y1, x2, y2, mid_x, apex_y,
-                outline=self.current_color, fill=self.fill_color, width=self.line_width
+                *coords, outline=self.current_color, fill=self.fill_color, width=self.line_width
             )
-        elif self.current_shape == "star":
-            # Draw a 5-pointed star
-            cx = (self.start_x + event.x) / 2  # Center x
-            cy = (self.start_y + event.y) / 2  # Center y
-            
-            # Calculate radius based on drag distance
-            radius_outer = math.sqrt((event.x - self.start_x)**2 + (event.y - self.start_y)**2) / 2
-            radius_inner = radius_outer * 0.4  # Inner radius is 40% of outer
-            
-            points = []
-            for i in range(10):
-                # Outer points for i = 0, 2, 4, 6, 8
-                # Inner points for i = 1, 3, 5, 7, 9
-                angle = math.pi / 2 - (i * 2 * math.pi / 10)
-                radius = radius_outer if i % 2 == 0 else radius_inner
-                
-                x = cx + radius * math.cos(angle)
-                y = cy - radius * math.sin(angle)
-                points.extend([x, y])
-                
+        elif self.current_shape in parametric.SHAPES:
             self.temp_shape = self.canvas.create_polygon(
-                points, outline=self.current_color, fill=self.fill_color, width=self.line_width
+                *coords, outline=self.current_color, fill=self.fill_color, width=self.line_width
             )
     
     def on_release(self, event):
         if self.start_x is None or self.start_y is None:
+            self.frames.discard(self.drag_to)
             return
+        self.frames.flush(self.drag_to)
         
         # If an item was being moved, save the state
         if self.selected_item and self.current_shape != "polygon":
@@ -576,38 +436,18 @@ class DrawingApp:
         
         # Draw final shape
         if self.current_shape == "line":
-            # DDA Line Algorithm
+            # Lines keep just their endpoints; the canvas draws the pixels between
             x1, y1 = self.start_x, self.start_y
             x2, y2 = event.x, event.y
             
-            dx = x2 - x1
-            dy = y2 - y1
-            
-            if abs(dx) > abs(dy):
-                steps = abs(dx)
-            else:
-                steps = abs(dy)
-            
-            if steps == 0:
+            if x1 == x2 and y1 == y2:
                 # Just a point
                 item = self.canvas.create_line(x1, y1, x1+1, y1, fill=self.current_color, width=self.line_width)
                 self.drawn_items.append(item)
                 return
-                
-            x_increment = dx / steps
-            y_increment = dy / steps
-            
-            x, y = x1, y1
-            
-            points = []
-            for i in range(int(steps) + 1):
-                points.extend([round(x), round(y)])
-                x += x_increment
-                y += y_increment
             
-            if len(points) >= 4:  # Need at least 2 points (4 coordinates)
-                item = self.canvas.create_line(points, fill=self.current_color, width=self.line_width)
-                self.drawn_items.append(item)
+            item = self.canvas.create_line(x1, y1, x2, y2, fill=self.current_color, width=self.line_width)
+            self.drawn_items.append(item)
             
         elif self.current_shape == "rectangle":
             item = self.canvas.create_rectangle(
@@ -627,7 +467,7 @@ class DrawingApp:
             # Calculate radius for circle
             radius = math.sqrt((event.x - self.start_x)**2 + (event.y - self.start_y)**2)
             
-            # Draw circle using midpoint circle algorithm
+            # An oval around the circle; the canvas draws the outline
             if radius > 0:
                 item = self.canvas.create_oval(
                     self.start_x - radius, self.start_y - radius,
@@ -636,48 +476,18 @@ class DrawingApp:
                 )
                 self.drawn_items.append(item)
         
-        elif self.current_shape == "triangle":
-            # Create the final triangle
-            x1, y1 = self.start_x, self.start_y
-            x2, y2 = event.x, event.y
-            
-            # Use the third point calculated during drag
-            if self.third_point_x is not None and self.third_point_y is not None:
+        elif self.current_shape in parametric.SHAPES:
+            # A click without a drag draws nothing
+            if (event.x, event.y) != (self.start_x, self.start_y):
                 item = self.canvas.create_polygon(
-                    x1, y1, x2, y2, self.third_point_x, self.third_point_y,
+                    self.preview_coords(event.x, event.y),
                     outline=self.current_color, fill=self.fill_color, width=self.line_width
                 )
                 self.drawn_items.append(item)
         
-        elif self.current_shape == "star":
-            # Draw a 5-pointed star (final version)
-            cx = (self.start_x + event.x) / 2  # Center x
-            cy = (self.start_y + event.y) / 2  # Center y
-            
-            # Calculate radius based on drag distance
-            radius_outer = math.sqrt((event.x - self.start_x)**2 + (event.y - self.start_y)**2) / 2
-            radius_inner = radius_outer * 0.4  # Inner radius is 40% of outer
-            
-            points = []
-            for i in range(10):
-                # Alternate between outer and inner points
-                angle = math.pi / 2 - (i * 2 * math.pi / 10)
-                radius = radius_outer if i % 2 == 0 else radius_inner
-                
-                x = cx + radius * math.cos(angle)
-                y = cy - radius * math.sin(angle)
-                points.extend([x, y])
-                
-            item = self.canvas.create_polygon(
-                points, outline=self.current_color, fill=self.fill_color, width=self.line_width
-            )
-            self.drawn_items.append(item)
-        
         # Reset starting point
         self.start_x = None
         self.start_y = None
-        self.third_point_x = None
-        self.third_point_y = None
 
 if __name__ == "__main__":
     root = tk.Tk()
@@ -0,0 +1,131 @@
+"""Headless rendering of drawing files to PNG or SVG.
+
+    python batchrender.py [-f png|svg] [-o DIR] [-j WORKERS] [--force] PATH...
+
+Each PATH is a drawing, a directory of drawings (its .json and .cgd files)
+or a glob pattern. Drawings are read with the same shape semantics as
+File > Open, leaving out hidden layers, and rendered on a process pool,
+one file per worker; neither Tk nor a display is needed. An output is written next to its drawing (or
+in DIR) and skipped when it is already newer than the drawing. Per-file
+timings and the overall throughput are printed as files finish.
+"""
+import argparse
+import glob
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import binformat
+import render
+from loader import read_batches
+from scene import Layer
+from shapestore import ShapeStore
+
+FORMATS = ("png", "svg")
+DRAWING_EXTENSIONS = (".json", binformat.EXTENSION)
+
+
+def find_drawings(patterns):
+    """Return the drawing files named by paths, directories and glob patterns, without repeats"""
+    found = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            paths = sorted(os.path.join(pattern, name) for name in os.listdir(pattern)
+                           if name.endswith(DRAWING_EXTENSIONS))
+        elif glob.has_magic(pattern):
+            paths = sorted(path for path in glob.glob(pattern, recursive=True) if os.path.isfile(path))
+        else:
+            paths = [pattern]  # a missing file is reported when it fails to render
+        found.extend(paths)
+    return list(dict.fromkeys(found))
+
+
+def output_path(source, fmt, directory=None):
+    """Return where the rendering of ``source`` goes"""
+    name = os.path.splitext(os.path.basename(source))[0] + "." + fmt
+    return os.path.join(directory or os.path.dirname(source), name)
+
+
+def up_to_date(source, target):
+    """Return True if ``target`` exists and is newer than ``source``"""
+    try:
+        return os.path.getmtime(target) > os.path.getmtime(source)
+    except OSError:
+        return False
+
+
+def read_store(path):
+    """Read the visible layers of a drawing into a ShapeStore the way File > Open does"""
+    shapes = []
+    visible = True
+    for batch, _ in read_batches(path, threading.Event()):
+        for item in batch:
+            if isinstance(item, Layer):
+                visible = item.visible
+            elif visible:
+                shapes.append(item)
+    return ShapeStore.from_shapes(shapes)
+
+
+def render_file(source, target, fmt):
+    """Render one drawing; return its shape count and the seconds it took"""
+    start = time.perf_counter()
+    store = read_store(source)
+    # The image holds the whole drawing and the canvas origin, like the window shows it
+    box = render.cover(render.drawing_bounds(store), (0, 0, 1, 1))
+    if fmt == "svg":
+        render.export_svg(target, store, box)
+    else:
+        # Files already run in parallel; tiles of one file are rendered in order
+        render.export_png(target, store, box, workers=1)
+    return len(store), time.perf_counter() - start
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python batchrender.py",
+                                     description="Render drawings to PNG or SVG without a display.")
+    parser.add_argument("paths", nargs="+", metavar="PATH", help="drawing, directory of drawings or glob pattern")
+    parser.add_argument("-f", "--format", choices=FORMATS, default="png", help="output format (default png)")
+    parser.add_argument("-o", "--output", metavar="DIR", help="write outputs to DIR instead of next to the drawings")
+    parser.add_argument("-j", "--workers", type=int, default=os.cpu_count() or 1,
+                        help="worker processes (default: one per CPU)")
+    parser.add_argument("--force", action="store_true", help="render even when the output is up to date")
+    args = parser.parse_args(argv)
+
+    if args.output:
+        os.makedirs(args.output, exist_ok=True)
+    jobs = []
+    skipped = 0
+    for source in find_drawings(args.paths):
+        target = output_path(source, args.format, args.output)
+        if not args.force and up_to_date(source, target):
+            skipped += 1
+        else:
+            jobs.append((source, target))
+
+    start = time.perf_counter()
+    rendered = failed = shapes = 0
+    with ProcessPoolExecutor(max(1, min(args.workers, len(jobs)))) as pool:
+        futures = {pool.submit(render_file, source, target, args.format): (source, target)
+                   for source, target in jobs}
+        for future in as_completed(futures):
+            source, target = futures[future]
+            try:
+                count, seconds = future.result()
+            except Exception as e:
+                failed += 1
+                print(f"FAILED  {source}: {e}", file=sys.stderr)
+                continue
+            rendered += 1
+            shapes += count
+            print(f"{seconds:7.2f}s {count:>9} shapes  {source} -> {target}")
+    elapsed = max(time.perf_counter() - start, 1e-9)
+    print(f"Rendered {rendered} files ({shapes} shapes) in {elapsed:.2f}s: {rendered / elapsed:.1f} files/s, "
+          f"{shapes / elapsed:.0f} shapes/s; {skipped} up to date, {failed} failed")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
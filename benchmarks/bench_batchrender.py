@@ -0,0 +1,49 @@
+"""Throughput of headless batch rendering
+
+Run with ``python benchmarks/bench_batchrender.py [files]``. Writes a
+directory of JSON drawings and renders it to PNG with 1 to cpu_count
+workers, then once more to check that up-to-date outputs are skipped.
+"""
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+
+from bench_render import make_shapes
+
+import batchrender
+from shapestore import ShapeStore
+
+FILES = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+SHAPES = 2000
+
+
+def run(argv):
+    out = io.StringIO()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(out):
+        status = batchrender.main(argv)
+    assert status == 0
+    return time.perf_counter() - start, out.getvalue().splitlines()[-1]
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        for i in range(FILES):
+            records = ShapeStore.from_shapes(make_shapes(1500 + i, SHAPES)).to_records()
+            with open(os.path.join(tmp, f"drawing{i:04}.json"), "w") as f:
+                json.dump(records, f)
+        print(f"{FILES} drawings of {SHAPES} shapes, {os.cpu_count()} CPUs")
+        for workers in range(1, (os.cpu_count() or 1) + 1):
+            elapsed, summary = run([tmp, "--force", "-j", str(workers)])
+            print(f"{workers:>2} workers {elapsed:7.2f}s {FILES / elapsed:7.1f} files/s")
+        elapsed, summary = run([tmp])
+        assert f"{FILES} up to date" in summary
+        print(f"up-to-date rerun {elapsed * 1000:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""File size and open time of the binary .cgd format against JSON
+
+Run with ``python benchmarks/bench_binformat.py [shapes]``. Writes the same
+drawing as JSON and as .cgd to a temporary directory, then compares the file
+sizes, the time to open each one up to a ShapeStore (before any canvas
+population) and checks the binary file round-trips. Also checks that a
+drawing with coords float32 cannot hold, as drawn while zoomed, comes back
+exactly from a .cgd File > Save, like from JSON.
+"""
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+import binformat
+from loader import read_batches
+from saver import save_snapshot
+from scene import Scene, Shape
+from shapestore import ShapeStore
+from bench_shapestore import make_shapes
+
+COUNT = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+
+
+def timed(label, func):
+    start = time.perf_counter()
+    result = func()
+    print(f"{label:<28} {(time.perf_counter() - start) * 1000:>9.1f} ms")
+    return result
+
+
+def open_json(path):
+    with open(path, "r") as f:
+        return ShapeStore.from_records(json.load(f))
+
+
+def check_precision(tmp):
+    """Save fractional coords as .cgd and JSON and read them back"""
+    scene = Scene()
+    for shape in make_shapes(1000):
+        scene.add(Shape(shape.kind, [c / 3 for c in shape.coords], shape.outline, shape.fill, shape.width))
+    whole = Scene()
+    whole.add(Shape("rectangle", (1, 2, 30, 40)))
+    expected = [shape.coords for shape in sorted(scene.shapes, key=lambda shape: shape.seq)]
+    for name in ("zoomed" + binformat.EXTENSION, "zoomed.json"):
+        path = os.path.join(tmp, name)
+        save_snapshot(path, scene.snapshot())
+        shapes = [item for batch, fraction in read_batches(path, threading.Event()) for item in batch
+                  if isinstance(item, Shape)]
+        assert [shape.coords for shape in shapes] == expected, name
+    path = os.path.join(tmp, "whole" + binformat.EXTENSION)
+    save_snapshot(path, whole.snapshot())
+    assert binformat.read_drawing(path).coords.dtype == np.float32
+    print("fractional coords round-trip exactly through .cgd; whole pixels stay float32")
+
+
+def main():
+    print(f"{COUNT} shapes")
+    shapes = make_shapes(COUNT)
+    # Whole pixels, as drawn with the mouse
+    for shape in shapes:
+        shape.coords = tuple(float(round(c)) for c in shape.coords)
+    store = ShapeStore.from_shapes(shapes)
+    records = [shape.to_dict() for shape in shapes]
+    del shapes
+
+    with tempfile.TemporaryDirectory() as tmp:
+        json_path = os.path.join(tmp, "drawing.json")
+        binary_path = os.path.join(tmp, "drawing" + binformat.EXTENSION)
+        with open(json_path, "w") as f:
+            json.dump(records, f)
+        del records
+        timed("write .cgd", lambda: binformat.write_drawing(binary_path, store))
+
+        json_size = os.path.getsize(json_path)
+        binary_size = os.path.getsize(binary_path)
+        print(f"{'JSON size':<28} {json_size / 1e6:>9.1f} MB")
+        print(f"{'.cgd size':<28} {binary_size / 1e6:>9.1f} MB  ({json_size / binary_size:.1f}x smaller)")
+
+        loaded = timed("open JSON", lambda: open_json(json_path))
+        mapped = timed("open .cgd (memory-mapped)", lambda: binformat.read_drawing(binary_path))
+        timed("  bounds of mapped drawing", mapped.bounds)
+
+        assert len(mapped) == len(loaded) == COUNT
+        assert np.array_equal(mapped.kinds, store.kinds)
+        assert np.array_equal(mapped.offsets, store.offsets)
+        assert np.array_equal(mapped.coords, store.coords)
+        assert [mapped.style_table[i] for i in mapped.styles[:1000]] == \
+            [store.style_table[i] for i in store.styles[:1000]]
+        del loaded, mapped
+        check_precision(tmp)
+
+
+if __name__ == "__main__":
+    main()
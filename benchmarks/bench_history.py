@@ -0,0 +1,84 @@
+"""Per-edit undo/redo latency as the drawing grows
+
+Run with ``python benchmarks/bench_history.py``. For each scene size the
+drawing is filled with rectangles, then single edits (draw, move, delete) are
+recorded, then all of them are undone and redone. With the command log the per-edit times
+stay flat from 100 to 100k items (checked to within ``FLAT`` times of each
+other), and every undo makes a constant number of canvas calls since items
+are hidden and shown rather than re-created.
+"""
+import gc
+import time
+
+from fakecanvas import HISTORY_KEEP_STEPS, Event, headless_app
+from scene import Shape
+
+SIZES = [100, 1000, 10000, 100000]
+# Stay within the steps the history keeps uncompacted, so every undo is a single step
+EDITS = HISTORY_KEEP_STEPS // 3
+FLAT = 3.0  # largest over smallest per-edit time across the sizes, well below the sizes' 1000x
+
+
+def fill(app, count):
+    # Right of the area the edits draw in, so a draw never lands on (and drags) a filled shape
+    for i in range(count):
+        x, y = 100 + (i * 7) % 680, (i * 13) % 580
+        app.add_shape(Shape("rectangle", (x, y, x + 10, y + 10), outline="#000000",
+                            fill="#ffffff", width=2))
+
+
+def per_edit(func):
+    gc.collect()  # not a collection of the whole drawing in the middle of the timed edits
+    start = time.perf_counter()
+    for _ in range(EDITS):
+        func()
+    return (time.perf_counter() - start) / EDITS * 1e6
+
+
+def run(count):
+    app = headless_app()
+    app.current_shape = "rectangle"
+    fill(app, count)
+
+    def draw():
+        app.on_press(Event(10, 10))
+        app.on_drag(Event(40, 30))
+        app.on_release(Event(50, 40))
+
+    def move():
+        app.select(app.view.shape_at(app.canvas.next_id - 1))
+        app.start_x, app.start_y = 0, 0
+        app.on_drag(Event(3, 4))
+        app.on_release(Event(3, 4))
+        app.deselect()
+
+    def delete():
+        app.select(targets.pop())
+        app.delete_selected()
+
+    results = {"draw": per_edit(draw), "move": per_edit(move)}
+    targets = list(app.scene.shapes)
+    results["delete"] = per_edit(delete)
+    # Each undo/redo sample covers one draw, one move and one delete
+    calls = app.canvas.calls
+    results["undo"] = per_edit(lambda: (app.undo(), app.undo(), app.undo())) / 3
+    results["calls"] = (app.canvas.calls - calls) / (EDITS * 3)
+    results["redo"] = per_edit(lambda: (app.redo(), app.redo(), app.redo())) / 3
+    return results
+
+
+def main():
+    columns = ["draw", "move", "delete", "undo", "redo"]
+    print(f"{'items':>8}" + "".join(f"{c:>10}" for c in columns) + "   (us per edit)   canvas calls per undo")
+    results = []
+    for count in SIZES:
+        r = run(count)
+        results.append(r)
+        print(f"{count:>8}" + "".join(f"{r[c]:>10.1f}" for c in columns) + f"   {r['calls']:>20.1f}")
+    for column in columns:
+        times = [r[column] for r in results]
+        assert max(times) < FLAT * min(times), f"{column} grows with the drawing: {times}"
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""Undo history memory over a long editing session
+
+Run with ``python benchmarks/bench_history_memory.py [edits]``. Simulates a
+long session of draws, moves, restyles, deletes and occasional clears, and
+prints the history's own size estimate next to the total memory tracemalloc
+sees (history plus the stand-in canvas). Both should level off below the HISTORY_MAX_BYTES ceiling while undo
+still reaches back at least HISTORY_KEEP_STEPS steps.
+"""
+import random
+import sys
+import tracemalloc
+
+from fakecanvas import (HISTORY_KEEP_STEPS, HISTORY_MAX_BYTES, Event, headless_app)
+
+import WORK_Cgpro
+
+EDITS = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+
+
+def edit_item(app, item, roll):
+    """Move, restyle or delete one item, or occasionally clear everything"""
+    app.select(item)
+    if roll < 0.8:
+        app.start_x, app.start_y = 0, 0
+        app.on_drag(Event(random.randint(-5, 5), random.randint(-5, 5)))
+        app.on_release(Event(0, 0))
+        app.deselect()
+    elif roll < 0.9:
+        app.restyle_selected(fill=random.choice(["#ff0000", "#00ff00", "#0000ff"]))
+        app.deselect()
+    elif roll < 0.9995:
+        app.delete_selected()
+    else:
+        app.deselect()
+        app.clear_canvas()
+
+
+def main():
+    random.seed(1)
+    WORK_Cgpro.messagebox.askyesno = lambda *args: True
+    app = headless_app()
+    app.current_shape = "rectangle"
+    items = []
+
+    tracemalloc.start()
+    print(f"{'edits':>8} {'undo steps':>11} {'removed':>8} {'estimate KB':>12} {'traced KB':>10}")
+    for step in range(1, EDITS + 1):
+        roll = random.random()
+        item = random.choice(items) if items else None
+        if roll < 0.5 or item is None:
+            x, y = random.randint(0, 780), random.randint(0, 580)
+            app.on_press(Event(x, y))
+            app.on_release(Event(x + 20, y + 20))
+            items.append(app.view.shape_at(app.canvas.next_id - 1))
+        elif item in app.scene:
+            edit_item(app, item, roll)
+        if step % (EDITS // 10) == 0:
+            report = app.history.report()
+            traced = tracemalloc.get_traced_memory()[0]
+            print(f"{step:>8} {report['undo_steps']:>11} {report['removed_shapes']:>8} "
+                  f"{report['bytes'] / 1024:>12.0f} {traced / 1024:>10.0f}")
+
+    report = app.history.report()
+    print(f"ceiling {HISTORY_MAX_BYTES / 1024:.0f} KB, keep steps {HISTORY_KEEP_STEPS}")
+    assert report["bytes"] <= HISTORY_MAX_BYTES
+    assert report["undo_steps"] >= HISTORY_KEEP_STEPS
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""Cost of the autosave journal per edit, and crash recovery
+
+Run with ``python benchmarks/bench_journal.py``. For drawings of growing
+size, times the main thread cost of journaling a fixed number of edits
+(which should not grow with the drawing, compactions included: checked to
+within ``FLAT`` times across the sizes), then replays the journal without
+closing it, as after a crash, and checks it reproduces the drawing.
+"""
+import gc
+import os
+import random
+import sys
+import tempfile
+import time
+
+from fakecanvas import headless_app, Event
+
+import journal
+from journal import Journal, read_journal
+from scene import Shape
+
+EDITS = 5000
+SIZES = [int(n) for n in sys.argv[1:]] or [1000, 10000, 100000]
+FLAT = 3.0  # largest over smallest per-edit time across the sizes
+
+
+def edit(app, rng):
+    op = rng.random()
+    if op < 0.4:
+        x, y = rng.randint(0, 60), rng.randint(0, 560)
+        app.on_press(Event(x, y))
+        app.on_release(Event(x + 20, y + 20))
+    elif op < 0.8:
+        shape = next(iter(app.scene.shapes))
+        app.select(shape)
+        app.start_x, app.start_y = 0, 0
+        app.on_drag(Event(3, 4))
+        app.on_release(Event(3, 4))
+        app.deselect()
+    elif op < 0.9:
+        app.undo()
+    else:
+        app.redo()
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        journal.JOURNAL_DIR = tmp
+        # Compact often so the run includes compactions at every size
+        journal.COMPACT_MIN_ENTRIES = 1000
+        print(f"{'shapes':>8} {'per edit':>10} {'journal size':>13}")
+        times = []
+        for size in SIZES:
+            rng = random.Random(size)
+            app = headless_app()
+            app.current_shape = "rectangle"
+            # Right of the area the edits draw in, so a draw never lands on (and drags) a filled shape
+            for i in range(size):
+                x, y = 100 + (i * 7) % 680, (i * 13) % 580
+                app.scene.add(Shape("rectangle", (x, y, x + 10, y + 10)))
+            path = os.path.join(tmp, f"drawing{size}.json.journal")
+            app.journal = Journal(app.scene, path, path[:-len(journal.EXTENSION)])
+            app.journal.start()
+            app.scene.journal = app.journal
+
+            gc.collect()  # not a collection of the whole drawing in the middle of the timed edits
+            start = time.perf_counter()
+            for i in range(EDITS):
+                edit(app, rng)
+            elapsed = time.perf_counter() - start
+
+            # Crash: nothing is closed, the writer's last batch is whatever made it to disk
+            time.sleep(journal.FLUSH_SECONDS * 2.5)
+            document, shapes = read_journal(path)
+            assert document == path[:-len(journal.EXTENSION)]
+            assert [s.to_dict() for s in shapes] == app.scene.to_data()
+            print(f"{size:>8} {elapsed / EDITS * 1e6:>7.1f} us {os.path.getsize(path) / 1e6:>10.1f} MB")
+            app.journal.close(discard=True)
+            times.append(elapsed)
+        assert max(times) < FLAT * min(times), f"journaling an edit grows with the drawing: {times}"
+
+
+if __name__ == "__main__":
+    main()
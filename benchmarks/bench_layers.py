@@ -0,0 +1,150 @@
+"""Editing on top of a large static layer
+
+Run with ``python benchmarks/bench_layers.py [shapes]``. Fills the window
+with a dense background of shapes and edits a small layer above it, once
+with everything on one layer, where every background shape is a live
+canvas item, and once with the background on a layer of its own, which the
+view flattens into a single cached image. Reports the canvas items and the
+cost of selecting, drawing, dragging, undoing and panning, checks that the
+edits never render the background again and that the image shows it where
+its items were. The fake canvas does not paint, but Tk repaints every item
+under a changed area, so the item count is what real redraws scale with.
+"""
+import math
+import random
+import sys
+import time
+
+from fakecanvas import Event, headless_app
+
+from render import rgb
+from scene import IMAGE_DELAY_MS, Shape
+
+COUNT = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+EDITS = 50
+BAND = 200  # the background leaves the top of the window free, as pressing a shape would pick it
+COLORS = ("#3366cc", "#dc3912", "#ff9900", "#109618", "#990099", "#0099c6")
+
+
+def make_background(count, width, height):
+    rng = random.Random(19)
+    shapes = []
+    for i in range(count):
+        x, y = rng.uniform(0, width - 30), rng.uniform(BAND, height - 30)
+        w, h = rng.uniform(8, 30), rng.uniform(8, 30)
+        kind = ("rectangle", "oval")[i % 2]
+        shapes.append(Shape(kind, (x, y, x + w, y + h), outline="", fill=COLORS[i % len(COLORS)], width=1))
+    return shapes
+
+
+def settle(app):
+    """Let the view render its layer images"""
+    time.sleep(IMAGE_DELAY_MS / 1000)
+    app.root.run()
+
+
+def timed(app, action):
+    """Return the milliseconds ``action`` and the frame callbacks it queued take"""
+    busy = app.root.busy
+    start = time.perf_counter()
+    action()
+    elapsed = time.perf_counter() - start
+    app.root.run()
+    return (elapsed + app.root.busy - busy) * 1000
+
+
+def session(layered):
+    app = headless_app()
+    viewport = app.view.viewport
+    background = make_background(COUNT, viewport.width, viewport.height)
+    for shape in background:
+        app.scene.add(shape)
+    if layered:
+        start = time.perf_counter()
+        app.new_layer()
+        settle(app)
+        print(f"background flattened into an image in {(time.perf_counter() - start) * 1000:.0f} ms")
+    renders = app.view.cache.renders
+
+    # Draw a few shapes to edit
+    app.current_shape = "rectangle"
+    costs = {"draw": [], "select": [], "drag": [], "undo": [], "pan": []}
+    for i in range(EDITS):
+        x, y = 20 + (i % 10) * 70, 5 + (i // 10) * 40
+
+        def draw():
+            app.on_press(Event(x, y))
+            app.on_drag(Event(x + 40, y + 30))
+            app.on_release(Event(x + 40, y + 30))
+        costs["draw"].append(timed(app, draw))
+    drawn = sorted(app.scene.active.shapes, key=lambda shape: shape.seq)[-EDITS:]
+
+    app.current_shape = "select"
+    for i, shape in enumerate(drawn):
+        x, y = shape.coords[0] + 20, shape.coords[1] + 15
+
+        def select():
+            app.on_press(Event(x, y))
+            app.on_release(Event(x, y))
+        costs["select"].append(timed(app, select))
+        assert app.selection == {shape}
+
+        def drag():
+            app.on_press(Event(x, y))
+            app.on_drag(Event(x + 5, y + 5))
+            app.on_release(Event(x + 5, y + 5))
+        costs["drag"].append(timed(app, drag))
+
+    for _ in range(EDITS):
+        costs["undo"].append(timed(app, app.undo))
+
+    # Round a circle, well inside the margin the background image has around the window
+    app.on_pan_start(Event(450, 300))
+    for i in range(1, EDITS + 1):
+        angle = 2 * math.pi * i / EDITS
+        event = Event(400 + 50 * math.cos(angle), 300 + 50 * math.sin(angle))
+        costs["pan"].append(timed(app, lambda: app.on_pan(event)))
+    settle(app)
+
+    if layered:
+        # Editing the active layer, selecting and short pans never render the background again
+        assert app.view.cache.renders == renders, (app.view.cache.renders, renders)
+        check_image(app, background)
+    return app.view.item_count(), {name: sorted(times)[len(times) // 2] for name, times in costs.items()}
+
+
+def check_image(app, background):
+    """The background image has the color of the topmost shape in the middle of shapes, where the window shows it"""
+    item, image = app.view.images["below"]
+    left, top = app.canvas.coords(item)
+    viewport = app.view.viewport
+    index = background[0].layer.index
+    checked = 0
+    for shape in background[::len(background) // 500 or 1]:
+        x1, y1, x2, y2 = shape.coords
+        x, y = (x1 + x2) / 2, (y1 + y2) / 2
+        # Skip points within a pixel and a half of the edge of the shape on top
+        tops = {index.shape_at(x + dx, y + dy, 0) for dx in (-1.5, 0, 1.5) for dy in (-1.5, 0, 1.5)}
+        if len(tops) > 1:
+            continue
+        sx, sy = viewport.to_screen((x, y))
+        pixel = image.getpixel((math.floor(sx - left), math.floor(sy - top)))
+        assert pixel == (*rgb(tops.pop().fill), 255), (x, y, pixel)
+        checked += 1
+    assert checked > 100
+
+def main():
+    print(f"{COUNT} background shapes in the window, {EDITS} edits of each kind on a layer above")
+    results = {}
+    for layered in (False, True):
+        results[layered] = session(layered)
+    print(f"{'':<18}{'items':>8}" + "".join(f"{name:>10}" for name in results[False][1]) + "   (ms, median)")
+    for layered, label in ((False, "one layer"), (True, "cached layer")):
+        items, costs = results[layered]
+        print(f"{label:<18}{items:>8}" + "".join(f"{cost:>10.2f}" for cost in costs.values()))
+    assert results[True][0] < results[False][0] / 10
+    print("the background stays one cached image while the layer above is edited")
+
+
+if __name__ == "__main__":
+    main()
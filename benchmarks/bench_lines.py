@@ -0,0 +1,91 @@
+"""Size of drawings with DDA lines, before and after storing lines by endpoints
+
+Run with ``python benchmarks/bench_lines.py [lines]``. Writes a JSON drawing
+the way older versions saved lines (one polyline vertex per DDA pixel),
+opens it in a headless app, which migrates the lines, and saves it again.
+Reports both file sizes, the load time next to the time just decoding the
+old JSON takes, and checks every line kept its endpoints.
+"""
+import json
+import math
+import os
+import random
+import sys
+import tempfile
+import time
+
+from fakecanvas import Event, headless_app
+
+import journal
+from bench_raster import loop_dda
+from loader import DrawingLoader
+from saver import save_snapshot
+
+COUNT = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+MIN_LENGTH = 500
+MAX_LENGTH = 1500
+
+
+def main():
+    rng = random.Random(3)
+    endpoints = []
+    records = []
+    for i in range(COUNT):
+        # Strokes of 500 to 1500 px: a record costs about 100 bytes whatever
+        # its length, so the saving grows with the length of the lines
+        length = rng.uniform(MIN_LENGTH, MAX_LENGTH)
+        angle = rng.uniform(0, 2 * math.pi)
+        x1, y1 = rng.randint(0, 2000), rng.randint(0, 2000)
+        x2, y2 = round(x1 + length * math.cos(angle)), round(y1 + length * math.sin(angle))
+        endpoints.append((x1, y1, x2, y2))
+        records.append({"type": "line", "coords": loop_dda(x1, y1, x2, y2),
+                        "options": {"fill": "#000000", "width": 2}})
+    # A few hand-drawn style polylines, which must keep their shape
+    records.append({"type": "line", "coords": [0, 0, 10, 0, 20, 0, 20, 30, 5, 7],
+                    "options": {"fill": "#ff0000", "width": 1}})
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # The journal the open starts stays out of the user's own
+        journal.JOURNAL_DIR = tmp
+        old_path = os.path.join(tmp, "old.json")
+        new_path = os.path.join(tmp, "new.json")
+        with open(old_path, "w") as f:
+            json.dump(records, f)
+
+        app = headless_app()
+        start = time.perf_counter()
+        app.loader = DrawingLoader(app.root, app.scene, old_path, app.on_loading_progress, app.on_loading_done)
+        app.loader.start()
+        app.root.run()
+        load = time.perf_counter() - start
+        start = time.perf_counter()
+        with open(old_path) as f:
+            json.load(f)
+        decode = time.perf_counter() - start
+        save_snapshot(new_path, app.scene.snapshot())
+
+        old_size = os.path.getsize(old_path)
+        new_size = os.path.getsize(new_path)
+        print(f"{COUNT} DDA lines of {MIN_LENGTH} to {MAX_LENGTH} px")
+        print(f"old per-pixel JSON   {old_size / 1e6:10.2f} MB")
+        print(f"endpoint JSON        {new_size / 1e6:10.2f} MB   {old_size / new_size:.0f}x smaller")
+        print(f"open with migration  {load:10.2f} s")
+        print(f"  decoding the JSON  {decode:10.2f} s")
+
+        shapes = app.scene.ordered()
+        assert [shape.coords for shape in shapes[:COUNT]] == [tuple(map(float, e)) for e in endpoints]
+        assert shapes[-1].coords == (0.0, 0.0, 20.0, 0.0, 20.0, 30.0, 5.0, 7.0)
+        assert old_size / new_size > 100
+        print("every DDA line kept its endpoints; other polylines lost only collinear vertices")
+
+        # New lines are stored by their endpoints right away
+        app.on_press(Event(-5000, -5000))
+        app.on_drag(Event(-4600, -4800))
+        app.root.run()
+        app.on_release(Event(-4600, -4800))
+        assert app.scene.ordered()[-1].coords == (-5000.0, -5000.0, -4600.0, -4800.0)
+        app.journal.close(discard=True)
+
+
+if __name__ == "__main__":
+    main()
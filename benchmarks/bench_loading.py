@@ -0,0 +1,120 @@
+"""Responsiveness of File > Open while a large drawing streams in
+
+Run with ``python benchmarks/bench_loading.py [max shapes]``. Opens JSON and
+.cgd drawings of growing size in a headless app and reports the time until
+the first shapes reach the canvas, the longest stall and the total load
+time. A stall is the longest gap in a heartbeat the main loop runs every
+``BEAT_MS`` (how long input could be held up), from the open until the
+journal has written the loaded drawing, since the journal's writer holds the
+GIL too; it must stay under ``MAX_STALL``. Gaps that span a full garbage
+collection are reported apart: the loader puts those off until the drawing
+is in, and then one rescans every shape (about a second per million here).
+Each load is also cancelled half way once to check the previous drawing
+comes back.
+"""
+import gc
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+from fakecanvas import headless_app, Event
+
+import binformat
+import journal
+from loader import DrawingLoader
+from shapestore import ShapeStore
+from bench_shapestore import make_shapes
+
+MAX_COUNT = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+BEAT_MS = 5
+MAX_STALL = 0.25  # seconds: a few frame budgets, shared with the parser thread
+
+
+def write_files(tmp, count):
+    shapes = make_shapes(count)
+    json_path = os.path.join(tmp, f"drawing{count}.json")
+    with open(json_path, "w") as f:
+        json.dump([shape.to_dict() for shape in shapes], f)
+    binary_path = os.path.join(tmp, f"drawing{count}" + binformat.EXTENSION)
+    binformat.write_drawing(binary_path, ShapeStore.from_shapes(shapes))
+    return json_path, binary_path
+
+
+def open_file(app, path):
+    app.loader = DrawingLoader(app.root, app.scene, path, app.on_loading_progress, app.on_loading_done)
+    app.loader.start()
+
+
+def measure(path, count):
+    gc.collect()  # the previous measure's drawing
+    app = headless_app()
+    closing = threading.Thread(target=lambda: app.journal.close(discard=True))
+    beats = [time.perf_counter(), 0.0, 0.0]  # last beat, longest gap, longest with a full collection
+    full = []  # full collections since the last beat
+
+    def on_collect(phase, info):
+        if phase == "start" and info["generation"] == 2:  # the main loop may run before "stop" is reported
+            full.append(info)
+
+    def beat():
+        now = time.perf_counter()
+        slot = 2 if full else 1
+        beats[slot] = max(beats[slot], now - beats[0] - BEAT_MS / 1000)
+        beats[0] = now
+        full.clear()
+        if app.loader is not None or closing.is_alive():
+            app.root.after(BEAT_MS, beat)
+
+    gc.callbacks.append(on_collect)
+    start = time.perf_counter()
+    open_file(app, path)
+    app.root.after(BEAT_MS, beat)
+    app.root.run(until=lambda: len(app.scene) > 0)
+    first = time.perf_counter() - start
+    app.root.run(until=lambda: app.loader is None)
+    total = time.perf_counter() - start
+    assert len(app.scene) == count
+    # Keep beating until the writer has the loaded drawing on disk
+    closing.start()
+    app.root.run()
+    closing.join()
+    gc.callbacks.remove(on_collect)
+    return first, beats[1], beats[2], total
+
+
+def check_cancel(path):
+    app = headless_app()
+    app.current_shape = "rectangle"
+    for i in range(10):
+        app.on_press(Event(i, i))
+        app.on_release(Event(i + 5, i + 5))
+    before = [shape.to_dict() for shape in app.scene.ordered()]
+    open_file(app, path)
+    app.root.run(until=lambda: app.loader.loaded > 5000)
+    app.cancel_loading()
+    assert app.loader is None
+    assert [shape.to_dict() for shape in app.scene.ordered()] == before
+    assert len(app.canvas.items) == len(before)
+
+
+def main():
+    print(f"{'shapes':>8} {'format':>6} {'first paint':>12} {'longest stall':>14} {'full gc':>10} {'total':>9}")
+    with tempfile.TemporaryDirectory() as tmp:
+        journal.JOURNAL_DIR = tmp
+        count = 10000
+        while count <= MAX_COUNT:
+            for label, path in zip(("json", "cgd"), write_files(tmp, count)):
+                first, longest, collecting, total = measure(path, count)
+                print(f"{count:>8} {label:>6} {first * 1000:>9.1f} ms {longest * 1000:>11.1f} ms "
+                      f"{collecting * 1000:>7.1f} ms {total:>7.2f} s")
+                assert longest < MAX_STALL, f"{label} open of {count} shapes held the main loop {longest:.3f} s"
+                if count == 10000:
+                    check_cancel(path)
+            count *= 10
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""Memory report: canvas items outside the view, estimates against tracemalloc, report cost
+
+Run with ``python benchmarks/bench_memory.py [shapes]``. Draws polygons
+through the app's handlers and checks that no vertex markers are left on
+the canvas once they are finished or abandoned. Then fills a drawing while
+tracemalloc traces it and compares the report's structural estimates of the
+scene, its index and the view with the memory traced meanwhile, times the report, and
+shows the snapshot diff of deleting everything and undoing it.
+"""
+import random
+import sys
+import time
+
+from fakecanvas import Event, headless_app
+
+from history import ClearCommand
+from scene import Shape
+
+COUNT = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+
+
+def make_shapes(count):
+    rng = random.Random(23)
+    shapes = []
+    for i in range(count):
+        x, y = rng.uniform(0, 5000), rng.uniform(0, 5000)
+        kind = ("line", "rectangle", "oval", "polygon")[i % 4]
+        coords = (x, y, x + 10, y + 10, x, y + 10) if kind == "polygon" else (x, y, x + 10, y + 10)
+        shapes.append(Shape(kind, coords, outline="#000000", fill="#3366cc", width=1))
+    return shapes
+
+
+def polygons(app):
+    """Finish and abandon polygons; the canvas keeps only the view's items"""
+    app.tool_buttons = {}
+    app.set_shape("polygon")
+    for i in range(20):
+        x, y = 20 + i * 30, 500
+        for dx, dy in ((0, 0), (20, 0), (10, 20)):
+            app.on_press(Event(x + dx, y + dy))
+        app.on_double_click(Event(x + 10, y + 20))
+    canvas = app.memory.canvas_items()
+    assert len(app.scene) == 20 and canvas["gap"] == 0, canvas
+    # Half a polygon, then another tool: the markers go with the points
+    app.on_press(Event(100, 100))
+    app.on_press(Event(140, 100))
+    assert app.memory.canvas_items()["by_tag"]["vertex"] == 2
+    app.set_shape("rectangle")
+    assert app.memory.canvas_items()["gap"] == 0
+    print("no vertex markers left after finished or abandoned polygons")
+
+
+def main():
+    app = headless_app()
+    polygons(app)
+
+    app.memory.mark()
+    start = time.perf_counter()
+    for shape in make_shapes(COUNT):
+        app.scene.add(shape)
+    print(f"{COUNT} shapes added in {time.perf_counter() - start:.2f} s while traced")
+    start = time.perf_counter()
+    report = app.memory.report()
+    print(f"report in {(time.perf_counter() - start) * 1000:.0f} ms")
+    print("\n".join(app.memory.summary(report)))
+
+    # The structures the estimates cover are most of what adding the shapes allocated
+    before = app.memory.marked[1]
+    traced = report["traced"]["current"] - before["traced"]["current"]
+    estimated = sum(report["estimates"][name] - before["estimates"][name] for name in ("scene", "index", "view"))
+    print(f"scene, index and view: estimated {estimated / 2**20:.1f} MB, traced {traced / 2**20:.1f} MB")
+    assert 0.75 < estimated / traced < 1.25
+
+    app.memory.mark()
+    removed = app.scene.ordered()
+    for shape in removed:
+        app.scene.remove(shape)
+    app.save_state(ClearCommand(removed))
+    app.undo()
+    lines = app.memory.diff(limit=10)
+    print("\n".join(lines))
+    assert any(line.lstrip().startswith("history") for line in lines)
+
+
+if __name__ == "__main__":
+    main()
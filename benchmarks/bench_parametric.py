@@ -0,0 +1,69 @@
+"""Parametric shapes: fitted unit templates against computing the vertices per event
+
+Run with ``python benchmarks/bench_parametric.py [shapes]``. Times the
+preview coords of a star drag the way ``add feature.py`` computed them
+(cos and sin of every vertex, every event) against fitting the registered
+star's template, then generates the coords of many drags of every registered
+shape one at a time and with ``batch``. Checks that all of them agree.
+"""
+import math
+import sys
+import time
+
+import numpy as np
+
+import fakecanvas  # noqa: F401  (puts the app's modules on the path)
+import parametric
+
+COUNT = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+
+
+def star_per_event(x1, y1, x2, y2):
+    """The star as add feature.py computed it on every motion event"""
+    cx, cy = (x1 + x2) / 2, (y1 + y2) / 2
+    radius_outer = math.sqrt((x2 - x1) ** 2 + (y2 - y1) ** 2) / 2
+    radius_inner = radius_outer * 0.4
+    points = []
+    for i in range(10):
+        angle = math.pi / 2 - (i * 2 * math.pi / 10)
+        radius = radius_outer if i % 2 == 0 else radius_inner
+        points.extend([cx + radius * math.cos(angle), cy - radius * math.sin(angle)])
+    return points
+
+
+def per_call(function, drags):
+    start = time.perf_counter()
+    for drag in drags:
+        function(*drag)
+    return (time.perf_counter() - start) / len(drags) * 1e6
+
+
+def main():
+    rng = np.random.default_rng(25)
+    drags = rng.uniform(0, 800, (COUNT, 4))
+    rows = drags.tolist()
+    star = parametric.SHAPES["star"]
+    old = per_call(star_per_event, rows[:20000])
+    new = per_call(star.coords, rows[:20000])
+    print(f"star preview, cos/sin per event  {old:6.2f} us")
+    print(f"star preview, fitted template    {new:6.2f} us")
+    assert new < old
+    assert all(np.allclose(star.coords(*row), star_per_event(*row)) for row in rows[:1000])
+
+    print(f"{COUNT} drags of each shape:")
+    for shape in parametric.SHAPES.values():
+        start = time.perf_counter()
+        one_by_one = [shape.coords(*row) for row in rows]
+        single = time.perf_counter() - start
+        start = time.perf_counter()
+        batch = shape.batch(*drags.T)
+        batched = time.perf_counter() - start
+        assert np.allclose(batch, one_by_one)
+        print(f"  {shape.name:<10} {len(shape.template):>3} vertices   one at a time {single * 1000:8.1f} ms   "
+              f"batch {batched * 1000:6.1f} ms")
+        assert batched < single
+    print("templates match the per-event vertices; batches match the shapes drawn one at a time")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""Drag preview cost with motion events arriving faster than frames
+
+Run with ``python benchmarks/bench_preview.py [shapes]``. Draws shapes on a
+headless canvas holding a large scene while a 1000 Hz mouse reports
+``EVENTS_PER_FRAME`` motion events per 60 Hz frame. Reports the time to
+handle one frame's worth of events and the canvas calls it takes, and checks
+that the preview is a single item updated in place.
+"""
+import sys
+import time
+
+from fakecanvas import Event, headless_app
+
+from bench_shapestore import make_shapes
+
+COUNT = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+FRAMES = 200
+EVENTS_PER_FRAME = 16  # 1000 Hz mouse, 60 Hz display
+FRAME = 1 / 60
+
+
+def main():
+    app = headless_app()
+    for shape in make_shapes(COUNT):
+        app.scene.add(shape)
+    canvas = app.canvas
+    print(f"{'tool':<10} {'frame median':>14} {'frame max':>11} {'calls/frame':>12}")
+    for tool in ("line", "rectangle", "oval", "circle"):
+        app.current_shape = tool
+        app.deselect()
+        x, y = -100, -100  # outside the drawing, so the press does not grab a shape
+        app.on_press(Event(x, y))
+        preview = app.temp_shape
+        times = []
+        calls = canvas.calls
+        for frame in range(FRAMES):
+            start = time.perf_counter()
+            for i in range(EVENTS_PER_FRAME):
+                app.on_drag(Event(x - frame - i / EVENTS_PER_FRAME, y - frame))
+            submitted = time.perf_counter() - start
+            busy = app.root.busy
+            app.root.run()  # waits for the frame, which is not counted
+            times.append(submitted + app.root.busy - busy)
+            assert app.temp_shape == preview
+        calls = (canvas.calls - calls) / FRAMES
+        times.sort()
+        print(f"{tool:<10} {times[len(times) // 2] * 1e6:>11.1f} us {times[-1] * 1e6:>8.1f} us "
+              f"{calls:>12.1f}")
+        assert times[len(times) // 2] < FRAME
+        app.on_release(Event(x - FRAMES, y - FRAMES))
+        assert preview not in canvas.items
+    print("one preview item per gesture, updated in place once per frame")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""Vectorized rasterization against pure Python stepping loops
+
+Run with ``python benchmarks/bench_raster.py [primitives]``. Rasterizes a
+batch of random lines, circles and ellipses with the raster module, times
+the pure Python loops they replace (the DDA loop ``on_release`` used, and
+textbook Bresenham and midpoint loops) and checks that both give the same
+pixels.
+"""
+import random
+import sys
+import time
+
+import numpy as np
+
+import fakecanvas  # noqa: F401  (puts the project on sys.path)
+import raster
+
+COUNT = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+MAX_LENGTH = 64
+CHECKS = 500
+
+
+def loop_dda(x1, y1, x2, y2):
+    # The loop on_release used before the raster module
+    dx = x2 - x1
+    dy = y2 - y1
+    steps = max(abs(dx), abs(dy))
+    if steps == 0:
+        return [round(x1), round(y1)]
+    x_increment = dx / steps
+    y_increment = dy / steps
+    x, y = x1, y1
+    points = []
+    for i in range(int(steps) + 1):
+        points.extend([round(x), round(y)])
+        x += x_increment
+        y += y_increment
+    return points
+
+
+def loop_bresenham(x1, y1, x2, y2):
+    dx, dy = abs(x2 - x1), abs(y2 - y1)
+    sx = 1 if x2 >= x1 else -1
+    sy = 1 if y2 >= y1 else -1
+    swap = dy > dx
+    if swap:
+        dx, dy = dy, dx
+    x, y = x1, y1
+    d = 2 * dy - dx
+    points = []
+    for i in range(dx + 1):
+        points.extend([x, y])
+        if d > 0:
+            if swap:
+                x += sx
+            else:
+                y += sy
+            d -= 2 * dx
+        d += 2 * dy
+        if swap:
+            y += sy
+        else:
+            x += sx
+    return points
+
+
+def loop_circle(cx, cy, r):
+    x, y, p = 0, r, 1 - r
+    points = []
+    while True:
+        points.extend([cx + x, cy + y, cx - x, cy + y, cx + x, cy - y, cx - x, cy - y,
+                       cx + y, cy + x, cx - y, cy + x, cx + y, cy - x, cx - y, cy - x])
+        if x >= y:
+            return points
+        x += 1
+        if p < 0:
+            p += 2 * x + 1
+        else:
+            y -= 1
+            p += 2 * (x - y) + 1
+
+
+def loop_ellipse(cx, cy, rx, ry):
+    points = []
+
+    def plot(x, y):
+        points.extend([cx + x, cy + y, cx - x, cy + y, cx + x, cy - y, cx - x, cy - y])
+    a2, b2 = rx * rx, ry * ry
+    x, y = 0, ry
+    p = b2 - a2 * ry + a2 / 4
+    plot(x, y)
+    while b2 * x < a2 * y:
+        x += 1
+        if p < 0:
+            p += 2 * b2 * x + b2
+        else:
+            y -= 1
+            p += 2 * b2 * x - 2 * a2 * y + b2
+        plot(x, y)
+    p = b2 * (x + 0.5) ** 2 + a2 * (y - 1) ** 2 - a2 * b2
+    while y > 0:
+        y -= 1
+        if p > 0:
+            p += a2 - 2 * a2 * y
+        else:
+            x += 1
+            p += 2 * b2 * x - 2 * a2 * y + a2
+        plot(x, y)
+    return points
+
+
+def compare(name, batch, loop, args, tolerance=0):
+    arrays = [np.array(a) for a in args]
+    vectorized = float("inf")
+    for attempt in range(3):  # the first run also pays for faulting in fresh memory
+        start = time.perf_counter()
+        points, offsets = batch(*arrays)
+        vectorized = min(vectorized, time.perf_counter() - start)
+    start = time.perf_counter()
+    expected = [loop(*row) for row in zip(*args)]
+    looped = time.perf_counter() - start
+    print(f"{name:<10} {len(points):>10} px {vectorized * 1000:>9.1f} ms {looped * 1000:>10.1f} ms "
+          f"{looped / vectorized:>7.0f}x")
+    flat = points.ravel()
+    for i in random.Random(1).sample(range(COUNT), min(CHECKS, COUNT)):
+        pixels = flat[2 * offsets[i]:2 * offsets[i + 1]].tolist()
+        assert len(pixels) == len(expected[i]), (name, i)
+        assert all(abs(a - b) <= tolerance for a, b in zip(pixels, expected[i])), (name, i)
+
+
+def main():
+    rng = random.Random(7)
+    x1 = [rng.randint(0, 4000) for _ in range(COUNT)]
+    y1 = [rng.randint(0, 4000) for _ in range(COUNT)]
+    x2 = [x + rng.randint(-MAX_LENGTH, MAX_LENGTH) for x in x1]
+    y2 = [y + rng.randint(-MAX_LENGTH, MAX_LENGTH) for y in y1]
+    r1 = [rng.randint(0, MAX_LENGTH // 2) for _ in range(COUNT)]
+    r2 = [rng.randint(0, MAX_LENGTH // 2) for _ in range(COUNT)]
+    print(f"{COUNT} primitives of up to {MAX_LENGTH} px")
+    print(f"{'':<10} {'pixels':>13} {'vectorized':>12} {'Python loop':>13} {'speedup':>8}")
+    # The loop adds the increment up step by step, so rounding drifts by a pixel at times
+    compare("dda", raster.dda_lines, loop_dda, (x1, y1, x2, y2), tolerance=1)
+    compare("bresenham", raster.bresenham_lines, loop_bresenham, (x1, y1, x2, y2))
+    compare("circle", raster.midpoint_circles, loop_circle, (x1, y1, r1))
+    compare("ellipse", raster.midpoint_ellipses, loop_ellipse, (x1, y1, r1, r2))
+    print(f"{CHECKS} primitives of each kind match the stepping loops (DDA within a pixel)")
+
+
+if __name__ == "__main__":
+    main()
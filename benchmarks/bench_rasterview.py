@@ -0,0 +1,117 @@
+"""Redraw cost of the raster renderer against the area that changed
+
+Run with ``python benchmarks/bench_rasterview.py [max shapes]``. Fills
+drawings of growing size at the same density, about 10000 shapes per window,
+and shows them with ``--renderer raster``. Drags shapes of several sizes
+across the window and reports the cost of each frame's redraw and the
+pixels it rendered, which follow the size of the dragged shape and not the
+number of shapes, then the cost of panning and of a full redraw. Checks the
+framebuffer against rendering the whole window at once.
+"""
+import math
+import random
+import sys
+import time
+
+from fakecanvas import Event, headless_app
+
+from scene import Shape
+
+MAX_COUNT = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+DENSITY = 10000  # shapes per window area
+SIZES = (8, 32, 128)  # window pixels across the dragged shapes
+FRAMES = 30
+
+
+def make_shapes(count, width, height):
+    rng = random.Random(20)
+    shapes = []
+    for i in range(count):
+        x, y = rng.uniform(0, width), rng.uniform(0, height)
+        w, h = rng.uniform(4, 24), rng.uniform(4, 24)
+        kind = ("rectangle", "oval", "line")[i % 3]
+        shapes.append(Shape(kind, (x, y, x + w, y + h), outline="#000000", fill=f"#{rng.randrange(1 << 24):06x}",
+                            width=1))
+    return shapes
+
+
+def frame(app, handler, event):
+    """Handle one event and run the frame it queues; return the seconds spent and pixels rendered"""
+    rendered = app.view.rendered
+    busy = app.root.busy
+    start = time.perf_counter()
+    handler(event)
+    elapsed = time.perf_counter() - start
+    app.root.run()
+    return elapsed + app.root.busy - busy, app.view.rendered - rendered
+
+
+def check_frame(app):
+    """The framebuffer, and the screen, hold what rendering the whole window gives"""
+    view = app.view
+    height, width = view.frame.shape[:2]
+    frame = view.frame.copy()
+    view._render((0, 0, width, height))
+    assert (view.frame == frame).all()
+    assert (view.screen.pixels == frame).all()
+
+
+def report(label, results):
+    times = sorted(seconds for seconds, pixels in results)
+    pixels = sorted(pixels for seconds, pixels in results)
+    print(f"{label:<28} median {times[len(times) // 2] * 1000:7.2f} ms   "
+          f"{pixels[len(pixels) // 2]:>8} px rendered per frame")
+    return times[len(times) // 2]
+
+
+def main():
+    medians = {}
+    count = 10000
+    while count <= MAX_COUNT:
+        app = headless_app("raster")
+        viewport = app.view.viewport
+        # The same density whatever the count: a bigger drawing, of which the window shows a part
+        scale = math.sqrt(count / DENSITY)
+        for shape in make_shapes(count, viewport.width * scale, viewport.height * scale):
+            app.scene.add(shape)
+        app.root.run()
+        print(f"{count} shapes, {DENSITY} in the {viewport.width}x{viewport.height} window")
+
+        app.current_shape = "select"
+        for size in SIZES:
+            # On top of everything else, so pressing it picks it
+            shape = Shape("rectangle", (200, 200, 200 + size, 200 + size), outline="#000000", fill="#ff0000",
+                          width=2)
+            app.scene.add(shape)
+            app.root.run()
+            x, y = 200 + size / 2, 200 + size / 2
+            app.on_press(Event(x, y))
+            assert app.selection == {shape}
+            results = [frame(app, app.on_drag, Event(x + 4 * i, y + 2 * i)) for i in range(1, FRAMES + 1)]
+            app.on_release(Event(x + 4 * FRAMES, y + 2 * FRAMES))
+            app.root.run()
+            medians[count, size] = report(f"  drag {size}x{size} px shape", results)
+        app.deselect()
+        app.root.run()
+        check_frame(app)
+
+        app.on_pan_start(Event(400, 300))
+        report("  pan by 5x3 px", [frame(app, app.on_pan, Event(400 - 5 * i, 300 - 3 * i))
+                                   for i in range(1, FRAMES + 1)])
+        check_frame(app)
+        report("  full redraw (zoom)", [frame(app, lambda event: app.zoom(1.25 if i % 2 else 0.8, 400, 300), None)
+                                        for i in range(6)])
+        check_frame(app)
+        count *= 10
+
+    # More shapes in the drawing but not in the window do not slow the frames down
+    smallest = min(count for count, size in medians)
+    largest = max(count for count, size in medians)
+    for size in SIZES:
+        assert medians[largest, size] < 3 * medians[smallest, size] + 0.002
+    assert medians[smallest, SIZES[0]] < medians[smallest, SIZES[-1]]
+    print("frame cost follows the area that changed, not the number of shapes; the framebuffer is exact")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""Offscreen rendering and PNG export of large drawings
+
+Run with ``python benchmarks/bench_render.py [size]``. Exports a drawing
+spread over a size x size image (20000 by default) with 1 to cpu_count
+worker processes, reporting the export time and the peak memory of the
+exporting process and its workers, which must stay far below the size of
+the whole image. Also checks tiled and parallel output against rendering a
+small box in one go, and exports from a headless app on its save thread.
+"""
+import os
+import random
+import resource
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+from functools import partial
+
+from PIL import Image, ImageChops
+
+from fakecanvas import headless_app
+
+import render
+from saver import DrawingSaver
+from scene import Shape
+from shapestore import ShapeStore
+
+SIZE = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+COUNT = 50000
+
+
+def make_shapes(size, count):
+    rng = random.Random(5)
+    colors = ["#000000", "#ff0000", "#00aa00", "#0000ff", ""]
+    shapes = []
+    for i in range(count):
+        x, y = rng.uniform(0, size), rng.uniform(0, size)
+        w, h = rng.uniform(-80, 80), rng.uniform(-80, 80)
+        kind = ("line", "rectangle", "oval", "polygon")[i % 4]
+        coords = (x, y, x + w, y, x + w / 2, y + h) if kind == "polygon" else (x, y, x + w, y + h)
+        shapes.append(Shape(kind, coords, outline=rng.choice(colors), fill=rng.choice(colors),
+                            width=rng.randint(1, 6)))
+    return shapes
+
+
+def export(path, workers):
+    """Export in this process and print the time and peak memory, for the parent to read"""
+    store = ShapeStore.from_shapes(make_shapes(SIZE, COUNT))
+    start = time.perf_counter()
+    render.export_png(path, store, (0, 0, SIZE, SIZE), workers=workers)
+    elapsed = time.perf_counter() - start
+    peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    print(elapsed, peak * 1024)
+
+
+def check_tiles():
+    # Shapes crossing tile edges, thick outlines and fractional coordinates
+    store = ShapeStore.from_shapes(make_shapes(1500, 3000) + [
+        Shape("line", (0, 0, 100.5, 300.25, 400, 5), fill="red", width=5),
+        Shape("oval", (200.5, 200.5, 900.25, 700.75), outline="blue", fill="", width=7),
+        Shape("rectangle", (250, 250, 260, 260), outline="", fill="green", width=1),
+    ])
+    box = (-50, -50, 1450, 1350)
+    whole = render.render_image(store, box, tile_size=4096, workers=1)
+    for tile_size, workers in ((128, 1), (300, 2)):
+        tiled = render.render_image(store, box, tile_size=tile_size, workers=workers)
+        assert ImageChops.difference(whole, tiled).getbbox() is None, (tile_size, workers)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "check.png")
+        render.export_png(path, store, box, tile_size=200, workers=1)
+        with Image.open(path) as png:
+            assert ImageChops.difference(whole, png.convert("RGB")).getbbox() is None
+    print("tiled, parallel and streamed PNG output match a single render")
+
+
+def check_app():
+    app = headless_app()
+    for shape in make_shapes(800, 400):
+        app.scene.add(shape)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "app.png")
+        app.exporter = DrawingSaver(app.root, path, app.scene.snapshot(), app.on_export_done,
+                                    save=partial(render.export_snapshot, canvas_box=(0, 0, 1000, 600), workers=1))
+        app.exporter.start()
+        app.root.run()
+        assert app.exporter is None
+        with Image.open(path) as png:
+            # The drawing reaches past the canvas on the right and bottom
+            assert png.width >= 1000 and png.height > 800
+    print(f"app export stalled the UI for at most {app.root.longest * 1000:.1f} ms")
+
+
+def main():
+    check_tiles()
+    check_app()
+    image_mb = SIZE * SIZE * 3 / 1e6
+    print(f"{COUNT} shapes on a {SIZE}x{SIZE} image ({image_mb:.0f} MB as RGB), {os.cpu_count()} CPUs")
+    print(f"{'workers':>8} {'time':>9} {'peak RSS':>10}")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "big.png")
+        for workers in range(1, (os.cpu_count() or 1) + 1):
+            # A fresh process per run, so each peak is its own
+            out = subprocess.run([sys.executable, __file__, str(SIZE), "--export", path, str(workers)],
+                                 check=True, capture_output=True, text=True).stdout
+            elapsed, peak = map(float, out.split())
+            print(f"{workers:>8} {elapsed:>8.2f}s {peak / 1e6:>8.0f} MB")
+            # Memory holds a few rows of tiles, never the image
+            assert peak < 100e6 + 4 * SIZE * render.TILE_SIZE * 3
+        # Pillow refuses to open images this large; read the size from the header
+        with open(path, "rb") as f:
+            assert struct.unpack(">II", f.read(24)[16:]) == (SIZE, SIZE)
+        print(f"PNG {os.path.getsize(path) / 1e6:.1f} MB")
+
+
+if __name__ == "__main__":
+    if "--export" in sys.argv:
+        export(sys.argv[sys.argv.index("--export") + 1], int(sys.argv[-1]))
+    else:
+        main()
@@ -0,0 +1,82 @@
+"""Responsiveness of File > Save on large drawings
+
+Run with ``python benchmarks/bench_saving.py [max shapes]``. Saves drawings
+of growing size from a headless app as JSON and .cgd and reports the time
+the main thread spends taking the snapshot, the longest gap between main
+loop ticks while the worker writes (how long input could be held up) and the
+total save time. Shapes are moved during every save to check the file holds
+the drawing as it was when the save started.
+"""
+import gc
+import os
+import sys
+import tempfile
+import time
+
+from fakecanvas import headless_app
+
+import binformat
+import journal
+from loader import read_batches
+from bench_shapestore import make_shapes
+
+MAX_COUNT = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+
+
+def measure(app, path):
+    expected = app.scene.to_data()
+    gaps = []
+    last = [time.perf_counter()]
+
+    def tick():
+        # Stands in for Tk handling input while the save runs
+        now = time.perf_counter()
+        gaps.append(now - last[0])
+        last[0] = now
+        app.scene.move(shape, 1, 1)
+        if app.saver:
+            app.root.after(1, tick)
+
+    shape = next(iter(app.scene.shapes))
+    start = time.perf_counter()
+    app.save_drawing()
+    snapshot = time.perf_counter() - start
+    last[0] = time.perf_counter()
+    app.root.after(1, tick)
+    app.root.run()
+    total = time.perf_counter() - start
+
+    loaded = [s.to_dict() for batch, _ in read_batches(path, _Never()) for s in batch]
+    assert loaded == expected
+    return snapshot, max(gaps), total
+
+
+class _Never:
+    def is_set(self):
+        return False
+
+
+def main():
+    from tkinter import filedialog
+    print(f"{'shapes':>8} {'format':>6} {'snapshot':>10} {'longest stall':>14} {'total':>9}")
+    with tempfile.TemporaryDirectory() as tmp:
+        # The journal a first save starts stays out of the user's own
+        journal.JOURNAL_DIR = tmp
+        count = 10000
+        while count <= MAX_COUNT:
+            app = headless_app()
+            for shape in make_shapes(count):
+                app.scene.add(shape)
+            gc.collect()  # not a collection of the whole drawing in the middle of a save
+            for extension in (".json", binformat.EXTENSION):
+                path = os.path.join(tmp, f"drawing{count}{extension}")
+                filedialog.asksaveasfilename = lambda **options: path
+                snapshot, longest, total = measure(app, path)
+                print(f"{count:>8} {extension[1:]:>6} {snapshot * 1000:>7.1f} ms "
+                      f"{longest * 1000:>11.1f} ms {total:>7.2f} s")
+            app.journal.close(discard=True)
+            count *= 10
+
+
+if __name__ == "__main__":
+    main()
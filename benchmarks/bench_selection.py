@@ -0,0 +1,108 @@
+"""Rubber-band selection and group moves of large selections
+
+Run with ``python benchmarks/bench_selection.py [shapes]``. Selects about
+10k shapes with the Select tool's rubber band, drags them, and reports the
+cost and canvas calls of each motion event, of the release that moves the
+shapes in the scene, and of undoing the move. A motion event is timed from
+``on_drag`` through flushing its frame, so the handler's work is measured
+and not the wait for the next frame; it must make one canvas call, and the
+handler's own work apart from that call must take under a quarter frame.
+Checks that the move is one undo step and that drawing, canvas and index
+agree afterwards.
+"""
+import gc
+import sys
+import time
+
+from fakecanvas import Event, headless_app
+
+from bench_shapestore import make_shapes
+
+COUNT = int(sys.argv[1]) if len(sys.argv) > 1 else 250000
+MOTIONS = 120
+FRAME = 1 / 60
+
+
+def main():
+    app = headless_app()
+    # A window showing the whole drawing, so every shape has a canvas item
+    app.view.viewport.resize(6000, 6000)
+    app.view.refresh()
+    scene = app.scene
+    for shape in make_shapes(COUNT):
+        scene.add(shape)
+    gc.collect()  # not a collection of the whole drawing in the middle of the timed drags
+    canvas = app.canvas
+    app.current_shape = "select"
+
+    # Shapes lie in 5000x5000: a 1000x1000 band holds about 1/25 of them.
+    # The band must start on empty canvas, or the press grabs a shape
+    x = next(x for x in range(1000, 1100) if scene.index.shape_at(x, 1000) is None)
+    start = time.perf_counter()
+    app.on_press(Event(x, 1000))
+    app.on_drag(Event(2000, 2000))
+    app.root.run()
+    app.on_release(Event(2000, 2000))
+    print(f"rubber band selected {len(app.selection)} shapes in "
+          f"{(time.perf_counter() - start) * 1000:.1f} ms")
+    selection = sorted(app.selection, key=lambda shape: shape.seq)
+    before = [shape.coords for shape in selection]
+
+    grab = selection[len(selection) // 2]
+    x, y = grab.coords[0], grab.coords[1]
+    app.on_press(Event(x, y))
+    assert app.dragging and len(app.selection) == len(selection)
+    steps_before = len(app.history.undo_stack)
+    # The one tag move per event is a loop over every selected item in C in
+    # Tk, but in Python in FakeCanvas: time it apart from the handler's work
+    in_canvas = [0.0]
+    canvas_move = canvas.move
+
+    def timed_move(*args):
+        start = time.perf_counter()
+        canvas_move(*args)
+        in_canvas[0] += time.perf_counter() - start
+
+    canvas.move = timed_move
+    times = []
+    moves = []
+    calls = canvas.calls
+    for i in range(1, MOTIONS + 1):
+        in_canvas[0] = 0.0
+        start = time.perf_counter()
+        app.on_drag(Event(x + i, y + i / 2))
+        # Run the handler now rather than at the next frame: time the work, not the frame pacing
+        app.frames.flush(app.drag_to)
+        times.append(time.perf_counter() - start - in_canvas[0])
+        moves.append(in_canvas[0])
+    del canvas.move
+    calls = (canvas.calls - calls) / MOTIONS
+    times.sort()
+    moves.sort()
+    print(f"drag motion event            median {times[len(times) // 2] * 1e6:>8.1f} us   "
+          f"max {times[-1] * 1e6:>8.1f} us   {calls:.0f} canvas call(s) per event")
+    print(f"  + FakeCanvas tag move      median {moves[len(moves) // 2] * 1e6:>8.1f} us")
+    assert calls == 1
+    assert times[len(times) // 2] < FRAME / 4
+
+    start = time.perf_counter()
+    app.on_release(Event(x + MOTIONS, y + MOTIONS / 2))
+    print(f"release (move in scene)      {(time.perf_counter() - start) * 1000:8.1f} ms")
+    assert len(app.history.undo_stack) == steps_before + 1
+    dx, dy = MOTIONS, MOTIONS / 2
+    for shape, coords in zip(selection, before):
+        moved = [c + (dx if i % 2 == 0 else dy) for i, c in enumerate(coords)]
+        assert list(shape.coords) == moved == canvas.coords(shape.item)
+        assert scene.index.boxes[shape] == shape.bbox()
+
+    start = time.perf_counter()
+    app.undo()
+    print(f"undo group move              {(time.perf_counter() - start) * 1000:8.1f} ms")
+    for shape, coords in zip(selection, before):
+        for moved in (shape.coords, canvas.coords(shape.item)):
+            assert all(abs(a - b) < 1e-6 for a, b in zip(moved, coords))
+    print("group move is one undo step; scene, canvas and index agree")
+
+
+if __name__ == "__main__":
+    main()
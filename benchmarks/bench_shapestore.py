@@ -0,0 +1,74 @@
+"""Memory and bulk-operation cost of the columnar ShapeStore
+
+Run with ``python benchmarks/bench_shapestore.py [shapes]``. Compares the
+memory of a list of Shape objects, as the scene holds them, also when they
+were read from JSON, with the same drawing in a ShapeStore (the float64
+store is what the undo step of File > Open keeps), and times the vectorized
+bulk operations on the store.
+"""
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scene import Shape
+from shapestore import ShapeStore
+
+COUNT = int(sys.argv[1]) if len(sys.argv) > 1 else 500000
+
+
+def make_shapes(count):
+    random.seed(1)
+    colors = ["#000000", "#ff0000", "#00ff00", "#0000ff"]
+    shapes = []
+    for i in range(count):
+        x, y = random.uniform(0, 5000), random.uniform(0, 5000)
+        kind = ("line", "rectangle", "oval", "polygon")[i % 4]
+        coords = (x, y, x + 10, y + 10, x, y + 10) if kind == "polygon" else (x, y, x + 10, y + 10)
+        shapes.append(Shape(kind, coords, outline=random.choice(colors),
+                            fill=random.choice(colors), width=random.randint(1, 3)))
+    return shapes
+
+
+def timed(label, func):
+    start = time.perf_counter()
+    result = func()
+    print(f"{label:<28} {(time.perf_counter() - start) * 1000:>9.1f} ms")
+    return result
+
+
+def main():
+    tracemalloc.start()
+    shapes = make_shapes(COUNT)
+    objects = tracemalloc.get_traced_memory()[0]
+    store = timed("build store", lambda: ShapeStore.from_shapes(shapes))
+    undo_store = ShapeStore.from_shapes(shapes, np.float64)
+    # Every record has strings of its own, as after File > Open
+    start = tracemalloc.get_traced_memory()[0]
+    records = json.loads(json.dumps([shape.to_dict() for shape in shapes]))
+    loaded = [Shape.from_dict(record) for record in records]
+    del records
+    read = tracemalloc.get_traced_memory()[0] - start
+    assert len(loaded) == COUNT
+    print(f"{'Shape objects':<28} {objects / COUNT:>9.0f} bytes/shape")
+    print(f"{'Shape objects from JSON':<28} {read / COUNT:>9.0f} bytes/shape")
+    print(f"{'ShapeStore':<28} {store.nbytes / COUNT:>9.1f} bytes/shape")
+    print(f"{'float64 ShapeStore':<28} {undo_store.nbytes / COUNT:>9.1f} bytes/shape")
+    tracemalloc.stop()
+
+    timed("translate_all", lambda: store.translate_all(5, -5))
+    timed("bboxes", store.bboxes)
+    polygons = timed("filter_kind('polygon')", lambda: store.filter_kind("polygon"))
+    timed("translate polygons", lambda: store.translate(polygons, 1, 1))
+    timed("select polygons", lambda: store.select(polygons))
+    timed("to_shapes", store.to_shapes)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""Hit-testing and region queries on the scene's spatial index
+
+Run with ``python benchmarks/bench_spatial.py [shapes]``. Builds a headless
+scene, times point hit-tests, rectangle and k-nearest queries and the
+incremental index update of a move, and checks the answers against a brute
+force scan of every shape.
+"""
+import math
+import random
+import sys
+import time
+
+from fakecanvas import headless_app
+
+from bench_shapestore import make_shapes
+from spatial import hit_test, HIT_TOLERANCE
+
+COUNT = int(sys.argv[1]) if len(sys.argv) > 1 else 500000
+QUERIES = 2000
+CHECKS = 20
+
+
+def timed(label, func, args):
+    times = []
+    results = []
+    for arg in args:
+        start = time.perf_counter()
+        results.append(func(*arg))
+        times.append(time.perf_counter() - start)
+    times.sort()
+    print(f"{label:<28} median {times[len(times) // 2] * 1e6:>8.1f} us   "
+          f"p99 {times[int(len(times) * 0.99)] * 1e6:>8.1f} us")
+    return results
+
+
+def distance(s, x, y):
+    bx1, by1, bx2, by2 = s.bbox()
+    return math.hypot(max(bx1 - x, 0, x - bx2), max(by1 - y, 0, y - by2))
+
+
+def scanned(shapes, point, box):
+    """Return what shape_at and query_rect should answer, and the distances
+    nearest(k=10) should find, by scanning every shape"""
+    x, y = point
+    on = [s for s in shapes if hit_test(s, x, y, HIT_TOLERANCE)]
+    x1, y1, x2, y2 = box
+    inside = sorted((s for s in shapes if s.bbox()[0] <= x2 and x1 <= s.bbox()[2]
+                     and s.bbox()[1] <= y2 and y1 <= s.bbox()[3]), key=lambda s: s.seq)
+    nearest = sorted(distance(s, x, y) for s in shapes)[:10]
+    return max(on, key=lambda s: s.seq, default=None), inside, nearest
+
+
+def main():
+    rng = random.Random(7)
+    app = headless_app()
+    scene = app.scene
+    start = time.perf_counter()
+    for shape in make_shapes(COUNT):
+        scene.add(shape)
+    print(f"{COUNT} shapes added and indexed in {time.perf_counter() - start:.2f} s")
+    index = scene.index
+    shapes = list(scene.shapes)
+
+    points = [(rng.uniform(0, 5000), rng.uniform(0, 5000)) for _ in range(QUERIES)]
+    boxes = [(x, y, x + 200, y + 200) for x, y in points]
+    hits = timed("shape_at", index.shape_at, points)
+    rects = timed("query_rect 200x200", index.query_rect, boxes)
+    near = timed("nearest k=10", lambda x, y: index.nearest(x, y, 10), points)
+    for i in range(CHECKS):
+        x, y = points[i]
+        found = hits[i], rects[i], [distance(s, x, y) for s in near[i]]
+        assert found == scanned(shapes, points[i], boxes[i])
+    moved = [(rng.choice(shapes), rng.uniform(-50, 50), rng.uniform(-50, 50)) for _ in range(QUERIES)]
+    timed("move (with index update)", scene.move, moved)
+
+    for i in range(CHECKS):
+        x, y = points[i]
+        distances = [distance(s, x, y) for s in index.nearest(x, y, 10)]
+        found = index.shape_at(x, y), index.query_rect(*boxes[i]), distances
+        assert found == scanned(shapes, points[i], boxes[i])
+    print(f"{CHECKS} queries of each kind match a brute force scan, before and after the moves")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""Startup time, with the modules startup defers against importing them up front
+
+Run with ``python benchmarks/bench_startup.py [runs]``. Starts fresh
+interpreters that import the app, the way launching it does, and reports the
+median wall time of each process. The eager runs import the modules startup
+defers to first use as well (NumPy, Pillow, the file formats, the renderer,
+the other dialogs), as the app did before. With a display it also builds
+the window and waits for the first frame, launch to interactive canvas;
+without one, e.g. under plain SSH, run it under ``xvfb-run``.
+"""
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from instrument import DEFERRED_MODULES
+
+RUNS = int(sys.argv[1]) if len(sys.argv) > 1 else 15
+EAGER = "import " + ", ".join(DEFERRED_MODULES) + ", PIL.Image, PIL.ImageTk\n"
+LAUNCH = """
+import tempfile
+import tkinter as tk
+import journal
+journal.JOURNAL_DIR = tempfile.mkdtemp()  # no recovery prompt from an earlier crash
+root = tk.Tk()
+app = WORK_Cgpro.DrawingApp(root)
+root.update()  # until the first frame is drawn and Tk is idle
+app.exit_app()
+root.destroy()
+"""
+
+
+def launch(code):
+    """Return the wall time in milliseconds of a fresh interpreter running ``code``"""
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", code], cwd=ROOT, check=True)
+    return (time.perf_counter() - start) * 1000
+
+
+def median(code):
+    launch(code)  # warm the disk cache and the .pyc files
+    return statistics.median(launch(code) for _ in range(RUNS))
+
+
+def main():
+    loaded = subprocess.run([sys.executable, "-c", "import sys, WORK_Cgpro\n"
+                             f"print(' '.join(m for m in {DEFERRED_MODULES!r} if m in sys.modules))"],
+                            cwd=ROOT, check=True, capture_output=True, text=True).stdout.split()
+    assert not loaded, f"imported at startup: {loaded}"
+
+    interpreter = median("pass")
+    lazy = median("import WORK_Cgpro")
+    eager = median("import WORK_Cgpro\n" + EAGER)
+    print(f"interpreter alone          {interpreter:7.1f} ms")
+    print(f"import the app             {lazy:7.1f} ms")
+    print(f"  and the deferred modules {eager:7.1f} ms   (+{eager - lazy:.1f} ms at startup before)")
+    assert lazy < eager
+
+    if os.environ.get("DISPLAY") or not sys.platform.startswith("linux"):
+        lazy = median("import WORK_Cgpro\n" + LAUNCH)
+        eager = median("import WORK_Cgpro\n" + EAGER + LAUNCH)
+        print(f"launch to first frame      {lazy:7.1f} ms, with the deferred modules {eager:7.1f} ms")
+    else:
+        print("no display: launch to first frame not measured (run under xvfb-run)")
+
+
+if __name__ == "__main__":
+    main()
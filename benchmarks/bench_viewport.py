@@ -0,0 +1,143 @@
+"""Panning and zooming a very large drawing
+
+Run with ``python benchmarks/bench_viewport.py [shapes]``. Fills a
+50000x50000 drawing with a million small shapes, then pans it with the
+middle button and zooms out with the wheel until the whole drawing shows,
+and back in. Reports the cost of each frame's redraw and the number of
+canvas items, which stays bounded by the window while a view without
+culling would keep one item per shape. Checks the items against the
+drawing, and drawing and selecting while zoomed in.
+"""
+import math
+import random
+import sys
+import time
+
+from fakecanvas import Event, headless_app
+
+from scene import LOD_PIXELS, Shape
+from viewport import ZOOM_STEP
+
+COUNT = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+SIZE = 50000
+PANS = 120
+FRAME = 1 / 60
+
+
+class Wheel(Event):
+    def __init__(self, x, y, up):
+        super().__init__(x, y)
+        self.num = 4 if up else 5
+        self.delta = 0
+
+
+def make_shapes(count):
+    rng = random.Random(7)
+    shapes = []
+    for i in range(count):
+        x, y = rng.uniform(0, SIZE), rng.uniform(0, SIZE)
+        w, h = rng.uniform(2, 40), rng.uniform(2, 40)
+        kind = ("line", "rectangle", "oval", "polygon")[i % 4]
+        coords = (x, y, x + w, y + h, x, y + h) if kind == "polygon" else (x, y, x + w, y + h)
+        shapes.append(Shape(kind, coords, outline="#000000", fill="#3366cc", width=1))
+    return shapes
+
+
+def check_items(app):
+    """The shapes with items are exactly those the viewport shows in full, where it shows them"""
+    view = app.view
+    x1, y1, x2, y2 = view.box
+    expected = set()
+    for shape, (level, box, column, row) in view.lod.entries.items():
+        if level >= view.level and box[0] <= x2 and x1 <= box[2] and box[1] <= y2 and y1 <= box[3]:
+            expected.add(shape)
+    assert set(view.shapes.values()) == expected
+    for item, shape in view.shapes.items():
+        screen = view.viewport.to_screen(shape.coords)
+        assert all(abs(a - b) < 1e-6 for a, b in zip(app.canvas.coords(item), screen))
+
+
+def frames(app, events, handler):
+    """Feed events one per frame; return the redraw times and the most canvas items seen"""
+    times = []
+    most = 0
+    for event in events:
+        handler(event)
+        busy = app.root.busy
+        app.root.run()
+        times.append(app.root.busy - busy)
+        most = max(most, app.view.item_count())
+    times.sort()
+    return times, most
+
+
+def report(label, times, most):
+    print(f"{label:<22} median {times[len(times) // 2] * 1000:7.2f} ms   max {times[-1] * 1000:7.2f} ms   "
+          f"at most {most} items")
+
+
+def main():
+    app = headless_app()
+    shapes = make_shapes(COUNT)
+    start = time.perf_counter()
+    for shape in shapes:
+        app.scene.add(shape)
+    print(f"{COUNT} shapes on {SIZE}x{SIZE} added in {time.perf_counter() - start:.1f} s; "
+          f"without culling the canvas would hold {COUNT} items")
+    viewport = app.view.viewport
+    width, height = viewport.width, viewport.height
+    print(f"{width}x{height} window at 100%: {app.view.item_count()} items")
+    check_items(app)
+
+    app.on_pan_start(Event(700, 500))
+    times, most = frames(app, [Event(700 - 5 * i, 500 - 3 * i) for i in range(1, PANS + 1)], app.on_pan)
+    report("pan at 100%", times, most)
+    assert times[len(times) // 2] < FRAME
+    check_items(app)
+
+    # Enough wheel notches down to fit the whole drawing in the window
+    notches = math.ceil(math.log(SIZE / width, ZOOM_STEP))
+    events = [Wheel(width / 2, height / 2, up=False) for _ in range(notches)]
+    times, most = frames(app, events, app.on_wheel)
+    report(f"zoom out to {viewport.zoom:.1%}", times, most)
+    assert viewport.width / viewport.zoom >= SIZE
+    print(f"whole drawing in view; shapes under {LOD_PIXELS} px drawn as proxies")
+    check_items(app)
+
+    # Round and back to where it started
+    app.on_pan_start(Event(500, 300))
+    circle = [Event(400 + 100 * math.cos(2 * math.pi * i / PANS), 300 + 100 * math.sin(2 * math.pi * i / PANS))
+              for i in range(1, PANS + 1)]
+    times, most = frames(app, circle, app.on_pan)
+    report("pan zoomed out", times, most)
+    assert times[len(times) // 2] < FRAME
+    check_items(app)
+
+    times, most = frames(app, [Wheel(width / 2, height / 2, up=True) for _ in events], app.on_wheel)
+    report("zoom back in", times, most)
+    check_items(app)
+    assert most < COUNT / 100
+
+    # Drawing and selecting at 250%, panned away from the origin
+    app.reset_view()
+    app.zoom(2.5, 0, 0)
+    app.on_pan_start(Event(0, 0))
+    app.on_pan(Event(-1000, -500))
+    app.root.run()
+    app.current_shape = "rectangle"
+    app.on_press(Event(100, 100))
+    app.on_drag(Event(200, 150))
+    app.root.run()
+    app.on_release(Event(200, 150))
+    drawn = max(app.scene.shapes, key=lambda shape: shape.seq)
+    assert drawn.coords == (*viewport.to_world(100, 100), *viewport.to_world(200, 150))
+    assert app.canvas.coords(drawn.item) == [100.0, 100.0, 200.0, 150.0]
+    app.current_shape = "select"
+    app.on_press(Event(150, 125))
+    app.on_release(Event(150, 125))
+    assert app.selection == {drawn}
+    print("shapes drawn and picked at 250% land where the pointer is")
+
+
+if __name__ == "__main__":
+    main()
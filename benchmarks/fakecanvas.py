@@ -0,0 +1,287 @@
+"""Minimal stand-in for tk.Canvas so the drawing code can be benchmarked headless"""
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from WORK_Cgpro import (DrawingApp, EVENT_FRAME_RATE, HISTORY_KEEP_STEPS, HISTORY_MAX_BYTES,
+                        HISTORY_MAX_ENTRIES, HUD_TAG, VERTEX_TAG)
+from history import History
+from layercache import LayerCache
+from memory import MemoryMonitor
+from rasterview import RasterView
+from scene import CanvasView, Scene
+from scheduler import FrameScheduler
+
+
+class FakeCanvas:
+    """Keeps items in dicts and implements the canvas calls DrawingApp makes
+
+    ``after`` calls are passed to ``root``, a FakeRoot.
+    """
+
+    def __init__(self, root=None):
+        self.root = root
+        self.next_id = 1
+        self.items = {}  # id -> [type, coords, options]
+        self.tagged = {}  # tag -> ids of the items carrying it
+        self.calls = 0
+
+    def _find(self, item):
+        """Return the ids an item id or tag refers to"""
+        if not isinstance(item, str):
+            return [item] if item in self.items else []
+        if item == "all":
+            return list(self.items)
+        return list(self.tagged.get(item, ()))
+
+    def _tag(self, item, tags):
+        old = self.items[item][2].get("tags", "").split()
+        for tag in old:
+            self.tagged[tag].discard(item)
+        for tag in tags:
+            self.tagged.setdefault(tag, set()).add(item)
+        self.items[item][2]["tags"] = " ".join(tags)
+
+    def _create(self, item_type, args, options):
+        self.calls += 1
+        coords = args[0] if len(args) == 1 else args
+        item = self.next_id
+        self.next_id += 1
+        tags = options.pop("tags", "")
+        self.items[item] = [item_type, [float(c) for c in coords],
+                            {k: str(v) for k, v in options.items()}]
+        self._tag(item, tags.split() if isinstance(tags, str) else list(tags))
+        return item
+
+    def create_line(self, *args, **options):
+        return self._create("line", args, options)
+
+    def create_rectangle(self, *args, **options):
+        return self._create("rectangle", args, options)
+
+    def create_oval(self, *args, **options):
+        return self._create("oval", args, options)
+
+    def create_polygon(self, *args, **options):
+        return self._create("polygon", args, options)
+
+    def create_text(self, *args, **options):
+        return self._create("text", args, options)
+
+    def create_image(self, *args, **options):
+        return self._create("image", args, options)
+
+    def after(self, ms, callback):
+        return self.root.after(ms, callback)
+
+    def after_idle(self, callback):
+        return self.root.after_idle(callback)
+
+    def after_cancel(self, after_id):
+        self.root.after_cancel(after_id)
+
+    def type(self, item):
+        self.calls += 1
+        return self.items[item][0]
+
+    def coords(self, item, *coords):
+        self.calls += 1
+        # Like Tk, a tag stands for the first item carrying it
+        item = min(self._find(item))
+        if coords:
+            if len(coords) == 1:
+                coords = coords[0]
+            self.items[item][1] = [float(c) for c in coords]
+        return list(self.items[item][1])
+
+    def itemcget(self, item, option):
+        self.calls += 1
+        return self.items[min(self._find(item))][2].get(option, "")
+
+    def itemconfig(self, item, **options):
+        self.calls += 1
+        for key in self._find(item):
+            self.items[key][2].update({k: str(v) for k, v in options.items()})
+
+    def move(self, item, dx, dy):
+        self.calls += 1
+        for key in self._find(item):
+            coords = self.items[key][1]
+            for i in range(0, len(coords), 2):
+                coords[i] += dx
+                coords[i + 1] += dy
+
+    def delete(self, item):
+        self.calls += 1
+        for key in self._find(item):
+            self._tag(key, [])
+            del self.items[key]
+
+    def addtag_withtag(self, tag, item):
+        self.calls += 1
+        for key in self._find(item):
+            tags = self.items[key][2].get("tags", "").split()
+            if tag not in tags:
+                self._tag(key, tags + [tag])
+
+    def dtag(self, item, tag):
+        self.calls += 1
+        for key in self._find(item):
+            self._tag(key, [t for t in self.items[key][2].get("tags", "").split() if t != tag])
+
+    # Stacking order is creation order; restacking is not modelled
+    def tag_lower(self, item, below=None):
+        self.calls += 1
+
+    def tag_raise(self, item, above=None):
+        self.calls += 1
+
+    def find_above(self, item):
+        self.calls += 1
+        return ()
+
+    def find_all(self):
+        self.calls += 1
+        return tuple(self.items)
+
+    def find_withtag(self, tag):
+        self.calls += 1
+        return tuple(self._find(tag))
+
+    def bbox(self, item):
+        self.calls += 1
+        coords = [c for key in self._find(item) for c in self.items[key][1]]
+        if not coords:
+            return None
+        return (min(coords[0::2]), min(coords[1::2]), max(coords[0::2]), max(coords[1::2]))
+
+
+class FakeRoot:
+    """Runs ``after`` callbacks from ``run`` instead of a Tk main loop"""
+
+    def __init__(self):
+        self.pending = {}  # after id -> (due time, callback)
+        self.next_id = 1
+        self.longest = 0.0  # longest single callback, i.e. the longest UI stall
+        self.busy = 0.0  # total time spent in callbacks
+        self.latest = 0.0  # most a callback started after it fell due
+
+    def after(self, ms, callback):
+        after_id = self.next_id
+        self.next_id += 1
+        self.pending[after_id] = (time.perf_counter() + ms / 1000, callback)
+        return after_id
+
+    def after_idle(self, callback):
+        return self.after(0, callback)
+
+    def after_cancel(self, after_id):
+        self.pending.pop(after_id, None)
+
+    def run(self, until=lambda: False):
+        """Run callbacks as they fall due until none are left or ``until()`` is true"""
+        while self.pending and not until():
+            after_id = min(self.pending, key=lambda k: self.pending[k][0])
+            due, callback = self.pending.pop(after_id)
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            start = time.perf_counter()
+            self.latest = max(self.latest, start - due)
+            callback()
+            elapsed = time.perf_counter() - start
+            self.longest = max(self.longest, elapsed)
+            self.busy += elapsed
+
+
+class FakeScreen:
+    """Stands in for rasterview.PhotoScreen, keeping the pixels it is sent in an array"""
+
+    def __init__(self):
+        self.pixels = None
+
+    def resize(self, width, height):
+        self.pixels = np.zeros((height, width, 3), dtype=np.uint8)
+
+    def blit(self, pixels, x, y):
+        height, width = pixels.shape[:2]
+        self.pixels[y:y + height, x:x + width] = pixels
+
+
+class FakeVar:
+    """Stands in for a tk.StringVar"""
+
+    def __init__(self, value=None):
+        self.value = value
+
+    def get(self):
+        return self.value
+
+    def set(self, value):
+        self.value = value
+
+
+class FakeWidget:
+    """Stands in for labels and other widgets that are only configured"""
+
+    def config(self, **options):
+        pass
+
+    def current(self, index=None):
+        return 0
+
+
+def headless_app(renderer="canvas"):
+    """Build a DrawingApp wired to a FakeCanvas, without creating any Tk widgets"""
+    app = DrawingApp.__new__(DrawingApp)
+    app.root = FakeRoot()
+    app.canvas = FakeCanvas(app.root)
+    app.current_shape = "line"
+    app.current_color = "#000000"
+    app.fill_color = "#ffffff"
+    app.line_width = 2
+    app.start_x = app.start_y = None
+    app.scene = Scene()
+    if renderer == "raster":
+        app.view = app.scene.view = RasterView(app.canvas, screen=FakeScreen())
+    else:
+        # Layer images stay Pillow images: a PhotoImage needs Tk
+        app.view = app.scene.view = CanvasView(app.canvas, cache=LayerCache(photo=lambda image: image))
+    app.history = History(app.scene, max_bytes=HISTORY_MAX_BYTES, max_entries=HISTORY_MAX_ENTRIES,
+                          keep_steps=HISTORY_KEEP_STEPS)
+    app.history_label = FakeWidget()
+    app.status_bar = FakeWidget()
+    app.layer_box = FakeWidget()
+    app.temp_shape = None
+    app.frames = FrameScheduler(app.root, EVENT_FRAME_RATE)
+    app.selected_shape = None
+    app.selection = set()
+    app.dragging = False
+    app.marquee = None
+    app.move_dx = app.move_dy = 0
+    app.polygon_points = []
+    app.pan_x = app.pan_y = None
+    app.loader = None
+    app.saver = None
+    app.queued_save = None
+    app.exporter = None
+    app.file_path = None
+    app.journal = None
+    app.probe = None
+    app.timings = None
+    app.hud_after = None
+    app.hud_mode = FakeVar("off")
+    app.memory = MemoryMonitor(app.scene, app.history, app.view, app.canvas, tags=(VERTEX_TAG, HUD_TAG))
+    return app
+
+
+class Event:
+    """Just enough of a Tk event for the mouse handlers"""
+
+    def __init__(self, x, y):
+        self.x = x
+        self.y = y
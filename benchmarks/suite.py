@@ -0,0 +1,289 @@
+"""Interaction benchmark suite with machine-readable results
+
+Run with ``python benchmarks/suite.py [options]``. Drives DrawingApp through
+its own handlers, the way the mouse and the menus do, on drawings of each
+``--shapes`` size: drawing shapes (``on_press``, ``on_drag``, ``on_release``
+and ``save_state``), bursts of drag motion events, undo and redo storms, and
+File > Save and File > Open in both formats. Reports the median, 95th
+percentile and worst latency of each.
+
+By default the app runs against the headless canvas of fakecanvas.py. With
+``--tk`` it builds the real window instead, which needs a display; on a
+machine without one run the suite under Xvfb, as in
+``xvfb-run python benchmarks/suite.py --tk``. Nothing needs a GPU.
+
+``--output FILE`` writes the results as JSON. ``--baseline FILE`` compares
+them with the results of an earlier run, and the suite exits with status 1
+if any median got slower by more than ``--threshold`` (25% by default).
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from tkinter import filedialog
+
+from fakecanvas import Event, headless_app
+
+import binformat
+import journal
+import WORK_Cgpro
+from scene import Shape
+from WORK_Cgpro import EVENT_FRAME_RATE, RENDERERS
+
+SUITE_VERSION = 1
+CELL = 16  # window pixels per slot of the band drawn shapes go in
+BURST = 1000 // EVENT_FRAME_RATE  # motion events per frame from a 1000 Hz mouse
+MIN_SLOWDOWN_MS = 0.05  # slowdowns smaller than this are noise, whatever the ratio
+
+
+class FakeDriver:
+    """Runs the app against the headless canvas; Tk callbacks run from FakeRoot"""
+
+    def __init__(self, renderer):
+        self.app = headless_app(renderer)
+
+    def idle(self):
+        """Run the callbacks that are due, e.g. redraws queued for when Tk is idle"""
+        root = self.app.root
+        root.run(until=lambda: min(due for due, callback in root.pending.values()) > time.perf_counter())
+
+    def wait(self, condition):
+        """Run callbacks until ``condition()`` is true"""
+        self.app.root.run(until=condition)
+        assert condition()
+
+    def close(self):
+        pass
+
+
+class TkDriver:
+    """Runs the real app on a Tk root"""
+
+    def __init__(self, renderer):
+        import tkinter as tk
+        self.root = tk.Tk()
+        self.app = WORK_Cgpro.DrawingApp(self.root, renderer=renderer)
+        self.root.update()
+
+    def idle(self):
+        self.root.update_idletasks()
+
+    def wait(self, condition):
+        while not condition():
+            self.root.update()
+            time.sleep(0.001)
+
+    def close(self):
+        self.root.destroy()
+
+
+def make_shapes(count, band):
+    """Shapes at a steady density below ``band`` window pixels, growing past the window as ``count`` does"""
+    rng = random.Random(21)
+    size = max(800, math.sqrt(count) * 20)
+    colors = ["#000000", "#ff0000", "#00aa00", "#0000ff", ""]
+    shapes = []
+    for i in range(count):
+        x, y = rng.uniform(0, size), rng.uniform(band, band + size)
+        w, h = rng.uniform(4, 20), rng.uniform(4, 20)
+        kind = ("line", "rectangle", "oval", "polygon")[i % 4]
+        coords = (x, y, x + w, y + h, x, y + h) if kind == "polygon" else (x, y, x + w, y + h)
+        shapes.append(Shape(kind, coords, outline=rng.choice(colors[:4]), fill=rng.choice(colors),
+                            width=rng.randint(1, 3)))
+    return shapes
+
+
+def slots(count):
+    """Return the top-left window pixels of ``count`` free slots for drawn shapes, and the band they fill"""
+    per_row = 800 // CELL
+    return [(i % per_row * CELL + 2, i // per_row * CELL + 2) for i in range(count)], \
+        math.ceil(count / per_row) * CELL
+
+
+def timed(driver, action):
+    """Return the milliseconds ``action`` and the callbacks it makes due take"""
+    start = time.perf_counter()
+    action()
+    driver.idle()
+    return (time.perf_counter() - start) * 1000
+
+
+def draw(driver, places):
+    app = driver.app
+    app.current_shape = "rectangle"
+    times = []
+    for x, y in places:
+        def gesture():
+            app.on_press(Event(x, y))
+            app.on_drag(Event(x + 6, y + 4))
+            app.frames.flush(app.drag_to)
+            app.on_release(Event(x + 10, y + 10))
+        times.append(timed(driver, gesture))
+    return {"draw": times}
+
+
+def drag(driver, places):
+    """Select drawn shapes and drag each by a few frames' worth of motion events"""
+    app = driver.app
+    app.current_shape = "select"
+    frames, releases = [], []
+    for x, y in places:
+        x, y = x + 5, y + 5
+        app.on_press(Event(x, y))
+        assert app.dragging
+        for frame in range(1, 4):
+            def burst():
+                for i in range(BURST):
+                    app.on_drag(Event(x + frame, y + (i + 1) / BURST))
+                app.frames.flush(app.drag_to)
+            frames.append(timed(driver, burst))
+        # The shape ends up 3 px right and 1 px down, still inside its slot
+        releases.append(timed(driver, lambda: app.on_release(Event(x + 3, y + 1))))
+    return {"drag_frame": frames, "drag_release": releases}
+
+
+def undo_storm(driver, steps):
+    app = driver.app
+    undos = [timed(driver, app.undo) for _ in range(steps)]
+    redos = [timed(driver, app.redo) for _ in range(steps)]
+    return {"undo": undos, "redo": redos}
+
+
+def save(driver, tmp, repeat):
+    app = driver.app
+    times = {}
+    for extension in (".json", binformat.EXTENSION):
+        path = os.path.join(tmp, "drawing" + extension)
+        filedialog.asksaveasfilename = lambda **options: path
+        times["save_" + extension[1:]] = [timed(driver, lambda: (app.save_drawing(),
+                                                                  driver.wait(lambda: app.saver is None)))
+                                          for _ in range(repeat)]
+    return times
+
+
+def open_files(make_driver, tmp, repeat, count):
+    times = {}
+    for extension in (".json", binformat.EXTENSION):
+        path = os.path.join(tmp, "drawing" + extension)
+        filedialog.askopenfilename = lambda **options: path
+        samples = []
+        for _ in range(repeat):
+            # Into an empty drawing, so every shape is loaded
+            driver = make_driver()
+            app = driver.app
+            samples.append(timed(driver, lambda: (app.open_drawing(), driver.wait(lambda: app.loader is None))))
+            assert len(app.scene) == count
+            if app.journal:
+                app.journal.close(discard=True)
+            driver.close()
+        times["open_" + extension[1:]] = samples
+    return times
+
+
+def summary(times):
+    times = sorted(times)
+    return {"count": len(times), "median_ms": round(times[len(times) // 2], 4),
+            "p95_ms": round(times[min(len(times) - 1, math.ceil(len(times) * 0.95) - 1)], 4),
+            "max_ms": round(times[-1], 4)}
+
+
+def run_size(make_driver, count, edits, repeat, tmp):
+    places, band = slots(edits)
+    driver = make_driver()
+    app = driver.app
+    for shape in make_shapes(count, band):
+        app.scene.add(shape)
+    driver.idle()
+    if app.journal is None:
+        # The window starts one; so does the suite, so every edit is journalled
+        app.start_journal()
+    times = {}
+    times.update(draw(driver, places))
+    times.update(drag(driver, places[:max(1, edits // 4)]))
+    times.update(undo_storm(driver, edits))
+    times.update(save(driver, tmp, repeat))
+    app.journal.close(discard=True)
+    driver.close()
+    times.update(open_files(make_driver, tmp, repeat, count + edits))
+    return {name: summary(samples) for name, samples in times.items()}
+
+
+def compare(results, baseline, threshold):
+    """Print each median against the baseline; return the (shapes, metric) pairs that got too slow"""
+    failures = []
+    for count, metrics in results["results"].items():
+        for name, current in metrics.items():
+            before = baseline["results"].get(count, {}).get(name)
+            if before is None:
+                continue
+            ratio = current["median_ms"] / before["median_ms"] if before["median_ms"] else math.inf
+            slower = current["median_ms"] - before["median_ms"] > MIN_SLOWDOWN_MS and ratio > 1 + threshold
+            print(f"{count:>8} {name:<14} {before['median_ms']:>10.3f} ms -> {current['median_ms']:>10.3f} ms "
+                  f"{ratio:>6.2f}x{'   SLOWER' if slower else ''}")
+            if slower:
+                failures.append((count, name))
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Interaction benchmarks of the drawing app")
+    parser.add_argument("--shapes", default="1000,10000,100000",
+                        help="comma-separated drawing sizes (default: %(default)s)")
+    parser.add_argument("--edits", type=int, default=200, help="shapes drawn and undo steps per size")
+    parser.add_argument("--repeat", type=int, default=5, help="saves and opens per format")
+    parser.add_argument("--renderer", choices=RENDERERS, default="canvas")
+    parser.add_argument("--tk", action="store_true", help="drive a real Tk window (needs a display, e.g. Xvfb)")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="compare with the results JSON of an earlier run")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="fail if a median is this much slower than the baseline (default: %(default)s)")
+    args = parser.parse_args(argv)
+    if args.tk and not os.environ.get("DISPLAY") and sys.platform.startswith("linux"):
+        parser.error("--tk needs a display: run the suite under xvfb-run")
+    sizes = [int(size) for size in args.shapes.split(",")]
+    driver_class = TkDriver if args.tk else FakeDriver
+
+    results = {
+        "suite": SUITE_VERSION,
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "platform": {"python": platform.python_version(), "system": platform.platform(),
+                     "machine": platform.machine(), "cpus": os.cpu_count()},
+        "params": {"driver": "tk" if args.tk else "fake", "renderer": args.renderer, "edits": args.edits,
+                   "repeat": args.repeat, "burst": BURST},
+        "results": {},
+    }
+    with tempfile.TemporaryDirectory() as tmp:
+        # Journals and session files stay out of the user's own
+        journal.JOURNAL_DIR = tmp
+        print(f"{'shapes':>8} {'metric':<14} {'count':>6} {'median':>10} {'p95':>10} {'max':>10}")
+        for count in sizes:
+            metrics = run_size(lambda: driver_class(args.renderer), count, args.edits, args.repeat, tmp)
+            results["results"][str(count)] = metrics
+            for name, summary_ in metrics.items():
+                print(f"{count:>8} {name:<14} {summary_['count']:>6} {summary_['median_ms']:>7.3f} ms "
+                      f"{summary_['p95_ms']:>7.3f} ms {summary_['max_ms']:>7.3f} ms")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get("params") != results["params"]:
+            print(f"warning: baseline ran with {baseline.get('params')}")
+        failures = compare(results, baseline, args.threshold)
+        if failures:
+            print(f"{len(failures)} median(s) more than {args.threshold:.0%} slower than the baseline")
+            return 1
+        print("no median slower than the baseline by more than the threshold")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
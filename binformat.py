@@ -0,0 +1,186 @@
+"""Compact binary drawing format (.cgd) and JSON converter.
+
+Layout (little endian, every array section starts on an 8-byte boundary):
+
+    header       magic "CGDB", version, flags, shape count, coord count,
+                 style table size in bytes
+    table        UTF-8 JSON {"styles": [[outline, fill, width], ...],
+                 "layers": [[name, visible, locked, shape count], ...]}
+    kinds        uint8[shapes]          index into scene.SHAPE_TYPES
+    styles       uint16 or int32[shapes] index into the style table
+    offsets      uint32 or int64[shapes + 1] into coords
+    coords       float32 or float64[coords]
+
+Shapes are stored layer by layer, bottom to top, so a layer only needs its
+shape count. Version 1 files have no layers: their table is just the list
+of styles, and all their shapes are on one layer.
+
+The narrow uint16/uint32 index types are used whenever they fit and are
+recorded in the header flags. So are float32 coords: they hold whole pixels
+exactly, but a drawing with coords float32 cannot represent (drawn while
+zoomed, or circle geometry) is written with float64 coords, so it
+round-trips exactly as it does through JSON. Files before version 3 always
+have float32 coords. ``read_drawing`` memory-maps the file and returns a
+ShapeStore whose arrays are views into the mapping, so opening a file does
+not copy or parse the shape data.
+
+Run ``python binformat.py input output`` to convert between .json and .cgd;
+a binary input is written out as JSON and anything else as binary.
+"""
+import json
+import mmap
+import struct
+import sys
+
+import numpy as np
+
+from scene import DEFAULT_LAYER, Layer, is_layer_record
+from shapestore import ShapeStore
+
+MAGIC = b"CGDB"
+VERSION = 3
+EXTENSION = ".cgd"
+HEADER = struct.Struct("<4sHHQQI")
+
+FLAG_STYLES_U16 = 1
+FLAG_OFFSETS_U32 = 2
+FLAG_COORDS_F64 = 4
+
+
+def _align(position):
+    return (position + 7) & ~7
+
+
+def _sections(flags, shape_count, coord_count):
+    """Return (dtype, count) for each array section, in file order"""
+    return [
+        (np.dtype("<u1"), shape_count),
+        (np.dtype("<u2" if flags & FLAG_STYLES_U16 else "<i4"), shape_count),
+        (np.dtype("<u4" if flags & FLAG_OFFSETS_U32 else "<i8"), shape_count + 1),
+        (np.dtype("<f8" if flags & FLAG_COORDS_F64 else "<f4"), coord_count),
+    ]
+
+
+def is_binary_drawing(path):
+    """Return True if the file starts with the .cgd magic"""
+    with open(path, "rb") as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def write_drawing(path, store, layers=None):
+    """Write a ShapeStore to ``path`` in the binary format"""
+    with open(path, "wb") as f:
+        dump_drawing(store, f, layers)
+
+
+def dump_drawing(store, f, layers=None):
+    """Write a ShapeStore to an open binary file
+
+    ``layers`` lists the (name, visible, locked, shape count) of the layers
+    the store's rows belong to, in order; by default all are on one layer.
+    """
+    flags = 0
+    if len(store.style_table) <= 0xFFFF:
+        flags |= FLAG_STYLES_U16
+    if len(store.coords) <= 0xFFFFFFFF:
+        flags |= FLAG_OFFSETS_U32
+    if store.coords.dtype.itemsize > 4 and not np.array_equal(store.coords.astype(np.float32), store.coords):
+        flags |= FLAG_COORDS_F64
+    if layers is None:
+        layers = [(DEFAULT_LAYER, True, False, len(store))]
+    table = json.dumps({"styles": [list(style) for style in store.style_table],
+                        "layers": [list(layer) for layer in layers]}).encode("utf-8")
+    arrays = [store.kinds, store.styles, store.offsets, store.coords]
+    sections = _sections(flags, len(store), len(store.coords))
+
+    position = f.write(HEADER.pack(MAGIC, VERSION, flags, len(store), len(store.coords), len(table)))
+    position += f.write(table)
+    for array, (dtype, count) in zip(arrays, sections):
+        position += f.write(b"\0" * (_align(position) - position))
+        position += f.write(np.ascontiguousarray(array, dtype=dtype).tobytes())
+
+
+def _read_header(buffer):
+    """Return the header fields and the decoded table of a binary drawing"""
+    magic, version, flags, shape_count, coord_count, table_size = HEADER.unpack_from(buffer, 0)
+    if magic != MAGIC:
+        raise ValueError("Not a binary drawing file")
+    if version > VERSION:
+        raise ValueError(f"Unsupported drawing file version: {version}")
+    table = json.loads(bytes(buffer[HEADER.size:HEADER.size + table_size]).decode("utf-8"))
+    if version < 2:
+        table = {"styles": table, "layers": [[DEFAULT_LAYER, True, False, shape_count]]}
+    return flags, shape_count, coord_count, table_size, table
+
+
+def read_layers(path):
+    """Return the (name, visible, locked, shape count) of a binary drawing's layers, bottom to top"""
+    with open(path, "rb") as f:
+        header = f.read(HEADER.size)
+        table_size = HEADER.unpack(header)[-1]
+        table = _read_header(header + f.read(table_size))[-1]
+    return [tuple(layer) for layer in table["layers"]]
+
+
+def read_drawing(path):
+    """Memory-map a binary drawing and return it as a ShapeStore
+
+    The arrays of the returned store are read-only views into the mapping;
+    the mapping stays open for as long as any of them is referenced. The
+    rows are the shapes of every layer in turn (see ``read_layers``).
+    """
+    with open(path, "rb") as f:
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    flags, shape_count, coord_count, table_size, table = _read_header(buffer)
+
+    position = HEADER.size + table_size
+    arrays = []
+    for dtype, count in _sections(flags, shape_count, coord_count):
+        position = _align(position)
+        arrays.append(np.frombuffer(buffer, dtype=dtype, count=count, offset=position))
+        position += dtype.itemsize * count
+    kinds, styles, offsets, coords = arrays
+    return ShapeStore(kinds, styles, offsets, coords, [tuple(style) for style in table["styles"]])
+
+
+def json_to_binary(json_path, binary_path):
+    with open(json_path, "r") as f:
+        records = json.load(f)
+    shapes = []
+    layers = []
+    for record in records:
+        if is_layer_record(record):
+            layer = Layer.from_dict(record)
+            layers.append([layer.name, layer.visible, layer.locked, 0])
+            continue
+        if not layers:
+            layers.append([DEFAULT_LAYER, True, False, 0])
+        layers[-1][3] += 1
+        shapes.append(record)
+    write_drawing(binary_path, ShapeStore.from_records(shapes, np.float64), layers or None)
+
+
+def binary_to_json(binary_path, json_path):
+    shapes = iter(read_drawing(binary_path).to_records())
+    records = []
+    for name, visible, locked, count in read_layers(binary_path):
+        records.append(Layer(name, visible, locked).to_dict())
+        records.extend(next(shapes) for _ in range(count))
+    with open(json_path, "w") as f:
+        json.dump(records, f)
+
+
+def main(argv):
+    if len(argv) != 3:
+        print("usage: python binformat.py input.json output.cgd | input.cgd output.json")
+        return 2
+    source, target = argv[1], argv[2]
+    if is_binary_drawing(source):
+        binary_to_json(source, target)
+    else:
+        json_to_binary(source, target)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
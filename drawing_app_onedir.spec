@@ -0,0 +1,54 @@
+# -*- mode: python ; coding: utf-8 -*-
+# Startup-optimized build: a folder holding the executable and its libraries.
+# Unlike drawing_app.spec's single file, nothing is unpacked to a temporary
+# directory on every launch, and nothing is UPX-compressed, so nothing has to
+# be decompressed (or rescanned by antivirus software) before the app starts.
+
+block_cipher = None
+
+a = Analysis(
+    ['WORK_Cgpro.py'],
+    pathex=[],
+    binaries=[],
+    datas=[],
+    hiddenimports=[],
+    hookspath=[],
+    hooksconfig={},
+    runtime_hooks=[],
+    excludes=[],
+    win_no_prefer_redirects=False,
+    win_private_assemblies=False,
+    cipher=block_cipher,
+    noarchive=False,
+)
+pyz = PYZ(a.pure, a.zipped_data, cipher=block_cipher)
+
+exe = EXE(
+    pyz,
+    a.scripts,
+    [],
+    exclude_binaries=True,
+    name='2D Drawing Application',
+    debug=False,
+    bootloader_ignore_signals=False,
+    strip=False,
+    upx=False,
+    console=False,
+    disable_windowed_traceback=False,
+    argv_emulation=False,
+    target_arch=None,
+    codesign_identity=None,
+    entitlements_file=None,
+    icon='app_icon.ico',
+)
+
+coll = COLLECT(
+    exe,
+    a.binaries,
+    a.zipfiles,
+    a.datas,
+    strip=False,
+    upx=False,
+    upx_exclude=[],
+    name='2D Drawing Application',
+)
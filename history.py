@@ -0,0 +1,666 @@
+"""Command-based undo/redo history for the drawing application.
+
+Every edit is recorded as a small command object that knows how to undo and
+redo itself on the Scene, so recording, undoing and redoing an edit only
+touches the shapes involved in that edit instead of snapshotting the whole
+drawing. Commands never talk to Tk; the scene's view mirrors their effect.
+
+Shapes removed from the drawing stay alive, so undo can put them back on
+their layer at their stacking position. A removed shape is only purged once
+no command can bring it back (see ``discard``). Creating, removing,
+restacking and changing layers are commands too.
+
+The history can be given a memory budget. Steps older than the most recent
+``keep_steps`` are periodically merged into compact checkpoints, and the
+oldest checkpoints are dropped once the budget is exceeded.
+"""
+import sys
+from operator import attrgetter
+
+from scene import Layer, Shape
+
+# Memory one removed shape holds while only the history keeps it alive: the Shape, its coords
+# tuple and floats, its width and its seq (328 bytes measured with tracemalloc). The view
+# deletes its canvas item when it is removed.
+SHAPE_BYTES = 320
+
+
+class Command:
+    """Base class for undoable edits
+
+    ``size`` is the estimated Python memory of the command, filled in by
+    History when it is recorded.
+    """
+    __slots__ = ("size",)
+
+    def undo(self, scene):
+        raise NotImplementedError
+
+    def redo(self, scene):
+        raise NotImplementedError
+
+    def discard(self, scene, undone):
+        """Purge shapes that only this command could bring back
+
+        ``undone`` tells whether the command is dropped from the redo stack
+        (its effect is currently undone) or from the undo stack.
+        """
+
+    def retained(self, undone):
+        """Number of removed shapes this command keeps alive"""
+        return 0
+
+
+class CreateCommand(Command):
+    """A single shape was drawn"""
+    __slots__ = ("shape",)
+
+    def __init__(self, shape):
+        self.shape = shape
+
+    def undo(self, scene):
+        scene.remove(self.shape)
+
+    def redo(self, scene):
+        scene.restore(self.shape)
+
+    def discard(self, scene, undone):
+        if undone:
+            scene.purge(self.shape)
+
+    def retained(self, undone):
+        return 1 if undone else 0
+
+
+class DeleteCommand(Command):
+    """A single shape was deleted"""
+    __slots__ = ("shape",)
+
+    def __init__(self, shape):
+        self.shape = shape
+
+    def undo(self, scene):
+        scene.restore(self.shape)
+
+    def redo(self, scene):
+        scene.remove(self.shape)
+
+    def discard(self, scene, undone):
+        if not undone:
+            scene.purge(self.shape)
+
+    def retained(self, undone):
+        return 0 if undone else 1
+
+
+class MoveCommand(Command):
+    """A shape was moved by (dx, dy)"""
+    __slots__ = ("shape", "dx", "dy")
+
+    def __init__(self, shape, dx, dy):
+        self.shape = shape
+        self.dx = dx
+        self.dy = dy
+
+    def undo(self, scene):
+        scene.move(self.shape, -self.dx, -self.dy)
+
+    def redo(self, scene):
+        scene.move(self.shape, self.dx, self.dy)
+
+
+class GroupMoveCommand(Command):
+    """Several selected shapes were moved together by (dx, dy)"""
+    __slots__ = ("shapes", "dx", "dy")
+
+    def __init__(self, shapes, dx, dy):
+        self.shapes = shapes
+        self.dx = dx
+        self.dy = dy
+
+    def undo(self, scene):
+        scene.move_group(self.shapes, -self.dx, -self.dy)
+
+    def redo(self, scene):
+        scene.move_group(self.shapes, self.dx, self.dy)
+
+
+class RestyleCommand(Command):
+    """Shape style changed from ``before`` to ``after`` (only the changed keys)"""
+    __slots__ = ("shape", "before", "after")
+
+    def __init__(self, shape, before, after):
+        self.shape = shape
+        self.before = before
+        self.after = after
+
+    def undo(self, scene):
+        scene.restyle(self.shape, **self.before)
+
+    def redo(self, scene):
+        scene.restyle(self.shape, **self.after)
+
+
+class ClearCommand(Command):
+    """Several shapes were removed at once (Clear All, or deleting a selection)"""
+    __slots__ = ("removed",)
+
+    def __init__(self, removed):
+        self.removed = removed
+
+    def undo(self, scene):
+        for shape in self.removed:
+            scene.restore(shape)
+
+    def redo(self, scene):
+        for shape in self.removed:
+            scene.remove(shape)
+
+    def discard(self, scene, undone):
+        if not undone:
+            for shape in self.removed:
+                scene.purge(shape)
+
+    def retained(self, undone):
+        return 0 if undone else len(self.removed)
+
+
+class AddLayerCommand(Command):
+    """An empty layer was inserted at ``position``"""
+    __slots__ = ("layer", "position")
+
+    def __init__(self, layer, position):
+        self.layer = layer
+        self.position = position
+
+    def undo(self, scene):
+        scene.remove_layer(self.layer)
+
+    def redo(self, scene):
+        scene.add_layer(self.layer, self.position)
+
+
+class RemoveLayerCommand(Command):
+    """A layer at ``position`` was removed together with its shapes, ``removed``"""
+    __slots__ = ("layer", "position", "removed")
+
+    def __init__(self, layer, position, removed):
+        self.layer = layer
+        self.position = position
+        self.removed = removed
+
+    def undo(self, scene):
+        scene.add_layer(self.layer, self.position)
+        for shape in self.removed:
+            scene.restore(shape)
+
+    def redo(self, scene):
+        for shape in self.removed:
+            scene.remove(shape)
+        scene.remove_layer(self.layer)
+
+    def discard(self, scene, undone):
+        if not undone:
+            for shape in self.removed:
+                scene.purge(shape)
+
+    def retained(self, undone):
+        return 0 if undone else len(self.removed)
+
+
+class MoveLayerCommand(Command):
+    """A layer was restacked from position ``before`` to ``after``"""
+    __slots__ = ("layer", "before", "after")
+
+    def __init__(self, layer, before, after):
+        self.layer = layer
+        self.before = before
+        self.after = after
+
+    def undo(self, scene):
+        scene.move_layer(self.layer, self.before)
+
+    def redo(self, scene):
+        scene.move_layer(self.layer, self.after)
+
+
+class ChangeLayerCommand(Command):
+    """Layer name, visibility or lock changed from ``before`` to ``after`` (only the changed keys)"""
+    __slots__ = ("layer", "before", "after")
+
+    def __init__(self, layer, before, after):
+        self.layer = layer
+        self.before = before
+        self.after = after
+
+    def undo(self, scene):
+        scene.change_layer(self.layer, **self.before)
+
+    def redo(self, scene):
+        scene.change_layer(self.layer, **self.after)
+
+
+def set_layers(scene, layers):
+    """Make the scene's layers the (layer, props) pairs of ``layers``, bottom to top
+
+    Layers that are taken out must have no shapes left.
+    """
+    # Adding first means the scene is never left without a layer
+    for layer, props in layers:
+        if layer not in scene.layers:
+            scene.add_layer(layer, len(scene.layers))
+    keep = {layer for layer, props in layers}
+    for layer in [layer for layer in scene.layers if layer not in keep]:
+        scene.remove_layer(layer)
+    for position, (layer, props) in enumerate(layers):
+        if scene.layers[position] is not layer:
+            scene.move_layer(layer, position)
+        changed = {key: value for key, value in props.items() if getattr(layer, key) != value}
+        if changed:
+            scene.change_layer(layer, **changed)
+
+
+class ReplaceCommand(Command):
+    """The drawing was replaced by another one (File > Open)
+
+    Built by ``SceneDiff``. ``changed`` lists the shapes that were reused in
+    place; their type, coords and style before and after the change are kept
+    in two float64 ShapeStores, which hold a large drawing in a fraction of
+    the memory of per-shape tuples. ``removed`` and ``added`` are the shapes
+    that were taken out and newly added, and ``layers_before`` and
+    ``layers_after`` the (layer, props) of the scene's layers.
+    """
+    __slots__ = ("changed", "before", "after", "removed", "added", "layers_before", "layers_after")
+
+    def __init__(self, changed, before, after, removed, added, layers_before, layers_after):
+        self.changed = changed
+        self.before = before
+        self.after = after
+        self.removed = removed
+        self.added = added
+        self.layers_before = layers_before
+        self.layers_after = layers_after
+
+    def _apply(self, scene, removed, added, store, layers):
+        for shape in removed:
+            scene.remove(shape)
+        set_layers(scene, layers)
+        for shape, (kind, coords, outline, fill, width) in zip(self.changed, store.rows()):
+            coords = tuple(coords)
+            if shape.kind != kind or shape.coords != coords:
+                scene.reshape(shape, kind, coords)
+            style = {k: v for k, v in (("outline", outline), ("fill", fill), ("width", width))
+                     if getattr(shape, k) != v}
+            if style:
+                scene.restyle(shape, **style)
+        for shape in added:
+            scene.restore(shape)
+
+    def undo(self, scene):
+        self._apply(scene, self.added, self.removed, self.before, self.layers_before)
+
+    def redo(self, scene):
+        self._apply(scene, self.removed, self.added, self.after, self.layers_after)
+
+    def discard(self, scene, undone):
+        for shape in (self.added if undone else self.removed):
+            scene.purge(shape)
+
+    def retained(self, undone):
+        return len(self.added if undone else self.removed)
+
+    def without(self, vanished):
+        """Return a copy that no longer refers to the ``vanished`` shapes"""
+        keep = [i for i, shape in enumerate(self.changed) if shape not in vanished]
+        return ReplaceCommand([self.changed[i] for i in keep],
+                              self.before.select(keep), self.after.select(keep),
+                              [s for s in self.removed if s not in vanished],
+                              [s for s in self.added if s not in vanished],
+                              self.layers_before, self.layers_after)
+
+
+class CheckpointCommand(Command):
+    """Several old steps merged into one by ``compact``"""
+    __slots__ = ("commands",)
+
+    def __init__(self, commands):
+        self.commands = commands
+
+    def undo(self, scene):
+        for command in reversed(self.commands):
+            command.undo(scene)
+
+    def redo(self, scene):
+        for command in self.commands:
+            command.redo(scene)
+
+    def discard(self, scene, undone):
+        for command in self.commands:
+            command.discard(scene, undone)
+
+    def retained(self, undone):
+        return sum(command.retained(undone) for command in self.commands)
+
+
+class SceneDiff:
+    """Turn the scene into a new drawing with as few changes as possible
+
+    The new drawing comes as its layers, bottom to top, each followed by its
+    shapes. Layers are matched by position and shapes by stacking position
+    within their layer: the existing shape at each position is kept and
+    only its changed type, coords and style are updated, so the view
+    touches as few canvas items as possible and their ids stay stable. The
+    drawing can be fed in batches (see ``feed``), so it can be loaded while
+    the UI keeps running.
+
+    ``rows`` collects each new shape as it is fed, as the (seq, layer
+    position, kind, coords, outline, fill, width) it ends up with, so the
+    journal can start from the new drawing without walking the scene again
+    (see ``Journal.start``).
+    """
+
+    def __init__(self, scene):
+        self.scene = scene
+        self.layers_before = [(layer, layer.props()) for layer in scene.layers]
+        self.current = {layer: sorted(layer.shapes, key=attrgetter("seq")) for layer in scene.layers}
+        self.layer = None  # the scene layer the next shapes go to
+        self.layer_count = 0
+        self.position = 0  # stacking position in that layer
+        self.leftover = []  # old shapes past the end of their layer's new shapes
+        self.changed = []
+        self.before = []
+        self.added = []
+        self.rows = []
+
+    def _end_layer(self):
+        if self.layer is not None:
+            self.leftover.extend(self.current.get(self.layer, ())[self.position:])
+
+    def _start_layer(self, source):
+        """Reuse the scene's next layer, or add one, for the shapes of ``source``"""
+        self._end_layer()
+        scene = self.scene
+        props = source.props()
+        if self.layer_count < len(self.layers_before):
+            layer = self.layers_before[self.layer_count][0]
+            changed = {key: value for key, value in props.items() if getattr(layer, key) != value}
+            if changed:
+                scene.change_layer(layer, **changed)
+        else:
+            layer = Layer(**props)
+            scene.add_layer(layer, len(scene.layers))
+        self.layer = layer
+        self.layer_count += 1
+        self.position = 0
+
+    def feed(self, items):
+        """Apply the next batch of the new drawing: Layers, each followed by its Shapes bottom to top"""
+        scene = self.scene
+        rows = self.rows
+        for new in items:
+            if isinstance(new, Layer):
+                self._start_layer(new)
+                continue
+            if self.layer is None:
+                # A drawing from before layers
+                self._start_layer(Layer())
+            current = self.current.get(self.layer, ())
+            if self.position >= len(current):
+                new.layer = self.layer
+                scene.add(new)
+                self.added.append(new)
+                rows.append((new.seq, self.layer_count - 1, new.kind, new.coords, new.outline, new.fill, new.width))
+                continue
+            shape = current[self.position]
+            self.position += 1
+            rows.append((shape.seq, self.layer_count - 1, new.kind, new.coords, new.outline, new.fill, new.width))
+            geometry = (shape.kind, shape.coords) != (new.kind, new.coords)
+            style = {k: v for k, v in new.style().items() if getattr(shape, k) != v}
+            if not geometry and not style:
+                continue
+            self.changed.append(shape)
+            self.before.append((shape.kind, shape.coords, shape.outline, shape.fill, shape.width))
+            if geometry:
+                scene.reshape(shape, new.kind, new.coords)
+            if style:
+                scene.restyle(shape, **style)
+
+    def _command(self, removed):
+        # Imported here: NumPy is only needed once a drawing is opened or recovered
+        import numpy as np
+        from shapestore import ShapeStore
+        return ReplaceCommand(self.changed, ShapeStore.from_rows(self.before, np.float64),
+                              ShapeStore.from_shapes(self.changed, np.float64), removed, self.added,
+                              self.layers_before, [(layer, layer.props()) for layer in self.scene.layers])
+
+    def finish(self):
+        """Remove the old shapes and layers beyond the new drawing; return the ReplaceCommand"""
+        if self.layer is None:
+            self._start_layer(Layer())
+        self._end_layer()
+        dropped = [layer for layer, props in self.layers_before[self.layer_count:]]
+        removed = self.leftover + [shape for layer in dropped for shape in self.current[layer]]
+        for shape in removed:
+            self.scene.remove(shape)
+        for layer in dropped:
+            self.scene.remove_layer(layer)
+        return self._command(removed)
+
+    def base(self):
+        """Return the finished drawing as (rows, layer table) for ``Journal.start``"""
+        return self.rows, [(layer.name, layer.visible, layer.locked) for layer in self.scene.layers]
+
+    def cancel(self):
+        """Put the scene back the way it was before the first batch"""
+        command = self._command([])
+        command.undo(self.scene)
+        command.discard(self.scene, True)
+
+
+def diff_scene(scene, target):
+    """Turn the scene into the ``target`` list of layers and shapes; return the ReplaceCommand"""
+    diff = SceneDiff(scene)
+    diff.feed(target)
+    return diff.finish()
+
+
+def estimate_size(obj):
+    """Structural estimate of the Python memory held by a command"""
+    size = sys.getsizeof(obj)
+    if isinstance(obj, (list, tuple, set)):
+        if obj and isinstance(next(iter(obj)), Shape):
+            # Shapes are shared with the scene; removed ones are counted by SHAPE_BYTES
+            return size
+        size += sum(estimate_size(value) for value in obj)
+    elif isinstance(obj, dict):
+        size += sum(estimate_size(k) + estimate_size(v) for k, v in obj.items())
+    elif hasattr(obj, "style_table"):
+        # A ShapeStore
+        size += obj.nbytes + estimate_size(obj.style_table)
+    elif isinstance(obj, Command):
+        for name in type(obj).__slots__:
+            size += estimate_size(getattr(obj, name))
+    return size
+
+
+def compact(scene, commands):
+    """Merge a run of done commands into a single CheckpointCommand
+
+    Moves and restyles of the same shape are coalesced, and shapes that were
+    both created and deleted inside the run are dropped together with every
+    step that touched them (and purged, since nothing can restore them any
+    more). A ReplaceCommand sets coords absolutely, so coalescing never
+    crosses one.
+    """
+    created = set()
+    vanished = set()
+    for command in commands:
+        if isinstance(command, CreateCommand):
+            created.add(command.shape)
+        elif isinstance(command, DeleteCommand) and command.shape in created:
+            vanished.add(command.shape)
+        elif isinstance(command, (ClearCommand, ReplaceCommand, RemoveLayerCommand)):
+            vanished.update(shape for shape in command.removed if shape in created)
+            if isinstance(command, ReplaceCommand):
+                created.update(command.added)
+
+    merged = []
+    moves = {}
+    restyles = {}
+    for command in commands:
+        shape = getattr(command, "shape", None)
+        if shape in vanished:
+            continue
+        if isinstance(command, MoveCommand):
+            if shape in moves:
+                moves[shape].dx += command.dx
+                moves[shape].dy += command.dy
+                continue
+            command = moves[shape] = MoveCommand(shape, command.dx, command.dy)
+        elif isinstance(command, RestyleCommand):
+            if shape in restyles:
+                first = restyles[shape]
+                for key, value in command.before.items():
+                    first.before.setdefault(key, value)
+                first.after.update(command.after)
+                continue
+            command = restyles[shape] = RestyleCommand(shape, dict(command.before), dict(command.after))
+        elif isinstance(command, ClearCommand) and vanished:
+            command = ClearCommand([s for s in command.removed if s not in vanished])
+        elif isinstance(command, RemoveLayerCommand) and vanished:
+            command = RemoveLayerCommand(command.layer, command.position,
+                                         [s for s in command.removed if s not in vanished])
+        elif isinstance(command, GroupMoveCommand) and vanished:
+            # Translations commute, so single moves may still be coalesced across it
+            command = GroupMoveCommand(tuple(s for s in command.shapes if s not in vanished),
+                                       command.dx, command.dy)
+        elif isinstance(command, ReplaceCommand):
+            moves.clear()
+            restyles.clear()
+            if vanished:
+                command = command.without(vanished)
+        elif isinstance(command, CheckpointCommand):
+            moves.clear()
+            restyles.clear()
+            merged.extend(command.commands)
+            continue
+        merged.append(command)
+
+    for shape in vanished:
+        scene.purge(shape)
+    merged = [c for c in merged if not (isinstance(c, MoveCommand) and not c.dx and not c.dy)]
+    return CheckpointCommand(merged)
+
+
+class History:
+    """Undo and redo stacks of commands, kept within an optional memory budget
+
+    ``max_bytes`` and ``max_entries`` bound the history (``None`` means no
+    limit). The newest ``keep_steps`` steps are never merged or dropped; older
+    steps are merged into checkpoints of ``checkpoint_every`` steps, and the
+    oldest entries are dropped while the history is over budget.
+    """
+
+    def __init__(self, scene, max_bytes=None, max_entries=None, keep_steps=100,
+                 checkpoint_every=50):
+        self.scene = scene
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.keep_steps = keep_steps
+        self.checkpoint_every = checkpoint_every
+        self.undo_stack = []
+        self.redo_stack = []
+        self.checkpoints = 0  # the bottom of undo_stack holds this many checkpoints
+        self.bytes = 0
+        self.removed_shapes = 0
+        self.dropped = 0
+
+    def _account(self, command, undone, sign):
+        """Add (sign=1) or remove (sign=-1) a command from the running totals"""
+        retained = command.retained(undone)
+        self.removed_shapes += sign * retained
+        self.bytes += sign * (command.size + retained * SHAPE_BYTES)
+
+    def push(self, command):
+        """Record a new edit; this invalidates everything that could be redone"""
+        command.size = estimate_size(command)
+        self.undo_stack.append(command)
+        self._account(command, False, 1)
+        for undone in self.redo_stack:
+            undone.discard(self.scene, True)
+            self._account(undone, True, -1)
+        self.redo_stack.clear()
+        self._enforce_budget()
+
+    def undo(self):
+        if not self.undo_stack:
+            return False
+        command = self.undo_stack.pop()
+        command.undo(self.scene)
+        self.redo_stack.append(command)
+        if len(self.undo_stack) < self.checkpoints:
+            self.checkpoints = len(self.undo_stack)
+        self._account(command, False, -1)
+        self._account(command, True, 1)
+        return True
+
+    def redo(self):
+        if not self.redo_stack:
+            return False
+        command = self.redo_stack.pop()
+        command.redo(self.scene)
+        if isinstance(command, CheckpointCommand) and len(self.undo_stack) == self.checkpoints:
+            self.checkpoints += 1
+        self.undo_stack.append(command)
+        self._account(command, True, -1)
+        self._account(command, False, 1)
+        return True
+
+    def clear(self):
+        for command in self.undo_stack:
+            command.discard(self.scene, False)
+        for command in self.redo_stack:
+            command.discard(self.scene, True)
+        self.undo_stack.clear()
+        self.redo_stack.clear()
+        self.checkpoints = 0
+        self.bytes = 0
+        self.removed_shapes = 0
+
+    def _over_budget(self):
+        entries = len(self.undo_stack) + len(self.redo_stack)
+        return ((self.max_bytes is not None and self.bytes > self.max_bytes)
+                or (self.max_entries is not None and entries > self.max_entries))
+
+    def _enforce_budget(self):
+        # Periodically fold the oldest fine-grained steps into a checkpoint
+        fine = len(self.undo_stack) - self.checkpoints
+        if fine >= self.keep_steps + self.checkpoint_every:
+            start = self.checkpoints
+            block = self.undo_stack[start:start + self.checkpoint_every]
+            checkpoint = compact(self.scene, block)
+            checkpoint.size = estimate_size(checkpoint)
+            for command in block:
+                self._account(command, False, -1)
+            self._account(checkpoint, False, 1)
+            self.undo_stack[start:start + self.checkpoint_every] = [checkpoint]
+            self.checkpoints += 1
+
+        # Then drop the oldest entries until the history fits again
+        while self._over_budget() and len(self.undo_stack) > self.keep_steps:
+            command = self.undo_stack.pop(0)
+            command.discard(self.scene, False)
+            self._account(command, False, -1)
+            self.checkpoints = max(0, self.checkpoints - 1)
+            self.dropped += 1
+
+    def report(self):
+        """Return a summary of what the history currently holds"""
+        return {
+            "undo_steps": len(self.undo_stack),
+            "redo_steps": len(self.redo_stack),
+            "checkpoints": self.checkpoints,
+            "dropped": self.dropped,
+            "removed_shapes": self.removed_shapes,
+            "bytes": self.bytes,
+        }
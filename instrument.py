@@ -0,0 +1,263 @@
+"""Opt-in timing of the app's event handlers and file I/O.
+
+Methods decorated with ``instrumented`` report each call to the Probe in
+their object's ``probe`` attribute. While that is None, as it is unless
+timing is switched on (View > Timings or ``--timings``), the only cost
+is the wrapper call and one attribute check. A Probe keeps a latency
+histogram per handler, counts the Tcl calls the canvas makes and samples
+the view's canvas item count, and keeps the latest calls for a trace.
+
+``Probe.write_json`` exports the statistics; ``Probe.write_trace`` exports
+the calls in the Chrome trace event format, which chrome://tracing and
+Perfetto open.
+
+A StartupProfile times the phases of startup, for ``--startup-profile``.
+"""
+import functools
+import json
+import math
+import os
+import sys
+import threading
+import time
+from collections import deque
+
+BUCKETS_PER_OCTAVE = 4  # histogram buckets per doubling of the latency
+OCTAVES = 24  # from 1 us up to about 17 s
+TRACE_EVENTS = 200000  # calls kept for the trace, the latest ones
+# Modules startup leaves to be imported on first use
+DEFERRED_MODULES = ("numpy", "PIL", "render", "rasterview", "loader", "saver", "binformat", "multiprocessing",
+                    "tkinter.filedialog", "tkinter.colorchooser", "tkinter.simpledialog")
+
+
+def instrumented(name=None):
+    """Decorate a method so its calls are timed by ``self.probe``, if it is set
+
+    ``name`` labels the calls, by default the method's name.
+    """
+    def decorate(method):
+        label = name or method.__name__
+
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            probe = self.probe
+            if probe is None:
+                return method(self, *args, **kwargs)
+            calls = probe.tcl_calls()
+            start = time.perf_counter_ns()
+            try:
+                return method(self, *args, **kwargs)
+            finally:
+                probe.record(label, start, time.perf_counter_ns(), probe.tcl_calls() - calls)
+        return wrapper
+    return decorate
+
+
+class Histogram:
+    """Counts latencies in logarithmic buckets, a quarter octave wide"""
+
+    def __init__(self):
+        self.counts = [0] * (OCTAVES * BUCKETS_PER_OCTAVE + 1)
+        self.count = 0
+        self.total = 0  # nanoseconds
+        self.max = 0
+
+    def add(self, ns):
+        us = ns / 1000
+        bucket = 0 if us < 1 else min(int(math.log2(us) * BUCKETS_PER_OCTAVE) + 1, len(self.counts) - 1)
+        self.counts[bucket] += 1
+        self.count += 1
+        self.total += ns
+        self.max = max(self.max, ns)
+
+    @staticmethod
+    def upper_ms(bucket):
+        """Return the latency in milliseconds up to which a bucket counts"""
+        return 2 ** (bucket / BUCKETS_PER_OCTAVE) / 1000
+
+    def percentile(self, q):
+        """Return the bucket bound in milliseconds below which a fraction ``q`` of the latencies fall"""
+        if not self.count:
+            return 0.0
+        wanted = q * self.count
+        seen = 0
+        for bucket, count in enumerate(self.counts):
+            seen += count
+            if seen >= wanted:
+                return min(self.upper_ms(bucket), self.max / 1e6)
+        return self.max / 1e6
+
+
+class TclCounter:
+    """Stands in for a widget's Tcl interpreter, counting the calls made through it"""
+
+    def __init__(self, tk):
+        self.tk = tk
+        self.calls = 0
+
+    def call(self, *args):
+        self.calls += 1
+        return self.tk.call(*args)
+
+    def __getattr__(self, name):
+        return getattr(self.tk, name)
+
+
+class Probe:
+    """Collects the timings of instrumented calls
+
+    ``canvas`` is the canvas whose Tcl calls are counted while the probe is
+    started; canvases without an interpreter, like the benchmarks' stand-in,
+    are asked for their own ``calls`` count. ``view`` is asked for the item
+    count after each call on the main thread.
+    """
+
+    def __init__(self, canvas, view):
+        self.canvas = canvas
+        self.view = view
+        self.histograms = {}  # name -> Histogram
+        self.tcl = {}  # name -> Tcl calls made by its calls
+        self.items = {}  # name -> most canvas items after one of its calls
+        self.trace = deque(maxlen=TRACE_EVENTS)  # (name, start ns, end ns, thread id, Tcl calls, items)
+        self.main_thread = threading.get_ident()
+        self.lock = threading.Lock()
+        self.counter = None
+        self.started = time.perf_counter_ns()
+
+    def start(self):
+        if self.counter is None and hasattr(self.canvas, "tk"):
+            self.counter = self.canvas.tk = TclCounter(self.canvas.tk)
+
+    def stop(self):
+        if self.counter is not None:
+            self.canvas.tk = self.counter.tk
+            self.counter = None
+
+    def tcl_calls(self):
+        if self.counter is not None:
+            return self.counter.calls
+        return getattr(self.canvas, "calls", 0)
+
+    def record(self, name, start, end, calls):
+        thread = threading.get_ident()
+        items = None
+        if thread == self.main_thread:
+            items = self.view.item_count()
+        else:
+            # The counter only sees the main thread's calls
+            calls = 0
+        with self.lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+                self.tcl[name] = 0
+                self.items[name] = 0
+            histogram.add(end - start)
+            self.tcl[name] += calls
+            if items is not None:
+                self.items[name] = max(self.items[name], items)
+            self.trace.append((name, start, end, thread, calls, items))
+
+    def report(self):
+        """Return the statistics of every instrumented name, as exported by ``write_json``"""
+        with self.lock:
+            handlers = {}
+            for name, histogram in self.histograms.items():
+                handlers[name] = {
+                    "count": histogram.count,
+                    "total_ms": histogram.total / 1e6,
+                    "mean_ms": histogram.total / histogram.count / 1e6,
+                    "p50_ms": histogram.percentile(0.5),
+                    "p95_ms": histogram.percentile(0.95),
+                    "p99_ms": histogram.percentile(0.99),
+                    "max_ms": histogram.max / 1e6,
+                    "tcl_calls": self.tcl[name],
+                    "max_items": self.items[name],
+                    "histogram": [{"le_ms": Histogram.upper_ms(bucket), "count": count}
+                                  for bucket, count in enumerate(histogram.counts) if count],
+                }
+        return {"seconds": (time.perf_counter_ns() - self.started) / 1e9, "tcl_calls": self.tcl_calls(),
+                "items": self.view.item_count(), "handlers": handlers}
+
+    def summary(self, limit=8):
+        """Return text lines for the overlay: the names that took the most time, and the totals"""
+        report = self.report()
+        handlers = sorted(report["handlers"].items(), key=lambda item: item[1]["total_ms"], reverse=True)
+        lines = [f"{'':<16}{'calls':>7}{'p50':>9}{'p95':>9}{'max':>9}{'Tcl/call':>9}"]
+        for name, stats in handlers[:limit]:
+            lines.append(f"{name:<16}{stats['count']:>7}{stats['p50_ms']:>7.2f}ms{stats['p95_ms']:>7.2f}ms"
+                         f"{stats['max_ms']:>7.1f}ms{stats['tcl_calls'] / stats['count']:>9.1f}")
+        lines.append(f"{report['items']} canvas items, {report['tcl_calls']} Tcl calls")
+        return lines
+
+    def status(self):
+        """Return one line for the status bar"""
+        report = self.report()
+        busiest = sorted(report["handlers"].items(), key=lambda item: item[1]["total_ms"], reverse=True)[:3]
+        parts = [f"{name} p95 {stats['p95_ms']:.2f} ms" for name, stats in busiest]
+        return " | ".join(parts + [f"{report['items']} items"])
+
+    def write_json(self, path):
+        with open(path, "w") as f:
+            json.dump(self.report(), f, indent=2)
+
+    def write_trace(self, path):
+        """Write the latest calls as complete ("X") events of the Chrome trace event format"""
+        with self.lock:
+            trace = list(self.trace)
+        pid = os.getpid()
+        events = [{"name": "thread_name", "ph": "M", "pid": pid, "tid": thread,
+                   "args": {"name": "main" if thread == self.main_thread else "worker"}}
+                  for thread in {entry[3] for entry in trace}]
+        for name, start, end, thread, calls, items in trace:
+            args = {"tcl_calls": calls}
+            if items is not None:
+                args["items"] = items
+            events.append({"name": name, "cat": "handler", "ph": "X", "pid": pid, "tid": thread,
+                           "ts": (start - self.started) / 1000, "dur": (end - start) / 1000, "args": args})
+        with open(path, "w") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+
+
+class StartupProfile:
+    """Times the phases of startup, each from the end of the one before
+
+    ``started`` is the ``time.perf_counter()`` reading startup is timed from.
+    """
+
+    def __init__(self, started):
+        self.started = self.last = started
+        self.phases = []  # (name, seconds)
+
+    def mark(self, name, now=None):
+        """End the phase ``name`` now, or at the perf_counter reading ``now``"""
+        now = time.perf_counter() if now is None else now
+        self.phases.append((name, now - self.last))
+        self.last = now
+
+    def total(self):
+        return self.last - self.started
+
+    def report(self):
+        return {
+            "phases_ms": {name: seconds * 1000 for name, seconds in self.phases},
+            "total_ms": self.total() * 1000,
+            "modules": len(sys.modules),
+            "deferred": [name for name in DEFERRED_MODULES if name not in sys.modules],
+        }
+
+    def lines(self):
+        report = self.report()
+        lines = [f"{name:<16}{ms:>9.1f} ms" for name, ms in report["phases_ms"].items()]
+        lines.append(f"{'total':<16}{report['total_ms']:>9.1f} ms")
+        lines.append(f"{report['modules']} modules loaded; not loaded yet: {', '.join(report['deferred']) or 'none'}")
+        return lines
+
+    def write(self, path):
+        """Write the report as JSON to ``path``, or as text to stderr if ``path`` is ``-``"""
+        if path == "-":
+            if sys.stderr is not None:  # None in a windowed build
+                print("\n".join(self.lines()), file=sys.stderr)
+            return
+        with open(path, "w") as f:
+            json.dump(self.report(), f, indent=2)
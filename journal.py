@@ -0,0 +1,423 @@
+"""Append-only autosave journal for crash recovery.
+
+A Journal is attached to the Scene next to the view and records every change
+as one JSON line (add, remove, restore, move, restyle, reshape), so the cost
+of autosaving follows the edit rate rather than the drawing size. Shapes are
+identified by their ``seq``; a restore carries the whole shape, so replay
+never needs shapes removed before the last snapshot. A group move lists its
+shapes once ("group") and then logs only the offset ("move_group"). Layer
+changes are logged too, and layers are identified by their position, which
+replay follows as layers are added, removed and restacked.
+
+Lines are written and fsync'd by a writer thread in batches every
+``FLUSH_SECONDS``. A journal starts with a snapshot of the drawing: a
+"snapshot" line with the layers, then "shapes" lines of ``SNAPSHOT_CHUNK``
+shapes each, so neither writing nor replaying it holds the GIL (and with it
+the Tk thread) for longer than one small JSON call.
+After File > Open that snapshot comes from the rows the loader collected
+while it fed the drawing in (see ``SceneDiff``), so starting the journal
+does not walk the scene on the Tk thread. Once the journal holds more
+entries than the drawing has shapes it is compacted: the writer replays the
+file it wrote into a snapshot and replaces it, so the file stays
+proportional to the drawing and the Tk thread only queues the request.
+
+Each running instance has a session file in ``JOURNAL_DIR``, locked for as
+long as the process runs, that points at its journal; the file is removed
+on a clean exit. The journal lives next to the document
+(``drawing.json.<session>.journal``), or in ``JOURNAL_DIR`` while the
+drawing is untitled, so instances never share one; when the document is
+saved under a new name the writer moves it there the same way
+(``relocate``). On startup, a session file nobody holds the lock of means
+that instance did not exit cleanly, and the app offers to replay its
+journal (``pending_recovery``).
+"""
+import json
+import os
+import queue
+import tempfile
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+from scene import Layer, Shape, style_value
+
+JOURNAL_DIR = os.path.join(os.path.expanduser("~"), ".cgpro")
+SESSION_PREFIX = "session-"
+EXTENSION = ".journal"
+FLUSH_SECONDS = 1.0
+COMPACT_MIN_ENTRIES = 10000
+SNAPSHOT_CHUNK = 1000  # shapes per line of a snapshot
+
+
+_session = None  # this process's session file, open and locked
+
+
+def _lock(f):
+    """Lock an open file for this process without waiting; return False if another holds it"""
+    try:
+        if fcntl:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+    except OSError:
+        return False
+    return True
+
+
+def _session_file():
+    global _session
+    if _session is None:
+        os.makedirs(JOURNAL_DIR, exist_ok=True)
+        fd, path = tempfile.mkstemp(prefix=SESSION_PREFIX, dir=JOURNAL_DIR)
+        os.close(fd)
+        _session = open(path, "r+")
+        _lock(_session)
+    return _session
+
+
+def _end_session():
+    global _session
+    if _session is not None:
+        _session.close()
+        os.remove(_session.name)
+        _session = None
+
+
+def journal_path(document_path):
+    """Return where this process keeps the journal of a document (None for untitled)"""
+    session = os.path.basename(_session_file().name)[len(SESSION_PREFIX):]
+    if document_path is None:
+        return os.path.join(JOURNAL_DIR, f"untitled.{session}{EXTENSION}")
+    return f"{document_path}.{session}{EXTENSION}"
+
+
+def _write_recovery(path):
+    f = _session_file()
+    f.seek(0)
+    f.truncate()
+    f.write(path)
+    f.flush()
+
+
+class Recovery:
+    """The journal of a session that did not exit cleanly; holds that session's lock"""
+
+    def __init__(self, session, f, path):
+        self.session = session
+        self.file = f
+        self.path = path
+
+    def adopt(self):
+        """Carry on the session in this process, so the next journal replaces the recovered one
+
+        Call it before this process starts a journal.
+        """
+        global _session
+        _session = self.file
+
+    def discard(self):
+        """Delete the journal and its session"""
+        self.file.close()
+        for path in (self.path, self.session):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def release(self):
+        """Leave the journal to be offered again on the next start"""
+        self.file.close()
+
+
+def pending_recovery():
+    """Return the Recovery of a session that did not exit cleanly, or None
+
+    A running instance holds the lock of its session file, so only the
+    files of instances that are gone can be locked here. Those that point
+    at no journal are removed on the way.
+    """
+    try:
+        names = sorted(os.listdir(JOURNAL_DIR))
+    except OSError:
+        return None
+    for name in names:
+        session = os.path.join(JOURNAL_DIR, name)
+        if not name.startswith(SESSION_PREFIX) or (_session is not None and session == _session.name):
+            continue
+        try:
+            f = open(session, "r+")
+        except OSError:
+            continue
+        if not _lock(f):
+            f.close()
+            continue
+        path = f.read().strip()
+        if path and os.path.exists(path):
+            return Recovery(session, f, path)
+        f.close()
+        os.remove(session)
+    return None
+
+
+def _replay(path):
+    """Replay a journal; return (document path, layers bottom to top, {seq: Shape})"""
+    document = None
+    layers = [Layer()]
+    shapes = {}  # seq -> Shape
+    group = []
+    with open(path, "r") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                break  # the last batch was cut short by the crash
+            op = entry["op"]
+            if op == "snapshot":
+                document = entry["document"]
+                layers = [Layer.from_dict(record) for record in entry.get("layers", [Layer().to_dict()])]
+                shapes = {}
+            if op in ("snapshot", "shapes"):
+                # Journals written before layers have no layer position
+                for seq, *layer, record in entry["shapes"]:
+                    shape = shapes[seq] = Shape.from_dict(record)
+                    shape.layer = layers[layer[0] if layer else 0]
+                continue
+            if op in ("add", "restore"):
+                shape = shapes[entry["seq"]] = Shape.from_dict(entry["shape"])
+                shape.layer = layers[entry.get("layer", 0)]
+                continue
+            if op == "layer_add":
+                layers.insert(entry["position"], Layer.from_dict(entry["layer"]))
+                continue
+            if op == "layer_remove":
+                del layers[entry["position"]]
+                continue
+            if op == "layer_move":
+                layers.insert(entry["to"], layers.pop(entry["from"]))
+                continue
+            if op == "layer_change":
+                for key, value in entry["props"].items():
+                    setattr(layers[entry["position"]], key, value)
+                continue
+            if op == "group":
+                group = entry["seqs"]
+                continue
+            if op == "move_group":
+                dx, dy = entry["dx"], entry["dy"]
+                for seq in group:
+                    shape = shapes.get(seq)
+                    if shape is not None:
+                        shape.coords = tuple(c + (dx if i % 2 == 0 else dy) for i, c in enumerate(shape.coords))
+                continue
+            shape = shapes.get(entry["seq"])
+            if shape is None:
+                continue
+            if op == "remove":
+                del shapes[entry["seq"]]
+            elif op == "move":
+                dx, dy = entry["dx"], entry["dy"]
+                shape.coords = tuple(c + (dx if i % 2 == 0 else dy) for i, c in enumerate(shape.coords))
+            elif op == "restyle":
+                for key, value in entry["style"].items():
+                    setattr(shape, key, style_value(key, value))
+            elif op == "reshape":
+                shape.kind = entry["kind"]
+                shape.coords = tuple(entry["coords"])
+    return document, layers, shapes
+
+
+def read_journal(path):
+    """Replay a journal; return (document path, layers each followed by its shapes, bottom to top)"""
+    document, layers, shapes = _replay(path)
+    by_layer = {layer: [] for layer in layers}
+    for seq, shape in sorted(shapes.items()):
+        by_layer[shape.layer].append(shape)
+    return document, [item for layer in layers for item in [layer] + by_layer[layer]]
+
+
+def _snapshot_lines(document, rows, layer_table):
+    """Yield the snapshot lines of (seq, layer position, kind, coords, outline, fill, width) rows"""
+    yield json.dumps({"op": "snapshot", "document": document,
+                      "layers": [Layer(*layer).to_dict() for layer in layer_table], "shapes": []}) + "\n"
+    entries = []
+    for seq, layer, *row in rows:
+        entries.append([seq, layer, Shape(*row).to_dict()])
+        if len(entries) == SNAPSHOT_CHUNK:
+            yield json.dumps({"op": "shapes", "shapes": entries}) + "\n"
+            entries = []
+    if entries:
+        yield json.dumps({"op": "shapes", "shapes": entries}) + "\n"
+
+
+def _compacted_lines(path, document):
+    """Return the snapshot lines of the drawing a journal file replays to"""
+    layers, shapes = _replay(path)[1:]
+    positions = {layer: i for i, layer in enumerate(layers)}
+    rows = ((seq, positions[shape.layer], shape.kind, shape.coords, shape.outline, shape.fill, shape.width)
+            for seq, shape in shapes.items())
+    return _snapshot_lines(document, rows, [(layer.name, layer.visible, layer.locked) for layer in layers])
+
+
+class _Compact:
+    """Queued for the writer: replace the journal with its snapshot, at ``path``"""
+
+    def __init__(self, path, document):
+        self.path = path
+        self.document = document
+
+
+class Journal:
+    """Records scene changes to an append-only file on a writer thread
+
+    Implements the same notifications as CanvasView; attach it with
+    ``scene.journal = journal`` after ``start``.
+    """
+
+    def __init__(self, scene, path, document=None):
+        self.scene = scene
+        self.path = path
+        self.document = document
+        self.group = None  # the seqs of the last group move
+        self.entries = 0
+        self.lines = queue.Queue()
+        self.stopping = threading.Event()
+        self.thread = threading.Thread(target=self._write, daemon=True)
+
+    def start(self, base=None):
+        """Begin the journal with a snapshot of the drawing
+
+        ``base`` is the drawing as (rows, layer table), see
+        ``SceneDiff.base``; without it the scene is snapshot, which walks
+        every shape on the calling thread.
+        """
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        if base is None:
+            seqs, kinds, coords, outlines, fills, widths, layers, layer_table = self.scene.snapshot()
+            base = zip(seqs, layers, kinds, coords, outlines, fills, widths), layer_table
+        self.lines.put(base)
+        self.thread.start()
+        _write_recovery(self.path)
+
+    def close(self, discard=False):
+        """Write out what is pending and stop; ``discard`` deletes the journal"""
+        self.stopping.set()
+        self.lines.put(None)
+        self.thread.join()
+        if discard:
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+            _end_session()
+
+    def compact(self):
+        """Have the writer replace the journal with a snapshot of what it replays to"""
+        self.lines.put(_Compact(self.path, self.document))
+        self.entries = 0
+        self.group = None
+
+    def relocate(self, document):
+        """Follow the document to a new path; the writer moves the journal next to it"""
+        self.document = document
+        self.path = journal_path(document)
+        self.compact()
+
+    def _log(self, entry):
+        self.lines.put(json.dumps(entry) + "\n")
+        self.entries += 1
+        # Compacting at a size proportional to the drawing keeps its cost
+        # per logged edit constant
+        if self.entries > max(COMPACT_MIN_ENTRIES, len(self.scene)):
+            self.compact()
+
+    def _write(self):
+        path = self.path
+        f = open(path, "a")
+        running = True
+        while running:
+            batch = [self.lines.get()]
+            # Let a batch build up so one fsync covers many edits
+            self.stopping.wait(FLUSH_SECONDS)
+            while True:
+                try:
+                    batch.append(self.lines.get_nowait())
+                except queue.Empty:
+                    break
+            for item in batch:
+                if item is None:
+                    running = False
+                elif isinstance(item, str):
+                    f.write(item)
+                else:
+                    # Everything logged before the snapshot is in it
+                    f.close()
+                    if isinstance(item, _Compact):
+                        lines = _compacted_lines(path, item.document)
+                        target = item.path
+                    else:
+                        lines = _snapshot_lines(self.document, *item)
+                        target = path
+                    from saver import write_atomic  # not at startup: saver needs NumPy
+                    write_atomic(target, lambda out: out.writelines(lines))
+                    if target != path:
+                        _write_recovery(target)
+                        os.remove(path)
+                        path = target
+                    f = open(path, "a")
+            f.flush()
+            os.fsync(f.fileno())
+        f.close()
+
+    def _position(self, layer):
+        return self.scene.layers.index(layer)
+
+    # Scene notifications
+    def shape_added(self, shape):
+        self._log({"op": "add", "seq": shape.seq, "layer": self._position(shape.layer), "shape": shape.to_dict()})
+
+    def shape_removed(self, shape):
+        self._log({"op": "remove", "seq": shape.seq})
+
+    def shape_restored(self, shape):
+        self._log({"op": "restore", "seq": shape.seq, "layer": self._position(shape.layer),
+                   "shape": shape.to_dict()})
+
+    def shape_purged(self, shape):
+        pass  # removed shapes are not kept in the journal
+
+    def shape_moved(self, shape, dx, dy):
+        self._log({"op": "move", "seq": shape.seq, "dx": dx, "dy": dy})
+
+    def shapes_moved(self, shapes, dx, dy):
+        # The same selection usually moves many times: list its shapes once.
+        # Each move hands over a new tuple of them, so compare what is in it
+        seqs = [shape.seq for shape in shapes]
+        if seqs != self.group:
+            self.group = seqs
+            self._log({"op": "group", "seqs": seqs})
+        self._log({"op": "move_group", "dx": dx, "dy": dy})
+
+    def shape_restyled(self, shape, style):
+        self._log({"op": "restyle", "seq": shape.seq, "style": style})
+
+    def shape_reshaped(self, shape, kind_changed):
+        self._log({"op": "reshape", "seq": shape.seq, "kind": shape.kind, "coords": list(shape.coords)})
+
+    def layer_added(self, layer, position):
+        self._log({"op": "layer_add", "position": position, "layer": layer.to_dict()})
+
+    def layer_removed(self, layer, position):
+        self._log({"op": "layer_remove", "position": position})
+
+    def layer_moved(self, layer, old, position):
+        self._log({"op": "layer_move", "from": old, "to": position})
+
+    def layer_changed(self, layer, props):
+        self._log({"op": "layer_change", "position": self._position(layer), "props": props})
+
+    def layer_activated(self, layer):
+        pass  # which layer is edited is not part of the drawing
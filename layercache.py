@@ -0,0 +1,79 @@
+"""Flattened raster images of the layers that are not being edited.
+
+A CanvasView keeps canvas items only for the live layer. The visible layers
+below it, and those above it, are each shown as one image, rendered with
+Pillow (see render.py) for a box of the drawing around the window at the
+current zoom. A LayerCache keeps one transparent RGBA image per layer and
+the flattened image of each group, and only renders a layer again after it
+changed or the box or zoom did, so editing the live layer or hiding,
+showing and restacking the others never re-renders an unchanged layer.
+
+Pillow, NumPy and render.py are imported when a layer is first rendered, so
+they are not loaded at startup.
+"""
+TRANSPARENT = (0, 0, 0, 0)
+
+
+def render_layer(layer, zoom, box):
+    """Render a layer's shapes in the drawing box ``box`` at ``zoom`` to a transparent RGBA image"""
+    import numpy as np
+    import render
+    from shapestore import ShapeStore
+    x1, y1, x2, y2 = box
+    size = (round((x2 - x1) * zoom), round((y2 - y1) * zoom))
+    # Strokes reach past the bounding boxes the index keeps
+    reach = layer.index.max_width / 2 + 1
+    shapes = layer.index.query_rect(x1 - reach, y1 - reach, x2 + reach, y2 + reach)
+    store = ShapeStore.from_shapes(shapes, np.float64)
+    # Window pixels of the box, where the canvas would draw the shapes
+    store.coords[0::2] = (store.coords[0::2] - x1) * zoom
+    store.coords[1::2] = (store.coords[1::2] - y1) * zoom
+    store.style_table = [(outline, fill, width * zoom) for outline, fill, width in store.style_table]
+    return render.TileRenderer(store, TRANSPARENT, mode="RGBA").render((0, 0, *size))
+
+
+class LayerCache:
+    """Renders groups of layers to Tk images, re-rendering only what changed
+
+    ``photo`` turns a Pillow image into the image a canvas item shows,
+    ``ImageTk.PhotoImage`` by default. ``renders`` counts the layers
+    rendered so far.
+    """
+
+    def __init__(self, photo=None):
+        self.photo = photo
+        self.key = None  # (zoom, box) the images are rendered for
+        self.images = {}  # layer -> its RGBA image
+        self.groups = {}  # group name -> (layers, image flattening them)
+        self.renders = 0
+
+    def invalidate(self, layer):
+        """Forget the image of a layer whose shapes changed"""
+        self.images.pop(layer, None)
+        self.groups = {name: group for name, group in self.groups.items() if layer not in group[0]}
+
+    def flatten(self, name, layers, zoom, box):
+        """Return the Tk image of ``layers`` (bottom to top) flattened over ``box``, or None if there are none
+
+        ``name`` tells the groups apart; a group is flattened again only
+        when its layers or their images changed.
+        """
+        if (zoom, box) != self.key:
+            self.key = (zoom, box)
+            self.images.clear()
+            self.groups.clear()
+        layers = tuple(layers)
+        if not layers:
+            self.groups.pop(name, None)
+            return None
+        group = self.groups.get(name)
+        if group is None or group[0] != layers:
+            from PIL import Image, ImageTk
+            image = None
+            for layer in layers:
+                if layer not in self.images:
+                    self.images[layer] = render_layer(layer, zoom, box)
+                    self.renders += 1
+                image = self.images[layer] if image is None else Image.alpha_composite(image, self.images[layer])
+            group = self.groups[name] = (layers, (self.photo or ImageTk.PhotoImage)(image))
+        return group[1]
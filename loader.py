@@ -0,0 +1,252 @@
+"""Streaming, non-blocking loading of drawings.
+
+A DrawingLoader parses the file on a background thread and hands the shapes
+to the Tk main thread in batches. The main thread adds them to the scene
+from ``root.after`` callbacks that each stop after a small time budget, so
+the window keeps handling events, the first shapes appear as soon as the
+first batch is parsed whatever the file size, and the load can be cancelled
+part way through.
+"""
+import gc
+import json
+import os
+import queue
+import threading
+import time
+from itertools import chain
+
+import numpy as np
+
+import binformat
+import raster
+from history import SceneDiff
+from instrument import instrumented
+from scene import Layer, Shape, is_layer_record
+
+CHUNK_SHAPES = 2000       # shapes per batch handed over by the parser thread
+READ_BYTES = 1 << 16      # JSON is read and decoded this many bytes at a time
+FRAME_BUDGET = 0.015      # seconds of main thread work per after() callback
+QUEUE_CHUNKS = 8          # parsed batches buffered ahead of the canvas
+LOAD_GC_THRESHOLD = 1000000  # young collections between full collections while loading
+
+
+def iter_records(f):
+    """Yield the records of a File > Save JSON array one at a time
+
+    Decodes the file piece by piece with ``raw_decode`` instead of loading
+    it whole, so the first records are available right away.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ""
+    position = 0
+    started = False
+    while True:
+        # Skip whitespace and the array punctuation between records
+        while position < len(buffer) and buffer[position] in " \t\r\n,[]":
+            started = started or buffer[position] == "["
+            position += 1
+        if position < len(buffer):
+            if not started:
+                raise ValueError("Drawing file is not a JSON list")
+            try:
+                record, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                record = None  # the record continues in the next piece
+            if record is not None:
+                yield record
+                position = end
+                continue
+        data = f.read(READ_BYTES)
+        if not data:
+            if position < len(buffer):
+                raise ValueError("Drawing file is truncated")
+            return
+        buffer = buffer[position:] + data
+        position = 0
+
+
+def _compacted(polylines):
+    """Yield the coords of each polyline (a sequence of x, y coords) as ``compact_lines`` stores them"""
+    offsets = np.zeros(len(polylines) + 1, np.int64)
+    np.cumsum([len(coords) for coords in polylines], out=offsets[1:])
+    coords = np.fromiter(chain.from_iterable(polylines), np.float64, offsets[-1])
+    dda = raster.dda_polylines(coords, offsets)
+    counts = np.diff(offsets)
+    # Every other polyline loses its collinear vertices in one pass too
+    rest, rest_offsets = raster.compact_polylines(coords[np.repeat(~dda, counts)],
+                                                  np.concatenate(([0], np.cumsum(counts[~dda]))))
+    rest = iter(np.split(rest, rest_offsets[1:-1]))
+    for line, is_dda in zip(polylines, dda.tolist()):
+        yield list(line[:2]) + list(line[-2:]) if is_dda else next(rest).tolist()
+
+
+def compact_lines(shapes):
+    """Store lines saved with one vertex per DDA pixel by their endpoints
+
+    Older versions kept every pixel of a DDA line as a polyline vertex. Those
+    lines are replaced by their two endpoints; other polylines only lose
+    vertices in the middle of straight runs, which does not change them.
+    """
+    lines = [shape for shape in shapes if isinstance(shape, Shape) and shape.kind == "line" and len(shape.coords) > 4]
+    if lines:
+        for shape, coords in zip(lines, _compacted([shape.coords for shape in lines])):
+            shape.coords = tuple(coords)
+
+
+def compact_records(records):
+    """Like ``compact_lines``, for File > Save records before they become Shapes
+
+    Saves converting every pixel of an old line to a float only to drop it.
+    """
+    lines = [record for record in records if record.get("type") == "line" and len(record["coords"]) > 4]
+    if lines:
+        for record, coords in zip(lines, _compacted([record["coords"] for record in lines])):
+            record["coords"] = coords
+
+
+def _shapes(batch):
+    """Return the Layers and shape records of a JSON batch as Layers and compacted Shapes"""
+    compact_records([item for item in batch if not isinstance(item, Layer)])
+    return [item if isinstance(item, Layer) else Shape.from_dict(item) for item in batch]
+
+
+def read_batches(path, stop):
+    """Yield (items, fraction done) batches of a JSON or .cgd drawing until ``stop`` is set
+
+    The items are the drawing's Layers, bottom to top, each followed by its
+    Shapes; a drawing saved before layers gets a single default layer.
+    """
+    if binformat.is_binary_drawing(path):
+        store = binformat.read_drawing(path)
+        start = 0
+        for name, visible, locked, count in binformat.read_layers(path):
+            end = start + count
+            batch = [Layer(name, visible, locked)]
+            # Each layer starts a batch of its own
+            while True:
+                if stop.is_set():
+                    return
+                stop_at = min(start + CHUNK_SHAPES, end)
+                batch.extend(store.select(np.arange(start, stop_at)).to_shapes())
+                compact_lines(batch)
+                start = stop_at
+                yield batch, start / max(len(store), 1)
+                if start == end:
+                    break
+                batch = []
+        return
+
+    size = os.path.getsize(path) or 1
+    with open(path, "r") as f:
+        batch = []  # Layers and shape records, made Shapes once compacted
+        layered = False
+        for record in iter_records(f):
+            if is_layer_record(record):
+                batch.append(Layer.from_dict(record))
+                layered = True
+                continue
+            if not layered:
+                batch.append(Layer())
+                layered = True
+            batch.append(record)
+            if len(batch) >= CHUNK_SHAPES:
+                if stop.is_set():
+                    return
+                yield _shapes(batch), min(f.tell() / size, 1.0)
+                batch = []
+        if batch:
+            yield _shapes(batch), 1.0
+
+
+class DrawingLoader:
+    """Loads a drawing file into the scene without blocking the Tk main loop
+
+    ``on_progress(shapes_loaded, fraction)`` is called after each main
+    thread step; ``on_done(command, error)`` once at the end, with the
+    ReplaceCommand for the undo history, or with ``command`` None if the load
+    failed (``error`` is the exception) or was cancelled (``error`` None).
+    ``probe`` times the parsing and each main thread step (see instrument.py).
+    """
+    probe = None
+
+    def __init__(self, root, scene, path, on_progress, on_done):
+        self.root = root
+        self.path = path
+        self.on_progress = on_progress
+        self.on_done = on_done
+        self.diff = SceneDiff(scene)
+        self.loaded = 0
+        self.fraction = 0.0
+        self.pending = []
+        self.batches = queue.Queue(QUEUE_CHUNKS)
+        self.stop = threading.Event()
+        self.after_id = None
+        self.gc_threshold = None  # the collector's thresholds before the load
+        self.thread = threading.Thread(target=self._parse, daemon=True)
+
+    def start(self):
+        # Loading allocates millions of objects that are never cyclic garbage.
+        # Young collections stay cheap, but a full one rescans all of them and
+        # stalls the UI for longer as the drawing grows: put those off until
+        # the load is done (see _finish)
+        self.gc_threshold = gc.get_threshold()
+        gc.set_threshold(*self.gc_threshold[:2], LOAD_GC_THRESHOLD)
+        self.thread.start()
+        self.after_id = self.root.after(1, self._pump)
+
+    def _put(self, item):
+        # Give up if the main thread cancelled while the queue is full
+        while not self.stop.is_set():
+            try:
+                self.batches.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+    @instrumented("read file")
+    def _parse(self):
+        try:
+            for batch in read_batches(self.path, self.stop):
+                self._put(batch)
+            self._put(None)
+        except Exception as e:
+            self._put(e)
+
+    def _finish(self, command, error):
+        self.after_id = None
+        gc.set_threshold(*self.gc_threshold)
+        self.on_done(command, error)
+
+    @instrumented("load batch")
+    def _pump(self):
+        """Add parsed shapes to the scene until the frame budget is spent"""
+        deadline = time.perf_counter() + FRAME_BUDGET
+        while time.perf_counter() < deadline:
+            if not self.pending:
+                try:
+                    item = self.batches.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._finish(self.diff.finish(), None)
+                    return
+                if isinstance(item, Exception):
+                    self.diff.cancel()
+                    self._finish(None, item)
+                    return
+                self.pending, self.fraction = item
+            # Small slices keep a single step well inside the budget
+            step, self.pending = self.pending[:200], self.pending[200:]
+            self.diff.feed(step)
+            self.loaded += len(step)
+        self.on_progress(self.loaded, self.fraction)
+        self.after_id = self.root.after(1, self._pump)
+
+    def cancel(self):
+        """Stop loading and put the previous drawing back"""
+        if self.after_id is None:
+            return
+        self.root.after_cancel(self.after_id)
+        self.stop.set()
+        self.diff.cancel()
+        self._finish(None, None)
@@ -0,0 +1,263 @@
+"""Memory accounting of the drawing app, per subsystem.
+
+A MemoryMonitor estimates the bytes held by the scene's shapes, the spatial
+indexes, the undo history, the view (with its layer images or framebuffer)
+and the canvas items Tk keeps, from the sizes of their structures. Large
+collections are sampled, so a report stays quick on a million shapes.
+
+It also compares the canvas's live item count with the items the view
+accounts for: anything else (polygon vertex markers, the timings overlay, a
+leaked item) shows up as the gap, broken down by the tags given.
+
+While tracemalloc is tracing (``start_tracing``, Help > Mark Memory
+Snapshot or ``--trace-memory``) the report adds the Python memory allocated
+by each subsystem's modules. ``mark`` takes a snapshot and ``diff`` lists
+what was allocated or freed since, by source line. Tracing slows the app
+down, and a traced report takes seconds on a drawing of 100000 shapes.
+"""
+import itertools
+import os
+import sys
+import time
+import tracemalloc
+
+from scene import CanvasView
+
+SAMPLE = 1000  # items measured in each large collection, the rest are estimated from them
+TK_ITEM_BYTES = 300  # rough cost of one canvas item inside Tk, tags and coords included
+TRACE_FRAMES = 1  # stack frames tracemalloc keeps per allocation
+
+# Subsystem each module's allocations are counted under
+MODULES = {
+    "scene.py": "scene",
+    "shapestore.py": "scene",
+    "spatial.py": "index",
+    "history.py": "history",
+    "rasterview.py": "view",
+    "viewport.py": "view",
+    "layercache.py": "view",
+    "render.py": "view",
+    "raster.py": "view",
+    "loader.py": "files",
+    "saver.py": "files",
+    "binformat.py": "files",
+    "journal.py": "files",
+    "instrument.py": "timings",
+}
+
+
+def _sampled(items, count, size_of):
+    """Estimate the total ``size_of`` the ``count`` items of ``items`` by measuring the first SAMPLE"""
+    sizes = [size_of(item) for item in itertools.islice(items, SAMPLE)]
+    if not sizes:
+        return 0
+    return sum(sizes) * count // len(sizes)
+
+
+def _tuple_size(values):
+    return sys.getsizeof(values) + sum(sys.getsizeof(value) for value in values)
+
+
+def shape_bytes(shapes):
+    """Estimate the bytes of a collection of shapes, their coords included; style strings are shared"""
+    return sys.getsizeof(shapes) + _sampled(iter(shapes), len(shapes),
+                                            lambda shape: sys.getsizeof(shape) + _tuple_size(shape.coords))
+
+
+def cells_bytes(cells):
+    """Estimate the bytes of a dict of (column, row) -> shapes, or count"""
+    # The columns and rows are mostly shared with the index's other entries
+    return sys.getsizeof(cells) + _sampled(iter(cells.items()), len(cells),
+                                           lambda cell: sys.getsizeof(cell[0]) + sys.getsizeof(cell[1]))
+
+
+def index_bytes(index):
+    """Estimate the bytes of a GridIndex"""
+    # A box's floats are those of its shape's coords
+    return (cells_bytes(index.cells) + sys.getsizeof(index.large) + sys.getsizeof(index.boxes)
+            + _sampled(iter(index.boxes.values()), len(index.boxes), sys.getsizeof))
+
+
+def lod_bytes(lod):
+    """Estimate the bytes of a LodIndex"""
+    # Entries are (level, box, column, row); small ints like the level are shared
+    size = sys.getsizeof(lod.huge) + sys.getsizeof(lod.entries)
+    size += _sampled(iter(lod.entries.values()), len(lod.entries),
+                     lambda entry: sum(sys.getsizeof(value) for value in entry[1:]) + sys.getsizeof(entry))
+    for cells, counts in zip(lod.cells, lod.counts):
+        size += cells_bytes(cells) + cells_bytes(counts)
+    return size
+
+
+def image_bytes(image):
+    """Return the pixel bytes of a Pillow image or a Tk photo image"""
+    if callable(image.width):
+        return image.width() * image.height() * 4
+    return image.width * image.height * len(image.getbands())
+
+
+def rss_bytes():
+    """Return the resident memory of the process, or None where /proc is not available"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def _ignored(stat):
+    """Tell whether tracemalloc statistics are of tracemalloc's own allocations"""
+    return stat.traceback[0].filename in (tracemalloc.__file__, "<frozen importlib._bootstrap>")
+
+
+def _kb(size):
+    return f"{size / 1024:,.0f} KB"
+
+
+class MemoryMonitor:
+    """Reports the memory of a drawing's scene, history, view and canvas
+
+    ``tags`` are the canvas tags of items the app draws outside the view,
+    counted separately in the gap between the canvas and the view.
+    """
+
+    def __init__(self, scene, history, view, canvas, tags=()):
+        self.scene = scene
+        self.history = history
+        self.view = view
+        self.canvas = canvas
+        self.tags = tags
+        self.marked = None  # (time, report, tracemalloc snapshot) of the last mark
+
+    def estimates(self):
+        """Return the estimated bytes of each subsystem's structures"""
+        scene = self.scene
+        view = self.view
+        estimates = {
+            "scene": shape_bytes(scene.shapes) + sum(sys.getsizeof(layer.shapes) for layer in scene.layers),
+            "index": sum(index_bytes(layer.index) for layer in scene.layers),
+            "history": self.history.bytes + sys.getsizeof(self.history.undo_stack)
+                                          + sys.getsizeof(self.history.redo_stack),
+            "view": 0,
+            "images": 0,
+            "tk": len(self.canvas.find_all()) * TK_ITEM_BYTES,
+        }
+        if isinstance(view, CanvasView):
+            estimates["view"] = (sys.getsizeof(view.shapes) + sys.getsizeof(view.by_seq) + sys.getsizeof(view.stack)
+                                 + len(view.stack) * sys.getsizeof(0) + lod_bytes(view.lod))
+            if view.cache is not None:
+                estimates["images"] = (sum(image_bytes(image) for image in view.cache.images.values())
+                                       + sum(image_bytes(image) for layers, image in view.cache.groups.values()))
+        else:
+            # A RasterView: its framebuffer
+            estimates["view"] = view.frame.nbytes
+            # The photo image the framebuffer is copied to, inside Tk
+            estimates["tk"] += view.frame.shape[0] * view.frame.shape[1] * 4
+        return estimates
+
+    def canvas_items(self):
+        """Return the canvas's live items against those the view accounts for"""
+        items = len(self.canvas.find_all())
+        view_items = self.view.item_count()
+        by_tag = {tag: len(self.canvas.find_withtag(tag)) for tag in self.tags}
+        return {
+            "items": items,
+            "view_items": view_items,
+            "gap": items - view_items,
+            "by_tag": by_tag,
+            "other": items - view_items - sum(by_tag.values()),
+        }
+
+    def traced(self, snapshot=None):
+        """Return the traced Python memory per subsystem, or None while tracemalloc is not tracing"""
+        if not tracemalloc.is_tracing():
+            return None
+        current, peak = tracemalloc.get_traced_memory()
+        snapshot = snapshot or self.snapshot()
+        subsystems = {}
+        for stat in snapshot.statistics("filename"):
+            if _ignored(stat):
+                continue
+            name = MODULES.get(os.path.basename(stat.traceback[0].filename), "other")
+            subsystems[name] = subsystems.get(name, 0) + stat.size
+        return {"current": current, "peak": peak, "subsystems": subsystems}
+
+    def report(self, snapshot=None):
+        """Return the estimates, the canvas items, the traced memory and the process's resident memory"""
+        history = self.history.report()
+        return {
+            "shapes": len(self.scene),
+            "layers": len(self.scene.layers),
+            "undo_steps": history["undo_steps"],
+            "redo_steps": history["redo_steps"],
+            "removed_shapes": history["removed_shapes"],
+            "estimates": self.estimates(),
+            "canvas": self.canvas_items(),
+            "traced": self.traced(snapshot),
+            "rss": rss_bytes(),
+        }
+
+    def summary(self, report=None):
+        """Return the report as text lines"""
+        report = report or self.report()
+        estimates = report["estimates"]
+        canvas = report["canvas"]
+        lines = [f"{report['shapes']} shapes on {report['layers']} layers, "
+                 f"{report['undo_steps']} undo and {report['redo_steps']} redo steps",
+                 "", "Estimated size:"]
+        lines += [f"  {name:<8}{_kb(size):>14}" for name, size in estimates.items()]
+        lines += [f"  {'total':<8}{_kb(sum(estimates.values())):>14}", "",
+                  f"Canvas items: {canvas['items']}, of which the view draws {canvas['view_items']}"]
+        if canvas["gap"]:
+            lines += [f"  {tag}: {count}" for tag, count in canvas["by_tag"].items() if count]
+            if canvas["other"]:
+                lines.append(f"  other: {canvas['other']}")
+        traced = report["traced"]
+        lines.append("")
+        if traced is None:
+            lines.append("Python allocations: not traced (Help > Mark Memory Snapshot starts tracing)")
+        else:
+            lines.append(f"Python allocations: {_kb(traced['current'])} (peak {_kb(traced['peak'])})")
+            lines += [f"  {name:<8}{_kb(size):>14}"
+                      for name, size in sorted(traced["subsystems"].items(), key=lambda item: -item[1])]
+        if report["rss"] is not None:
+            lines.append(f"Process resident memory: {_kb(report['rss'])}")
+        return lines
+
+    def start_tracing(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(TRACE_FRAMES)
+
+    def snapshot(self):
+        return tracemalloc.take_snapshot()
+
+    def mark(self):
+        """Remember the memory now, for ``diff`` to compare with; starts tracing if it is off"""
+        self.start_tracing()
+        snapshot = self.snapshot()
+        self.marked = (time.time(), self.report(snapshot), snapshot)
+
+    def diff(self, limit=30):
+        """Return text lines comparing the memory now with the last mark, or None if there is none
+
+        Lists the change of every estimate and canvas count, then the source
+        lines whose allocations grew or shrank the most.
+        """
+        if self.marked is None:
+            return None
+        marked_at, before, old = self.marked
+        snapshot = self.snapshot()
+        after = self.report(snapshot)
+        lines = [f"Memory since the mark {time.time() - marked_at:.0f} s ago", ""]
+        for name, size in after["estimates"].items():
+            lines.append(f"  {name:<8}{_kb(size):>14}  {size - before['estimates'][name]:>+14,} bytes")
+        for name in ("shapes", "undo_steps", "redo_steps", "removed_shapes"):
+            lines.append(f"  {name:<15}{after[name]:>7}  {after[name] - before[name]:>+10}")
+        for name in ("items", "view_items", "gap"):
+            lines.append(f"  canvas {name:<10}{after['canvas'][name]:>6}  "
+                         f"{after['canvas'][name] - before['canvas'][name]:>+10}")
+        lines += ["", "Largest changes by source line:"]
+        stats = [stat for stat in snapshot.compare_to(old, "lineno")
+                 if (stat.size_diff or stat.count_diff) and not _ignored(stat)]
+        lines += [f"  {stat}" for stat in stats[:limit]]
+        return lines
@@ -0,0 +1,112 @@
+"""Registry of parametric shapes drawn as polygons.
+
+Each shape is a unit template, the polygon's vertices computed once, and a
+``fit`` that turns a drag from (x1, y1) to (x2, y2) into an affine transform
+(a, b, c, d, e, f) mapping a template vertex (u, v) to
+(a*u + b*v + e, c*u + d*v + f). Previewing or drawing a shape only fits the
+transform and applies it, no trigonometry per event. ``batch`` fits and
+transforms the vertices of thousands of drags at once.
+
+A new shape needs one ``register`` call, which also gives it a tool button
+in the app. Templates are in window coordinates, y pointing down.
+"""
+import math
+
+import numpy as np
+
+SHAPES = {}  # name -> ParametricShape, in registration order
+
+
+def fit_center(x1, y1, x2, y2):
+    """Center the template (a unit circle's worth) between the points, as wide as their distance"""
+    radius = ((x2 - x1) ** 2 + (y2 - y1) ** 2) ** 0.5 / 2
+    return radius, 0.0, 0.0, radius, (x1 + x2) / 2, (y1 + y2) / 2
+
+
+def fit_box(x1, y1, x2, y2):
+    """Stretch the unit square template over the box the points span"""
+    return x2 - x1, 0.0, 0.0, y2 - y1, x1, y1
+
+
+def fit_triangle(x1, y1, x2, y2):
+    """Isosceles triangle on the base from (x1, y1) to (x2, y2), its apex as far from the first point
+    as the base is long, above it when dragging down and below it when dragging up
+
+    Maps the template (0, 0), (1, 0), (0.5, 1) to the first point, the second
+    point and the apex.
+    """
+    dx, dy = x2 - x1, y2 - y1
+    length = (dx * dx + dy * dy) ** 0.5
+    apex = length * (1 - 2 * (y2 > y1))
+    return dx, 0.0, dy, apex - dy / 2, x1, y1
+
+
+def regular_polygon(sides):
+    """Unit template of a regular polygon, a vertex at the top"""
+    angles = math.pi / 2 - np.arange(sides) * 2 * math.pi / sides
+    return np.column_stack((np.cos(angles), -np.sin(angles)))
+
+
+def star(points=5, inner=0.4):
+    """Unit template of a star; ``inner`` is the inner radius as a fraction of the outer one"""
+    vertices = regular_polygon(2 * points)
+    vertices[1::2] *= inner
+    return vertices
+
+
+def rounded_rect(radius=0.2, segments=4):
+    """Unit square template with its corners rounded by ``radius`` of its size
+
+    Each corner is an arc of ``segments`` steps.
+    """
+    steps = np.arange(segments + 1) * (math.pi / 2) / segments
+    corners = []
+    # Clockwise on screen, from the top-left corner; each arc turns a quarter
+    for start, (cx, cy) in zip((math.pi, 1.5 * math.pi, 0.0, 0.5 * math.pi),
+                               ((radius, radius), (1 - radius, radius), (1 - radius, 1 - radius),
+                                (radius, 1 - radius))):
+        angles = start + steps
+        corners.append(np.column_stack((cx + radius * np.cos(angles), cy + radius * np.sin(angles))))
+    return np.concatenate(corners)
+
+
+class ParametricShape:
+    """A registered shape: its name, tool label, unit template and fit"""
+
+    def __init__(self, name, label, template, fit):
+        self.name = name
+        self.label = label
+        self.template = np.asarray(template, dtype=np.float64).reshape(-1, 2)
+        self.fit = fit
+        self.vertices = [tuple(vertex) for vertex in self.template.tolist()]
+
+    def coords(self, x1, y1, x2, y2):
+        """Return the flat polygon coords of a drag from (x1, y1) to (x2, y2)"""
+        # Plain floats: for one shape NumPy's call overhead outweighs the arithmetic
+        a, b, c, d, e, f = self.fit(x1, y1, x2, y2)
+        coords = []
+        for u, v in self.vertices:
+            coords += (a * u + b * v + e, c * u + d * v + f)
+        return coords
+
+    def batch(self, x1, y1, x2, y2):
+        """Return the coords of many drags, given as arrays, as an (n, 2 * vertices) array"""
+        x1, y1, x2, y2 = (np.asarray(values, dtype=np.float64) for values in (x1, y1, x2, y2))
+        a, b, c, d, e, f = (np.broadcast_to(value, x1.shape)[:, None] for value in self.fit(x1, y1, x2, y2))
+        u, v = self.template[:, 0], self.template[:, 1]
+        coords = np.empty((len(x1), 2 * len(u)))
+        coords[:, 0::2] = a * u + b * v + e
+        coords[:, 1::2] = c * u + d * v + f
+        return coords
+
+
+def register(name, label, template, fit=fit_center):
+    """Add a shape to the registry and return it"""
+    shape = SHAPES[name] = ParametricShape(name, label, template, fit)
+    return shape
+
+
+register("triangle", "Triangle", ((0, 0), (1, 0), (0.5, 1)), fit_triangle)
+register("star", "Star", star(5, 0.4))
+register("hexagon", "Hexagon", regular_polygon(6))
+register("rounded", "Rounded", rounded_rect(0.2), fit_box)
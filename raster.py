@@ -0,0 +1,277 @@
+"""Vectorized scan conversion: DDA and Bresenham lines, midpoint circles and ellipses.
+
+Every algorithm is written in closed form over NumPy index arrays instead
+of stepping pixel by pixel in Python, and works on whole batches of
+primitives at once. The batch functions take one array per parameter and
+return ``(points, offsets)``: an (n, 2) int64 array of pixel coordinates
+and the start of each primitive's pixels in it, like the coords and
+offsets of a ShapeStore. The single primitive functions return just the
+(n, 2) array.
+
+- ``dda_lines``: the DDA of ``on_release``, one pixel per step along the
+  major axis, rounded to the nearest pixel (without the drift of adding
+  the increment up step by step)
+- ``bresenham_lines``: integer Bresenham lines for all octants
+- ``midpoint_circles``: the midpoint circle algorithm, 8-way symmetric
+- ``midpoint_ellipses``: the two-region midpoint ellipse algorithm,
+  4-way symmetric
+
+Circles and ellipses are outlines; symmetric copies of points on the axes
+are not removed, as in the stepping versions of the algorithms.
+"""
+import numpy as np
+
+
+def _ragged(counts):
+    """Return (owner, step) for ``counts[i]`` steps of each primitive i, and the offsets"""
+    counts = np.asarray(counts, dtype=np.int64)
+    offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+    owner = np.repeat(np.arange(len(counts)), counts)
+    step = np.arange(offsets[-1], dtype=np.int64) - np.repeat(offsets[:-1], counts)
+    return owner, step, offsets
+
+
+def _points(xs, ys):
+    return np.stack([xs, ys], axis=1).astype(np.int64)
+
+
+def _as_int(values):
+    return np.rint(np.asarray(values, dtype=np.float64)).astype(np.int64)
+
+
+def dda_lines(x1, y1, x2, y2):
+    """Rasterize lines with the DDA; returns (points, offsets)"""
+    x1, y1, x2, y2 = (np.asarray(a, dtype=np.float64) for a in (x1, y1, x2, y2))
+    dx = x2 - x1
+    dy = y2 - y1
+    steps = np.maximum(np.abs(dx), np.abs(dy))
+    counts = np.floor(steps).astype(np.int64) + 1
+    offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+    # Per-line values are spread over their pixels with repeat, which is
+    # cheaper than gathering them by owner index
+    step = np.arange(offsets[-1], dtype=np.float64)
+    step -= np.repeat(offsets[:-1].astype(np.float64), counts)
+    # A zero-length line is its start point
+    safe = np.repeat(np.where(steps == 0, 1.0, steps), counts)
+    points = np.empty((len(step), 2), dtype=np.int64)
+    value = np.empty(len(step))
+    for axis, (start, delta) in enumerate(((x1, dx), (y1, dy))):
+        np.multiply(step, np.repeat(delta, counts), out=value)
+        value /= safe
+        value += np.repeat(start, counts)
+        points[:, axis] = np.rint(value, out=value)
+    return points, offsets
+
+
+def bresenham_lines(x1, y1, x2, y2):
+    """Rasterize lines with Bresenham's algorithm; endpoints are rounded to pixels"""
+    x1, y1, x2, y2 = (_as_int(a) for a in (x1, y1, x2, y2))
+    dx = np.abs(x2 - x1)
+    dy = np.abs(y2 - y1)
+    sx = np.where(x2 >= x1, 1, -1)
+    sy = np.where(y2 >= y1, 1, -1)
+    major = np.maximum(dx, dy)
+    minor = np.minimum(dx, dy)
+    owner, step, offsets = _ragged(major + 1)
+    # The minor coordinate advances when the error term 2*i*minor - major
+    # passes zero: after i steps it has advanced (2*i*minor + major - 1) // (2*major)
+    # times, with ties going to the lower pixel like the incremental version
+    # (float division is exact enough here and much faster than integer //)
+    numerator = (2 * step * minor[owner] + major[owner] - 1).astype(np.float64)
+    numerator /= np.maximum(2 * major, 1)[owner]
+    moved = np.maximum(np.floor(numerator, out=numerator), 0).astype(np.int64)
+    x_major = dx[owner] >= dy[owner]
+    along = np.where(x_major, step, moved)
+    across = np.where(x_major, moved, step)
+    return _points(x1[owner] + sx[owner] * along, y1[owner] + sy[owner] * across), offsets
+
+
+def _circle_octant(r):
+    """Return (x, y) of the first octant of midpoint circles of integer radii ``r``"""
+    # The loop runs while x < y; y(x) never exceeds x by less than ~r/sqrt(2)
+    count = np.floor(r / np.sqrt(2.0)).astype(np.int64) + 2
+    owner, x, offsets = _ragged(count)
+    radius = r[owner]
+    # Midpoint criterion: y stays while (x, y - 1/2) is inside the circle, so y
+    # is the largest integer with (2y - 1)^2 < 4 (r^2 - x^2)
+    inside = 4 * (radius * radius - x * x)
+    y = np.floor(np.sqrt(np.maximum(inside, 0)) / 2 + 0.5).astype(np.int64)
+    y -= (2 * y - 1) ** 2 >= inside
+    y += (2 * y + 1) ** 2 < inside
+    y = np.where(x == 0, radius, y)
+    previous_x = x - 1
+    previous_y = np.concatenate([[0], y[:-1]])
+    # Each step lowers y by one at most, which matters for the last step past the diagonal
+    y = np.where(x == 0, y, np.maximum(y, previous_y - 1))
+    # Keep the points the stepping loop plots: x = 0, then while the previous x < previous y
+    keep = (x == 0) | (previous_x < previous_y)
+    keep &= (x <= radius)
+    return owner[keep], x[keep], y[keep]
+
+
+def midpoint_circles(cx, cy, r):
+    """Rasterize circle outlines with the midpoint algorithm; returns (points, offsets)"""
+    cx, cy, r = (_as_int(a) for a in (cx, cy, r))
+    r = np.maximum(r, 0)
+    owner, x, y = _circle_octant(r)
+    px = cx[owner]
+    py = cy[owner]
+    xs = np.stack([px + x, px - x, px + x, px - x, px + y, px - y, px + y, px - y], axis=1)
+    ys = np.stack([py + y, py + y, py - y, py - y, py + x, py + x, py - x, py - x], axis=1)
+    counts = np.bincount(owner, minlength=len(r)) * 8
+    offsets = np.zeros(len(r) + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+    return _points(xs.ravel(), ys.ravel()), offsets
+
+
+def _ellipse_quadrant(rx, ry):
+    """Return (owner, x, y) of the first quadrant of midpoint ellipses, in plotting order"""
+    rx2 = rx * rx
+    ry2 = ry * ry
+    # Region 1 steps x; y stays while (x, y - 1/2) is inside:
+    # 4 ry^2 x^2 + rx^2 (2y - 1)^2 < 4 rx^2 ry^2
+    owner, x, offsets = _ragged(rx + 1)
+    a2 = rx2[owner]
+    b2 = ry2[owner]
+    limit = 4 * a2 * b2 - 4 * b2 * x * x
+    safe = np.maximum(a2, 1)
+    y = np.floor(np.sqrt(np.maximum(limit, 0) / safe) / 2 + 0.5).astype(np.int64)
+    y -= (a2 * (2 * y - 1) ** 2 >= limit) & (y > 0)
+    y += a2 * (2 * y + 1) ** 2 < limit
+    y = np.where(x == 0, ry[owner], np.minimum(y, ry[owner]))
+    previous_x = x - 1
+    previous_y = np.concatenate([[0], y[:-1]])
+    y = np.where(x == 0, y, np.maximum(y, previous_y - 1))
+    # Region 1 plots x = 0 and every step taken while ry^2 x < rx^2 y held before it
+    region1 = (x == 0) | (b2 * previous_x < a2 * previous_y)
+    owner1, x1, y1 = owner[region1], x[region1], y[region1]
+
+    # Region 2 steps y down from the last region 1 point; x advances when
+    # (x + 1/2, y) is inside, so x is the largest integer with
+    # ry^2 (2x - 1)^2 + 4 rx^2 y^2 <= 4 rx^2 ry^2, and never less than before
+    last = np.zeros(len(rx), dtype=np.int64)
+    last[owner1] = np.arange(len(owner1))  # index of each ellipse's last region 1 point
+    end_x = x1[last]
+    end_y = y1[last]
+    owner2, step, _ = _ragged(end_y)
+    ys = end_y[owner2] - 1 - step
+    a2 = rx2[owner2]
+    b2 = ry2[owner2]
+    room = 4 * a2 * b2 - 4 * a2 * ys * ys
+    safe = np.maximum(b2, 1)
+    xs = np.floor((np.sqrt(np.maximum(room, 0) / safe) + 1) / 2).astype(np.int64)
+    xs += b2 * (2 * xs + 1) ** 2 <= room
+    xs -= (b2 * (2 * xs - 1) ** 2 > room) & (xs > 0)
+    xs = np.minimum(np.maximum(xs, end_x[owner2]), rx[owner2])
+
+    owner_all = np.concatenate([owner1, owner2])
+    order = np.argsort(owner_all, kind="stable")
+    return owner_all[order], np.concatenate([x1, xs])[order], np.concatenate([y1, ys])[order]
+
+
+def midpoint_ellipses(cx, cy, rx, ry):
+    """Rasterize axis-aligned ellipse outlines with the midpoint algorithm; returns (points, offsets)"""
+    cx, cy, rx, ry = (_as_int(a) for a in (cx, cy, rx, ry))
+    rx = np.maximum(rx, 0)
+    ry = np.maximum(ry, 0)
+    owner, x, y = _ellipse_quadrant(rx, ry)
+    px = cx[owner]
+    py = cy[owner]
+    xs = np.stack([px + x, px - x, px + x, px - x], axis=1)
+    ys = np.stack([py + y, py + y, py - y, py - y], axis=1)
+    counts = np.bincount(owner, minlength=len(rx)) * 4
+    offsets = np.zeros(len(rx) + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+    return _points(xs.ravel(), ys.ravel()), offsets
+
+
+def dda_polylines(coords, offsets, tolerance=1.0):
+    """Return which polylines are the DDA steps of their own endpoints
+
+    ``coords`` is the flat x, y array of all polylines and polyline i owns
+    ``coords[offsets[i]:offsets[i + 1]]``, as in a ShapeStore. A polyline
+    matches if it has one vertex per DDA step and every vertex is within
+    ``tolerance`` of the DDA pixel (the old drawing code added the
+    increment up step by step, which drifts by a pixel at times).
+    """
+    coords = np.asarray(coords, dtype=np.float64)
+    offsets = np.asarray(offsets, dtype=np.int64)
+    starts = offsets[:-1]
+    ends = offsets[1:]
+    vertices = (ends - starts) // 2
+    result = np.zeros(len(vertices), dtype=bool)
+    long = vertices >= 2
+    x1 = coords[starts[long]]
+    y1 = coords[starts[long] + 1]
+    x2 = coords[ends[long] - 2]
+    y2 = coords[ends[long] - 1]
+    steps = np.floor(np.maximum(np.abs(x2 - x1), np.abs(y2 - y1))).astype(np.int64)
+    # Only polylines with the right vertex count need the pixel comparison
+    keep = steps + 1 == vertices[long]
+    candidates = np.flatnonzero(long)[keep]
+    if len(candidates) == 0:
+        return result
+    expected, expected_offsets = dda_lines(x1[keep], y1[keep], x2[keep], y2[keep])
+    counts = 2 * vertices[candidates]
+    _, step, _ = _ragged(counts)
+    stored = coords[np.repeat(starts[candidates], counts) + step]
+    off = np.abs(stored - expected.ravel()) > tolerance
+    bad = np.add.reduceat(off, 2 * expected_offsets[:-1])
+    result[candidates] = bad == 0
+    return result
+
+
+def compact_polylines(coords, offsets):
+    """Drop the vertices of polylines that lie on straight runs; returns (coords, offsets)
+
+    Polylines come and go as in ``dda_polylines``. A vertex is dropped if it
+    repeats the one before it, or if the steps into and out of it are
+    parallel and go the same way, so the drawn lines are unchanged. The
+    first and last vertex of each polyline always stay.
+    """
+    points = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+    counts = np.diff(np.asarray(offsets, dtype=np.int64)) // 2
+    owner, _, starts = _ragged(counts)
+    ends = np.zeros(len(points), dtype=bool)
+    ends[starts[:-1][counts > 0]] = True
+    ends[starts[1:][counts > 0] - 1] = True
+    # Repeats go first, so that only the last step of a polyline can be empty
+    keep = ends.copy()
+    keep[1:] |= (points[1:] != points[:-1]).any(axis=1)
+    points, owner, ends = points[keep], owner[keep], ends[keep]
+    step_in = points[1:-1] - points[:-2]
+    step_out = points[2:] - points[1:-1]
+    cross = step_in[:, 0] * step_out[:, 1] - step_in[:, 1] * step_out[:, 0]
+    dot = step_in[:, 0] * step_out[:, 0] + step_in[:, 1] * step_out[:, 1]
+    keep = ends.copy()
+    keep[1:-1] |= (cross != 0) | (dot < 0)
+    result = np.zeros(len(counts) + 1, dtype=np.int64)
+    np.cumsum(2 * np.bincount(owner[keep], minlength=len(counts)), out=result[1:])
+    return points[keep].ravel(), result
+
+
+def compact_polyline(coords):
+    """Drop the vertices of a polyline that lie on a straight run; the drawn line is unchanged"""
+    return compact_polylines(coords, [0, len(coords)])[0].tolist()
+
+
+def dda_line(x1, y1, x2, y2):
+    """Return the DDA pixels of one line as an (n, 2) array"""
+    return dda_lines([x1], [y1], [x2], [y2])[0]
+
+
+def bresenham_line(x1, y1, x2, y2):
+    """Return the Bresenham pixels of one line as an (n, 2) array"""
+    return bresenham_lines([x1], [y1], [x2], [y2])[0]
+
+
+def midpoint_circle(cx, cy, r):
+    """Return the midpoint pixels of one circle outline as an (n, 2) array"""
+    return midpoint_circles([cx], [cy], [r])[0]
+
+
+def midpoint_ellipse(cx, cy, rx, ry):
+    """Return the midpoint pixels of one ellipse outline as an (n, 2) array"""
+    return midpoint_ellipses([cx], [cy], [rx], [ry])[0]
@@ -0,0 +1,329 @@
+"""A raster alternative to CanvasView: the drawing as one image.
+
+A RasterView keeps the window's pixels in a NumPy framebuffer and shows it
+as a single canvas image instead of one canvas item per shape. Each change
+marks the window rectangle it touches as dirty; once the changes of an event
+are in, only the dirty rectangles are rendered again, with Pillow like
+render.py does, and copied to the image. Redrawing then costs in proportion
+to the area that changed, however many shapes the drawing or the window
+holds. Panning shifts the framebuffer and renders only the strips it
+exposes; zooming and resizing render the whole window.
+
+Shapes are placed on whole pixels of the drawing scaled by the zoom, so a
+shape is rendered to the same pixels wherever the window is panned; they may
+be up to half a pixel from where ``Viewport.to_screen`` puts them.
+"""
+import math
+import tkinter as tk
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageTk
+
+from render import BACKGROUND, TILE_MARGIN, draw_shape, rgb
+from viewport import Viewport
+
+RASTER_TAG = "raster"
+MAX_DIRTY = 64  # dirty rectangles kept apart before they are merged into one
+SELECTED_PIXELS = 2  # extra line width of selected shapes, as CanvasView draws them
+
+
+class PhotoScreen:
+    """Shows the framebuffer as one Tk photo image under the canvas' other items"""
+
+    def __init__(self, canvas):
+        self.canvas = canvas
+        self.photo = None
+        self.item = None
+
+    def resize(self, width, height):
+        self.photo = tk.PhotoImage(master=self.canvas, width=width, height=height)
+        if self.item is None:
+            self.item = self.canvas.create_image(0, 0, image=self.photo, anchor="nw", tags=RASTER_TAG)
+            self.canvas.tag_lower(self.item)
+        else:
+            self.canvas.itemconfig(self.item, image=self.photo)
+
+    def blit(self, pixels, x, y):
+        """Copy an (height, width, 3) array of pixels to window pixel (x, y)"""
+        region = ImageTk.PhotoImage(Image.fromarray(pixels), master=self.canvas)
+        self.photo.tk.call(str(self.photo), "copy", str(region), "-to", x, y)
+
+
+def _area(rect):
+    return (rect[2] - rect[0]) * (rect[3] - rect[1])
+
+
+def merge_rects(rects):
+    """Return rectangles covering ``rects``, merging those whose union costs no more to render than both"""
+    merged = []
+    for rect in rects:
+        i = 0
+        while i < len(merged):
+            other = merged[i]
+            union = (min(rect[0], other[0]), min(rect[1], other[1]), max(rect[2], other[2]), max(rect[3], other[3]))
+            if _area(union) <= _area(rect) + _area(other):
+                # The union may now overlap rectangles already passed: look again
+                rect = union
+                del merged[i]
+                i = 0
+            else:
+                i += 1
+        merged.append(rect)
+    return merged
+
+
+class RasterView:
+    """Keeps a framebuffer in sync with a Scene and shows it on a Tk canvas
+
+    Takes the scene notifications and the selection calls a CanvasView
+    does. ``screen`` shows the framebuffer, a PhotoScreen on ``canvas`` by
+    default. ``rendered`` and ``blitted`` count the pixels rendered and
+    copied to the screen so far.
+    """
+
+    def __init__(self, canvas, viewport=None, screen=None):
+        self.canvas = canvas
+        self.viewport = viewport or Viewport()
+        self.screen = screen or PhotoScreen(canvas)
+        self.layers = []  # the scene's layers, bottom to top
+        self.selected = set()
+        self.offset = (0.0, 0.0)  # drawing units the selection is dragged by
+        self.drag_box = None  # drawing box of the selection, while it is dragged
+        self.frame = None
+        self.dirty = []  # window rectangles (x1, y1, x2, y2) to render again
+        self.flush_after = None  # after_idle() id of the pending flush
+        self.rendered = 0
+        self.blitted = 0
+        self._place()
+
+    def _place(self):
+        """Size the framebuffer for the viewport, and record its zoom and origin"""
+        viewport = self.viewport
+        zoom = viewport.zoom
+        self.zoom = zoom
+        # Window pixel (0, 0) is drawing pixel origin at this zoom
+        self.origin = (round(viewport.x * zoom), round(viewport.y * zoom))
+        size = (viewport.height, viewport.width)
+        if self.frame is None or self.frame.shape[:2] != size:
+            self.frame = np.empty((*size, 3), dtype=np.uint8)
+            self.screen.resize(viewport.width, viewport.height)
+            return True
+        return False
+
+    def item_count(self):
+        """Return the number of canvas items drawing the scene"""
+        return 1
+
+    def _mark(self, x1, y1, x2, y2):
+        """Mark the window pixels showing drawing box (x1, y1, x2, y2) to be rendered again"""
+        zoom = self.zoom
+        ox, oy = self.origin
+        height, width = self.frame.shape[:2]
+        rect = (max(math.floor(x1 * zoom) - ox, 0), max(math.floor(y1 * zoom) - oy, 0),
+                min(math.ceil(x2 * zoom) - ox + 1, width), min(math.ceil(y2 * zoom) - oy + 1, height))
+        if rect[0] >= rect[2] or rect[1] >= rect[3]:
+            return
+        self.dirty.append(rect)
+        if len(self.dirty) > MAX_DIRTY:
+            self.dirty = [(min(r[0] for r in self.dirty), min(r[1] for r in self.dirty),
+                           max(r[2] for r in self.dirty), max(r[3] for r in self.dirty))]
+        if self.flush_after is None:
+            # Render once the event's changes are all in
+            self.flush_after = self.canvas.after_idle(self.flush)
+
+    def _mark_all(self):
+        viewport = self.viewport
+        self._mark(*viewport.visible())
+
+    def _reach(self, width):
+        """Return how many drawing units a shape's pixels may reach past its coords"""
+        return width / 2 + (SELECTED_PIXELS + 1) / self.zoom
+
+    def _mark_shape(self, shape, dx=0.0, dy=0.0, width=None):
+        """Mark where a shape is drawn, or was before it moved by (dx, dy)"""
+        if not shape.layer.visible:
+            return
+        if shape in self.selected:
+            self.drag_box = None
+            dx += self.offset[0]
+            dy += self.offset[1]
+        x1, y1, x2, y2 = shape.bbox()
+        reach = self._reach(shape.width if width is None else width)
+        self._mark(x1 + dx - reach, y1 + dy - reach, x2 + dx + reach, y2 + dy + reach)
+
+    def _render(self, rect):
+        """Render the shapes of the visible layers into a window rectangle of the framebuffer"""
+        x1, y1, x2, y2 = rect
+        zoom = self.zoom
+        ox, oy = self.origin
+        # Drawn with a margin and cropped, as render.TileRenderer does, so
+        # pixels come out the same whichever rectangle renders them
+        left, top = ox + x1 - TILE_MARGIN, oy + y1 - TILE_MARGIN
+        image = Image.new("RGB", (x2 - x1 + 2 * TILE_MARGIN, y2 - y1 + 2 * TILE_MARGIN), rgb(BACKGROUND))
+        draw = ImageDraw.Draw(image)
+        wx1, wy1 = left / zoom, top / zoom
+        wx2, wy2 = (left + image.width) / zoom, (top + image.height) / zoom
+        selected = self.selected
+        dx, dy = self.offset
+        for layer in self.layers:
+            if not layer.visible:
+                continue
+            reach = self._reach(layer.index.max_width)
+            shapes = layer.index.query_rect(wx1 - reach, wy1 - reach, wx2 + reach, wy2 + reach)
+            if selected and (dx or dy):
+                # Dragged shapes are drawn where the drag has taken them
+                shapes = [shape for shape in shapes if shape not in selected]
+                for shape in selected:
+                    if shape.layer is layer:
+                        bx1, by1, bx2, by2 = shape.bbox()
+                        if bx1 + dx - reach <= wx2 and wx1 <= bx2 + dx + reach and \
+                                by1 + dy - reach <= wy2 and wy1 <= by2 + dy + reach:
+                            shapes.append(shape)
+                shapes.sort(key=lambda shape: shape.seq)
+            for shape in shapes:
+                width = shape.width * zoom
+                sx, sy = -left, -top
+                if shape in selected:
+                    width += SELECTED_PIXELS
+                    sx += dx * zoom
+                    sy += dy * zoom
+                # Snap to pixels like render.TileRenderer: the same wherever the rectangle is
+                points = [math.floor(c * zoom + (sx if i % 2 == 0 else sy) + 0.5)
+                          for i, c in enumerate(shape.coords)]
+                draw_shape(draw, shape.kind, points, shape.outline, shape.fill, width)
+        self.frame[y1:y2, x1:x2] = np.asarray(image)[TILE_MARGIN:-TILE_MARGIN, TILE_MARGIN:-TILE_MARGIN]
+        self.rendered += (x2 - x1) * (y2 - y1)
+
+    def _blit(self, rect):
+        x1, y1, x2, y2 = rect
+        self.screen.blit(self.frame[y1:y2, x1:x2], x1, y1)
+        self.blitted += (x2 - x1) * (y2 - y1)
+
+    def flush(self):
+        """Render the dirty rectangles and copy them to the screen"""
+        if self.flush_after is not None:
+            self.canvas.after_cancel(self.flush_after)
+            self.flush_after = None
+        rects = merge_rects(self.dirty)
+        self.dirty = []
+        for rect in rects:
+            self._render(rect)
+            self._blit(rect)
+
+    def _shift(self, dx, dy):
+        """Scroll the framebuffer by (dx, dy) whole pixels and mark the strips it uncovers"""
+        frame = self.frame
+        height, width = frame.shape[:2]
+        if abs(dx) >= width or abs(dy) >= height:
+            self._mark_all()
+            return
+        frame[max(dy, 0):height + min(dy, 0), max(dx, 0):width + min(dx, 0)] = \
+            frame[max(-dy, 0):height + min(-dy, 0), max(-dx, 0):width + min(-dx, 0)]
+        # Pending rectangles move with the pixels they cover
+        self.dirty = [(x1 + dx, y1 + dy, x2 + dx, y2 + dy) for x1, y1, x2, y2 in self.dirty]
+        if dx:
+            self.dirty.append((0, 0, dx, height) if dx > 0 else (width + dx, 0, width, height))
+        if dy:
+            self.dirty.append((0, 0, width, dy) if dy > 0 else (0, height + dy, width, height))
+
+    def refresh(self):
+        """Bring the framebuffer up to date with the viewport after a zoom, pan or resize"""
+        zoom, (ox, oy) = self.zoom, self.origin
+        if self._place() or self.zoom != zoom:
+            self.dirty = []
+            self._mark_all()
+            self.flush()
+            return
+        if (ox, oy) == self.origin:
+            return
+        self._shift(ox - self.origin[0], oy - self.origin[1])
+        height, width = self.frame.shape[:2]
+        for rect in merge_rects(self.dirty):
+            x1, y1, x2, y2 = max(rect[0], 0), max(rect[1], 0), min(rect[2], width), min(rect[3], height)
+            if x1 < x2 and y1 < y2:
+                self._render((x1, y1, x2, y2))
+        self.dirty = []
+        # Every pixel of the window moved
+        self._blit((0, 0, width, height))
+
+    def shape_added(self, shape):
+        self._mark_shape(shape)
+
+    def shape_removed(self, shape):
+        self._mark_shape(shape)
+
+    def shape_restored(self, shape):
+        self._mark_shape(shape)
+
+    def shape_purged(self, shape):
+        pass
+
+    def shape_moved(self, shape, dx, dy):
+        self._mark_shape(shape, -dx, -dy)
+        self._mark_shape(shape)
+
+    def shapes_moved(self, shapes, dx, dy):
+        for shape in shapes:
+            self.shape_moved(shape, dx, dy)
+
+    def shape_restyled(self, shape, style):
+        # The old width is gone: the widest the layer ever had covers it
+        self._mark_shape(shape, width=shape.layer.index.max_width)
+
+    def shape_reshaped(self, shape, kind_changed):
+        # Where the shape was is not known any more
+        self._mark_all()
+
+    def layers_reset(self, layers, active):
+        self.layers = list(layers)
+        self._mark_all()
+
+    def layer_added(self, layer, position):
+        # A new layer is empty: nothing to draw yet
+        self.layers.insert(position, layer)
+
+    def layer_removed(self, layer, position):
+        del self.layers[position]
+        self._mark_all()
+
+    def layer_moved(self, layer, old, position):
+        del self.layers[old]
+        self.layers.insert(position, layer)
+        self._mark_all()
+
+    def layer_changed(self, layer, props):
+        if "visible" in props:
+            self._mark_all()
+
+    def layer_activated(self, layer):
+        pass
+
+    def highlight(self, shape, on):
+        """Draw a shape again after its selection highlight or style changed"""
+        self._mark_shape(shape, width=shape.layer.index.max_width)
+
+    def select(self, shapes, on):
+        """Add shapes to or take them out of the selection, drawn with a thicker outline"""
+        for shape in shapes:
+            self._mark_shape(shape)
+            if on:
+                self.selected.add(shape)
+            else:
+                self.selected.discard(shape)
+                self._mark_shape(shape)
+        self.drag_box = None
+
+    def drag_selection(self, dx, dy):
+        """Draw the selection moved by (dx, dy) more, as a drag preview"""
+        if self.drag_box is None:
+            boxes = [shape.bbox() for shape in self.selected if shape.layer.visible]
+            if not boxes:
+                return
+            reach = self._reach(max(shape.width for shape in self.selected))
+            self.drag_box = (min(box[0] for box in boxes) - reach, min(box[1] for box in boxes) - reach,
+                             max(box[2] for box in boxes) + reach, max(box[3] for box in boxes) + reach)
+        x1, y1, x2, y2 = self.drag_box
+        ox, oy = self.offset
+        self._mark(x1 + ox, y1 + oy, x2 + ox, y2 + oy)
+        ox, oy = self.offset = (ox + dx, oy + dy)
+        self._mark(x1 + ox, y1 + oy, x2 + ox, y2 + oy)
@@ -0,0 +1,304 @@
+"""Offscreen rendering of drawings with Pillow, and PNG and SVG export.
+
+Drawings are rendered from a ShapeStore, which is cheap to hand to other
+processes, in square tiles: each tile only draws the shapes whose bounding
+box reaches into it. Tiles are rendered in parallel on a process pool and
+consumed one row of tiles at a time, so ``export_png`` streams the PNG to
+disk and needs memory for a single row of tiles whatever the image size.
+
+Shapes are drawn with the canvas semantics of the app: a line's color is
+its fill, an empty color draws nothing, and outlines are centered on the
+shape's edge. ``export_svg`` writes the same drawing as vector shapes.
+"""
+import math
+import multiprocessing
+import os
+import struct
+from xml.sax.saxutils import quoteattr
+import zlib
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from PIL import Image, ImageColor, ImageDraw
+
+from saver import snapshot_rows, write_atomic
+from scene import SHAPE_TYPES
+from shapestore import ShapeStore
+
+TILE_SIZE = 1024
+TILE_MARGIN = 32  # pixels drawn around each tile and cropped away
+BACKGROUND = "white"
+ROWS_AHEAD = 2  # tile rows queued on the pool beyond the one being written
+_COLORS = {}  # Tk color -> Pillow RGB, or None
+
+
+def shape_bounds(store):
+    """Return an (n, 4) array of x1, y1, x2, y2 per shape, including half the line width"""
+    if len(store) == 0:
+        return np.zeros((0, 4))
+    coords = np.asarray(store.coords, dtype=np.float64)
+    starts = np.asarray(store.offsets[:-1], dtype=np.int64) // 2
+    xs = coords[0::2]
+    ys = coords[1::2]
+    widths = np.array([style[2] for style in store.style_table], dtype=np.float64)
+    reach = widths[np.asarray(store.styles, dtype=np.int64)] / 2 + 1
+    return np.stack([np.minimum.reduceat(xs, starts) - reach, np.minimum.reduceat(ys, starts) - reach,
+                     np.maximum.reduceat(xs, starts) + reach, np.maximum.reduceat(ys, starts) + reach], axis=1)
+
+
+def drawing_bounds(store):
+    """Return the integer (x1, y1, x2, y2) box holding the whole drawing, or None if it is empty"""
+    if len(store) == 0:
+        return None
+    bounds = shape_bounds(store)
+    return (math.floor(bounds[:, 0].min()), math.floor(bounds[:, 1].min()),
+            math.ceil(bounds[:, 2].max()), math.ceil(bounds[:, 3].max()))
+
+
+def cover(box, other):
+    """Return the smallest box holding two boxes, either of which may be None"""
+    if box is None or other is None:
+        return box or other
+    return (min(box[0], other[0]), min(box[1], other[1]), max(box[2], other[2]), max(box[3], other[3]))
+
+
+def rgb(value):
+    """Return the (r, g, b) of a Tk color, or None for one that draws nothing"""
+    # Tk and Pillow share the #rrggbb and most named colors; anything else draws nothing
+    if value not in _COLORS:
+        try:
+            _COLORS[value] = ImageColor.getrgb(value) if value else None
+        except ValueError:
+            _COLORS[value] = None
+    return _COLORS[value]
+
+
+def draw_shape(draw, kind, coords, outline, fill, width):
+    """Draw one shape on a Pillow ImageDraw like the Tk canvas does; coords are whole pixels"""
+    outline = rgb(outline)
+    fill = rgb(fill)
+    width = max(1, round(width))
+    if kind == "line":
+        if fill is not None:
+            draw.line(coords, fill=fill, width=width, joint="curve" if len(coords) > 4 else None)
+        return
+    if kind == "polygon":
+        if len(coords) >= 6:
+            draw.polygon(coords, fill=fill, outline=outline, width=width)
+        return
+    x1, x2 = sorted(coords[0::2])
+    y1, y2 = sorted(coords[1::2])
+    if outline is not None:
+        # Tk centers the outline on the edge; Pillow draws it inside the box
+        half = width // 2
+        x1, y1, x2, y2 = x1 - half, y1 - half, x2 + half, y2 + half
+    else:
+        width = 0
+    box = (x1, y1, max(x1, x2), max(y1, y2))
+    if kind == "rectangle":
+        draw.rectangle(box, fill=fill, outline=outline, width=width)
+    else:
+        draw.ellipse(box, fill=fill, outline=outline, width=width)
+
+
+class TileRenderer:
+    """Renders any box of a drawing to a Pillow image
+
+    ``mode`` is the Pillow image mode; an RGBA renderer with a transparent
+    ``background`` leaves the pixels no shape covers transparent.
+    """
+
+    def __init__(self, store, background=BACKGROUND, mode="RGB"):
+        self.store = store
+        self.background = background
+        self.mode = mode
+        self.bounds = shape_bounds(store)
+
+    def render(self, box):
+        # Pillow draws shapes cut by the image edge a little differently near
+        # the edge, so tiles are drawn with a margin and cropped: tiled output
+        # then matches drawing the whole image at once
+        box = box[0] - TILE_MARGIN, box[1] - TILE_MARGIN, box[2] + TILE_MARGIN, box[3] + TILE_MARGIN
+        x1, y1, x2, y2 = box
+        image = Image.new(self.mode, (x2 - x1, y2 - y1), self.background)
+        draw = ImageDraw.Draw(image)
+        bounds = self.bounds
+        hits = np.flatnonzero((bounds[:, 0] <= x2) & (bounds[:, 2] >= x1) &
+                              (bounds[:, 1] <= y2) & (bounds[:, 3] >= y1))
+        store = self.store
+        kinds = store.kinds[hits].tolist()
+        styles = store.styles[hits].tolist()
+        starts = store.offsets[hits].tolist()
+        ends = store.offsets[hits + 1].tolist()
+        coords = store.coords
+        table = store.style_table
+        offset = np.array([x1, y1], dtype=np.float64)
+        for kind, style, start, end in zip(kinds, styles, starts, ends):
+            # Shift into tile coordinates and snap to pixels like Tk; floor(x + 0.5)
+            # rounds the same wherever the tile starts. Shapes are drawn bottom to top
+            points = np.floor(coords[start:end].reshape(-1, 2) - offset + 0.5).astype(np.int64).ravel().tolist()
+            outline, fill, width = table[style]
+            draw_shape(draw, SHAPE_TYPES[kind], points, outline, fill, width)
+        return image.crop((TILE_MARGIN, TILE_MARGIN, image.width - TILE_MARGIN, image.height - TILE_MARGIN))
+
+
+def tile_rows(box, tile_size=TILE_SIZE):
+    """Split a box into rows of tile boxes"""
+    x1, y1, x2, y2 = box
+    return [[(x, y, min(x + tile_size, x2), min(y + tile_size, y2)) for x in range(x1, x2, tile_size)]
+            for y in range(y1, y2, tile_size)]
+
+
+_renderer = None  # the TileRenderer of a pool worker
+
+
+def _init_worker(store, background):
+    global _renderer
+    _renderer = TileRenderer(store, background)
+
+
+def _render_tile(box):
+    return _renderer.render(box).tobytes()
+
+
+def render_bands(store, box, tile_size=TILE_SIZE, workers=None, background=BACKGROUND):
+    """Yield the box as horizontal bands of one tile row each, top to bottom
+
+    With more than one worker the tiles are rendered on a process pool,
+    a few rows ahead of the band being consumed.
+    """
+    rows = tile_rows(box, tile_size)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = min(workers, sum(map(len, rows)))
+
+    def band(row, tiles):
+        # Tiles are pasted as they come so only one is held besides the band
+        x1, y1, x2, y2 = row[0][0], row[0][1], row[-1][2], row[-1][3]
+        image = Image.new("RGB", (x2 - x1, y2 - y1))
+        for (tx1, ty1, tx2, ty2), tile in zip(row, tiles):
+            if isinstance(tile, bytes):
+                tile = Image.frombytes("RGB", (tx2 - tx1, ty2 - ty1), tile)
+            image.paste(tile, (tx1 - x1, 0))
+        return image
+
+    if workers <= 1:
+        renderer = TileRenderer(store, background)
+        for row in rows:
+            yield band(row, map(renderer.render, row))
+        return
+
+    # Spawned workers do not inherit the Tk app or its threads
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(workers, mp_context=context, initializer=_init_worker,
+                             initargs=(store, background)) as pool:
+        queued = deque()
+        remaining = iter(rows)
+
+        def submit():
+            row = next(remaining, None)
+            if row is not None:
+                queued.append((row, [pool.submit(_render_tile, tile) for tile in row]))
+
+        for _ in range(ROWS_AHEAD + 1):
+            submit()
+        while queued:
+            row, futures = queued.popleft()
+            submit()
+            yield band(row, (future.result() for future in futures))
+
+
+def render_image(store, box=None, tile_size=TILE_SIZE, workers=None, background=BACKGROUND):
+    """Render a box of the drawing (by default all of it) to one Pillow image"""
+    box = box or drawing_bounds(store) or (0, 0, 1, 1)
+    image = Image.new("RGB", (box[2] - box[0], box[3] - box[1]), background)
+    top = 0
+    for band in render_bands(store, box, tile_size, workers, background):
+        image.paste(band, (0, top))
+        top += band.height
+    return image
+
+
+def _png_chunk(kind, data):
+    return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+
+def write_png(f, size, bands):
+    """Write RGB bands (top to bottom) as a PNG, compressing each band as it comes"""
+    width, height = size
+    f.write(b"\x89PNG\r\n\x1a\n")
+    f.write(_png_chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)))
+    compressor = zlib.compressobj(6)
+    stride = width * 3
+    for band in bands:
+        pixels = memoryview(band.tobytes())
+        del band
+        for top in range(0, len(pixels), stride):
+            # Every scanline starts with its filter type: 0, none
+            data = compressor.compress(b"\0") + compressor.compress(pixels[top:top + stride])
+            if data:
+                f.write(_png_chunk(b"IDAT", data))
+        # Free this band before the next one is rendered
+        del pixels
+    f.write(_png_chunk(b"IDAT", compressor.flush()))
+    f.write(_png_chunk(b"IEND", b""))
+
+
+def export_png(path, store, box=None, tile_size=TILE_SIZE, workers=None, background=BACKGROUND):
+    """Render a box of the drawing (by default all of it) to a PNG file, one tile row in memory at a time"""
+    box = box or drawing_bounds(store) or (0, 0, 1, 1)
+    size = (box[2] - box[0], box[3] - box[1])
+    bands = render_bands(store, box, tile_size, workers, background)
+    write_atomic(path, lambda f: write_png(f, size, bands), binary=True)
+
+
+def export_snapshot(path, snapshot, canvas_box=None, workers=None):
+    """Export the visible layers of a ``Scene.snapshot`` as PNG, covering the drawing and ``canvas_box``"""
+    store = ShapeStore.from_rows(snapshot_rows(snapshot, hidden=False))
+    export_png(path, store, cover(drawing_bounds(store), canvas_box), workers=workers)
+
+
+def _svg_paint(value):
+    return quoteattr(value) if rgb(value) is not None else '"none"'
+
+
+def svg_shape(kind, coords, outline, fill, width):
+    """Return the SVG element of one shape, drawn like the Tk canvas does"""
+    points = " ".join(f"{x:g},{y:g}" for x, y in zip(coords[0::2], coords[1::2]))
+    if kind == "line":
+        if rgb(fill) is None:
+            return ""
+        # Tk joins the segments of a line with round corners and butt ends
+        return (f'<polyline points="{points}" fill="none" stroke={_svg_paint(fill)} '
+                f'stroke-width="{width:g}" stroke-linejoin="round"/>')
+    paint = f'fill={_svg_paint(fill)} stroke={_svg_paint(outline)} stroke-width="{width:g}"'
+    if kind == "polygon":
+        return f'<polygon points="{points}" {paint}/>' if len(coords) >= 6 else ""
+    x1, x2 = sorted(coords[0::2])
+    y1, y2 = sorted(coords[1::2])
+    if kind == "rectangle":
+        return f'<rect x="{x1:g}" y="{y1:g}" width="{x2 - x1:g}" height="{y2 - y1:g}" {paint}/>'
+    return (f'<ellipse cx="{(x1 + x2) / 2:g}" cy="{(y1 + y2) / 2:g}" rx="{(x2 - x1) / 2:g}" '
+            f'ry="{(y2 - y1) / 2:g}" {paint}/>')
+
+
+def write_svg(f, store, box, background=BACKGROUND):
+    """Write the shapes of a store as an SVG document showing ``box``"""
+    x1, y1, x2, y2 = box
+    f.write(f'<svg xmlns="http://www.w3.org/2000/svg" width="{x2 - x1}" height="{y2 - y1}" '
+            f'viewBox="{x1} {y1} {x2 - x1} {y2 - y1}">\n')
+    f.write(f'<rect x="{x1}" y="{y1}" width="{x2 - x1}" height="{y2 - y1}" fill={_svg_paint(background)}/>\n')
+    table = store.style_table
+    offsets = store.offsets.tolist()
+    for i, (kind, style) in enumerate(zip(store.kinds.tolist(), store.styles.tolist())):
+        element = svg_shape(SHAPE_TYPES[kind], store.coords[offsets[i]:offsets[i + 1]].tolist(), *table[style])
+        if element:
+            f.write(element + "\n")
+    f.write("</svg>\n")
+
+
+def export_svg(path, store, box=None, background=BACKGROUND):
+    """Write a box of the drawing (by default all of it) to an SVG file"""
+    box = box or drawing_bounds(store) or (0, 0, 1, 1)
+    write_atomic(path, lambda f: write_svg(f, store, box, background))
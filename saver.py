@@ -0,0 +1,148 @@
+"""Background, atomic saving of drawings.
+
+Saving takes an immutable snapshot of the scene on the Tk main thread (one
+tuple per shape field, see ``Scene.snapshot``) and leaves encoding and
+writing to a worker thread, so editing can go on while the file is written.
+The file is written to a temporary file in the same directory and renamed
+over the target only once it is complete, so a crash or a full disk never
+leaves a half-written drawing behind.
+"""
+import json
+import os
+import tempfile
+import threading
+from itertools import islice
+
+import numpy as np
+
+import binformat
+from instrument import instrumented
+from scene import Layer, Shape
+from shapestore import ShapeStore
+
+CHUNK_SHAPES = 1000   # JSON is encoded this many shapes at a time
+POLL_MS = 50          # how often the main thread checks on the worker
+
+
+def write_atomic(path, write, binary=False):
+    """Call ``write(f)`` on a temporary file, then move it over ``path``"""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix="." + os.path.basename(path) + ".",
+                                     suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb" if binary else "w") as f:
+            # mkstemp files are private; keep the permissions of the file being replaced
+            try:
+                os.chmod(temp_path, os.stat(path).st_mode & 0o777)
+            except FileNotFoundError:
+                os.chmod(temp_path, 0o644)
+            write(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+
+
+def dump_records(rows, f, layers):
+    """Write (kind, coords, outline, fill, width) rows as the File > Save JSON list
+
+    ``layers`` lists the (name, visible, locked, shape count) of the layers
+    the rows belong to, in order; each layer's record precedes its shapes.
+    """
+    # Encoding in chunks keeps the C encoder fast while letting the UI
+    # thread run between chunks (one json.dump call would hold the GIL)
+    f.write("[")
+    separator = ""
+    for name, visible, locked, count in layers:
+        f.write(separator + json.dumps(Layer(name, visible, locked).to_dict(), separators=(",", ":")))
+        separator = ","
+        while count:
+            records = [Shape(*row).to_dict() for row in islice(rows, min(count, CHUNK_SHAPES))]
+            count -= len(records)
+            f.write(separator + json.dumps(records, separators=(",", ":"))[1:-1])
+    f.write("]")
+
+
+def _order(snapshot):
+    """Return the snapshot's shape positions sorted layer by layer, bottom to top"""
+    # Sorting a list would hold the GIL (and freeze the UI) for the whole
+    # sort; NumPy sorts the seqs without it
+    seqs, layers = snapshot[0], snapshot[6]
+    return np.lexsort((np.fromiter(seqs, np.int64, len(seqs)), np.fromiter(layers, np.int64, len(layers))))
+
+
+def snapshot_rows(snapshot, hidden=True):
+    """Return a generator of the (kind, coords, outline, fill, width) rows of a ``Scene.snapshot``, bottom to top
+
+    With ``hidden`` False the shapes of hidden layers are left out.
+    """
+    seqs, kinds, coords, outlines, fills, widths, layers, layer_table = snapshot
+    order = _order(snapshot)
+    if not hidden:
+        shown = np.array([visible for name, visible, locked in layer_table], bool)
+        order = order[shown[np.asarray(layers, np.int64)[order]]] if len(order) else order
+    # Rows are generated one at a time: a list of them all would keep the
+    # collector rescanning it while the UI waits for the GIL
+    return ((kinds[i], coords[i], outlines[i], fills[i], widths[i]) for i in order.tolist())
+
+
+def snapshot_layers(snapshot):
+    """Return the (name, visible, locked, shape count) of the layers of a ``Scene.snapshot``, bottom to top"""
+    layers, layer_table = snapshot[6], snapshot[7]
+    counts = np.bincount(np.fromiter(layers, np.int64, len(layers)), minlength=len(layer_table)).tolist()
+    return [(*layer, count) for layer, count in zip(layer_table, counts)]
+
+
+def save_snapshot(path, snapshot):
+    """Write a ``Scene.snapshot`` to ``path``, as .cgd or JSON depending on the extension"""
+    rows = snapshot_rows(snapshot)
+    layers = snapshot_layers(snapshot)
+    if path.lower().endswith(binformat.EXTENSION):
+        # float64, so that coords float32 cannot hold are written exactly (see binformat.py)
+        store = ShapeStore.from_rows(rows, np.float64)
+        write_atomic(path, lambda f: binformat.dump_drawing(store, f, layers), binary=True)
+    else:
+        write_atomic(path, lambda f: dump_records(rows, f, layers))
+
+
+class DrawingSaver:
+    """Writes a scene snapshot on a worker thread
+
+    ``on_done(saver, error)`` is called on the Tk main thread once the file
+    is in place (``error`` None) or the save failed. ``save(path, snapshot)``
+    does the writing; other writers of snapshots, like PNG export, can be
+    passed in its place. ``probe`` times the writing (see instrument.py).
+    """
+    probe = None
+
+    def __init__(self, root, path, snapshot, on_done, save=save_snapshot):
+        self.root = root
+        self.path = path
+        self.snapshot = snapshot
+        self.on_done = on_done
+        self.save = save
+        self.error = None
+        self.thread = threading.Thread(target=self._write, daemon=True)
+
+    def start(self):
+        self.thread.start()
+        self.root.after(POLL_MS, self._poll)
+
+    @instrumented("write file")
+    def _write(self):
+        try:
+            self.save(self.path, self.snapshot)
+        except Exception as e:
+            self.error = e
+
+    def _poll(self):
+        # Tk may only be used from the main thread, so check on the worker from here
+        if self.thread.is_alive():
+            self.root.after(POLL_MS, self._poll)
+        else:
+            self.on_done(self, self.error)
@@ -0,0 +1,721 @@
+"""In-memory document model for the drawing application.
+
+The Scene is the authoritative copy of the drawing: shape types, coordinates
+and styles live in typed Python objects, so saving, undo and queries never
+have to read them back from Tk. A view (normally a CanvasView) is notified of
+every change and keeps the Tk canvas in sync; without a view the scene runs
+headless. A journal (see journal.py) can be attached the same way to record
+every change for crash recovery. The scene also keeps a spatial index
+(``index``, see spatial.py) of its shapes for hit-testing and region queries.
+
+The live model keeps one Shape object per shape, since the index, the view,
+the history and the journal all follow shapes by identity; whole drawings
+are handed around as ShapeStores (see shapestore.py). Like a store's style
+table, shapes share one object per distinct color and width, so a drawing
+read from JSON does not keep a copy of its style strings per shape.
+
+Shapes are in drawing coordinates. A CanvasView shows them through a
+Viewport (see viewport.py) and only keeps canvas items for the shapes the
+viewport shows, however large the drawing.
+
+Shapes belong to layers (``Scene.layers``, bottom to top), which can be
+hidden and locked. New shapes go to the active layer, and hit-testing
+(``Scene.index``) only sees the active layer's shapes. A CanvasView keeps
+items only for the active layer and shows the other layers as flattened
+images (see layercache.py), so editing costs what the active layer holds.
+"""
+import math
+from bisect import bisect_right
+from operator import attrgetter
+
+from spatial import GridIndex, LodIndex
+from viewport import Viewport
+
+SHAPE_TYPES = ("line", "rectangle", "oval", "polygon")
+DEFAULT_LAYER = "Layer 1"
+_COLORS = {}  # every outline and fill color in use -> the one object shapes share
+_WIDTHS = {}
+
+
+def style_value(key, value):
+    """Return the shared object for an outline, fill or width value"""
+    if key == "width":
+        value = float(value)
+        return _WIDTHS.setdefault(value, value)
+    return _COLORS.setdefault(value, value)
+
+
+class Shape:
+    """One drawn shape with typed coords and style
+
+    ``kind`` is the canvas item type, ``coords`` a tuple of floats and
+    ``width`` a float. As on the canvas, a line's color is its ``fill`` and
+    its ``outline`` is empty. ``seq`` orders the shapes of a layer from
+    bottom to top, ``layer`` is the Layer the shape is drawn on and ``item``
+    is the canvas item id while a view shows the shape.
+    """
+    __slots__ = ("kind", "coords", "outline", "fill", "width", "seq", "layer", "item")
+
+    def __init__(self, kind, coords, outline="", fill="", width=1.0):
+        if kind not in SHAPE_TYPES:
+            raise ValueError(f"Unsupported shape type: {kind}")
+        self.kind = kind
+        self.coords = tuple(map(float, coords))
+        self.outline = _COLORS.setdefault(outline, outline)
+        self.fill = _COLORS.setdefault(fill, fill)
+        width = float(width)
+        self.width = _WIDTHS.setdefault(width, width)
+        self.seq = 0
+        self.layer = None
+        self.item = None
+
+    def style(self):
+        """Return the style as canvas item options"""
+        if self.kind == "line":
+            return {"fill": self.fill, "width": self.width}
+        return {"outline": self.outline, "fill": self.fill, "width": self.width}
+
+    def to_dict(self):
+        """Return the record written by File > Save"""
+        return {"type": self.kind, "coords": list(self.coords), "options": self.style()}
+
+    @classmethod
+    def from_dict(cls, data):
+        """Build a shape from a File > Save record"""
+        options = data["options"]
+        return cls(data["type"], data["coords"], outline=options.get("outline", ""),
+                   fill=options.get("fill", ""), width=options.get("width", 1.0))
+
+    def bbox(self):
+        """Return (x1, y1, x2, y2) bounding the shape's coords"""
+        xs = self.coords[0::2]
+        ys = self.coords[1::2]
+        return min(xs), min(ys), max(xs), max(ys)
+
+
+class Layer:
+    """A named set of shapes, drawn above the layers below it
+
+    ``shapes`` holds the layer's shapes that are in the drawing and
+    ``index`` a spatial index of them. A hidden layer is not drawn and a
+    locked one cannot be edited. In a File > Save list a layer is a record
+    of its own, followed by its shapes.
+    """
+    __slots__ = ("name", "visible", "locked", "shapes", "index")
+
+    def __init__(self, name=DEFAULT_LAYER, visible=True, locked=False):
+        self.name = name
+        self.visible = visible
+        self.locked = locked
+        self.shapes = set()
+        self.index = GridIndex()
+
+    def props(self):
+        return {"name": self.name, "visible": self.visible, "locked": self.locked}
+
+    def editable(self):
+        return self.visible and not self.locked
+
+    def to_dict(self):
+        """Return the record written by File > Save"""
+        return {"layer": self.name, "visible": self.visible, "locked": self.locked}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["layer"], visible=data.get("visible", True), locked=data.get("locked", False))
+
+
+def is_layer_record(record):
+    """Return True if a File > Save record starts a layer rather than being a shape"""
+    return "layer" in record
+
+
+class Scene:
+    """The shapes that make up the drawing, on one or more layers
+
+    Removing a shape only takes it out of ``shapes``; the shape object stays
+    alive so undo can restore it in place. ``purge``
+    tells the view a removed shape is gone for good. ``active`` is the
+    layer new shapes are added to.
+    """
+
+    def __init__(self, view=None):
+        self.shapes = set()
+        self.layers = [Layer()]
+        self.active = self.layers[0]
+        self.journal = None
+        self.next_seq = 0
+        self.view = view
+
+    @property
+    def view(self):
+        return self._view
+
+    @view.setter
+    def view(self, view):
+        # A view attached late still has to know the layers
+        self._view = view
+        if view is not None:
+            view.layers_reset(self.layers, self.active)
+
+    @property
+    def index(self):
+        """Spatial index of the active layer, which is the one edited"""
+        return self.active.index
+
+    def __len__(self):
+        return len(self.shapes)
+
+    def __contains__(self, shape):
+        return shape in self.shapes
+
+    def ordered(self):
+        """Return the shapes from bottom to top, layer by layer"""
+        return [shape for layer in self.layers for shape in sorted(layer.shapes, key=attrgetter("seq"))]
+
+    def _notify(self, event, *args):
+        """Tell the view and the journal about a change"""
+        if self.view is not None:
+            getattr(self.view, event)(*args)
+        if self.journal is not None:
+            getattr(self.journal, event)(*args)
+
+    def add(self, shape):
+        """Add a new shape on top of its layer, by default the active one"""
+        if shape.layer is None:
+            shape.layer = self.active
+        shape.seq = self.next_seq
+        self.next_seq += 1
+        self.shapes.add(shape)
+        shape.layer.shapes.add(shape)
+        shape.layer.index.insert(shape)
+        self._notify("shape_added", shape)
+
+    def remove(self, shape):
+        self.shapes.discard(shape)
+        shape.layer.shapes.discard(shape)
+        shape.layer.index.remove(shape)
+        self._notify("shape_removed", shape)
+
+    def restore(self, shape):
+        """Put a removed shape back at its original stacking position"""
+        self.shapes.add(shape)
+        shape.layer.shapes.add(shape)
+        shape.layer.index.insert(shape)
+        self._notify("shape_restored", shape)
+
+    def purge(self, shape):
+        """Forget a removed shape that can no longer be restored"""
+        self._notify("shape_purged", shape)
+
+    def move(self, shape, dx, dy):
+        coords = shape.coords
+        shape.coords = tuple(c + (dx if i % 2 == 0 else dy) for i, c in enumerate(coords))
+        shape.layer.index.update(shape)
+        self._notify("shape_moved", shape, dx, dy)
+
+    def move_group(self, shapes, dx, dy):
+        """Move several shapes by the same (dx, dy), as one change"""
+        for shape in shapes:
+            shape.coords = tuple(c + (dx if i % 2 == 0 else dy) for i, c in enumerate(shape.coords))
+            shape.layer.index.update(shape)
+        self._notify("shapes_moved", shapes, dx, dy)
+
+    def restyle(self, shape, **style):
+        """Change any of outline, fill and width"""
+        for key, value in style.items():
+            setattr(shape, key, style_value(key, value))
+        if "width" in style:
+            shape.layer.index.update(shape)
+        self._notify("shape_restyled", shape, style)
+
+    def reshape(self, shape, kind, coords):
+        """Change the type and coords of a shape, keeping its stacking position"""
+        kind_changed = kind != shape.kind
+        shape.kind = kind
+        shape.coords = tuple(coords)
+        shape.layer.index.update(shape)
+        self._notify("shape_reshaped", shape, kind_changed)
+
+    def add_layer(self, layer, position):
+        """Insert an empty layer at ``position`` in ``layers``"""
+        self.layers.insert(position, layer)
+        self._notify("layer_added", layer, position)
+
+    def remove_layer(self, layer):
+        """Take a layer, whose shapes have all been removed, out of the drawing"""
+        if len(self.layers) == 1:
+            raise ValueError("A drawing needs at least one layer")
+        position = self.layers.index(layer)
+        if layer is self.active:
+            self.activate(self.layers[position - 1 if position else 1])
+        del self.layers[position]
+        self._notify("layer_removed", layer, position)
+
+    def move_layer(self, layer, position):
+        """Restack a layer to ``position`` in ``layers``"""
+        old = self.layers.index(layer)
+        del self.layers[old]
+        self.layers.insert(position, layer)
+        self._notify("layer_moved", layer, old, position)
+
+    def change_layer(self, layer, **props):
+        """Change any of name, visible and locked"""
+        for key, value in props.items():
+            setattr(layer, key, value)
+        self._notify("layer_changed", layer, props)
+
+    def activate(self, layer):
+        """Make ``layer`` the one that is edited"""
+        self.active = layer
+        self._notify("layer_activated", layer)
+
+    def snapshot(self):
+        """Return the drawing as immutable columns
+
+        Returns (seqs, kinds, coords, outlines, fills, widths, layers,
+        layer_table): one tuple per shape field in the same (arbitrary)
+        shape order, where ``layers`` holds each shape's position in
+        ``layer_table``, the (name, visible, locked) of every layer from
+        bottom to top. The fields are immutable, so the snapshot stays valid
+        while editing goes on, and it is cheap: no per-shape objects are
+        created.
+        """
+        shapes = list(self.shapes)
+        positions = {layer: i for i, layer in enumerate(self.layers)}
+        columns = tuple(tuple(map(attrgetter(name), shapes))
+                        for name in ("seq", "kind", "coords", "outline", "fill", "width"))
+        return columns + (tuple(positions[shape.layer] for shape in shapes),
+                          tuple((layer.name, layer.visible, layer.locked) for layer in self.layers))
+
+    def to_data(self):
+        """Return the drawing as File > Save records, bottom to top"""
+        records = []
+        for layer in self.layers:
+            records.append(layer.to_dict())
+            records.extend(shape.to_dict() for shape in sorted(layer.shapes, key=attrgetter("seq")))
+        return records
+
+
+SELECTED_TAG = "selected"
+VIEW_TAG = "view"  # every item a CanvasView draws for the scene
+PROXY_TAG = "proxy"
+LOD_PIXELS = 8  # shapes smaller than this on screen are drawn as proxies
+VIEW_MARGIN = 32  # pixels around the window whose shapes are kept as items too
+PROXY_COLOR = "#a0a0a0"
+IMAGE_TAG = "layers"  # the images showing the layers that have no items
+IMAGE_MARGIN = 200  # pixels around the window the layer images cover
+IMAGE_DELAY_MS = 100  # quiet time before the layer images are rendered again
+
+
+class CanvasView:
+    """Keeps a Tk canvas in sync with a Scene, through a zoomable viewport
+
+    Only shapes the viewport shows (plus a margin) have canvas items, so the
+    item count is bounded by what is on screen rather than by the drawing.
+    Shapes smaller than ``LOD_PIXELS`` on screen get no item of their own:
+    the small screen cells holding any of them are filled in gray instead,
+    one proxy item per run of such cells in a row. ``refresh`` brings the items up to date after the viewport
+    moves; scene changes update them as they happen. Selected shapes share
+    the ``SELECTED_TAG`` tag, so the whole selection can be moved with a
+    single canvas call.
+
+    Only the live layer, the active one unless it is hidden or locked, has
+    items. ``cache`` (a layercache.LayerCache) flattens the visible layers
+    below it into one image under the items and those above it into one
+    image over them; the images are rendered again, once edits pause for
+    ``IMAGE_DELAY_MS``, only when one of their layers changed or the
+    viewport zoomed or moved past their margin. Without a cache only the
+    live layer is drawn.
+    """
+
+    def __init__(self, canvas, viewport=None, cache=None):
+        self.canvas = canvas
+        self.viewport = viewport or Viewport()
+        self.cache = cache
+        self.lod = LodIndex()
+        self.shapes = {}  # canvas item id -> Shape, for the shapes shown
+        self.stack = []  # seqs of the shapes shown, bottom to top
+        self.by_seq = {}  # seq -> shape shown
+        self.proxies = {}  # row of LodIndex cells -> (columns holding small shapes, proxy items)
+        self.selected = set()
+        self.layers = []  # the scene's layers, bottom to top
+        self.active = None
+        self.live = None  # the layer whose shapes have items
+        self.images = {}  # "below" or "above" -> (canvas item, image) of the flattened layers
+        self.image_box = None  # drawing box the images cover
+        self.image_after = None  # after() id of the pending image update
+        self._place()
+
+    def _place(self):
+        """Record the viewport the items are drawn for"""
+        viewport = self.viewport
+        self.drawn = (viewport.zoom, viewport.x, viewport.y)
+        margin = VIEW_MARGIN / viewport.zoom
+        x1, y1, x2, y2 = viewport.visible()
+        self.box = (x1 - margin, y1 - margin, x2 + margin, y2 + margin)
+        self.level = self.lod.level_for(LOD_PIXELS / viewport.zoom)
+
+    def shape_at(self, item):
+        """Return the shape drawn by a canvas item, or None"""
+        return self.shapes.get(item)
+
+    def item_count(self):
+        """Return the number of canvas items drawing the scene"""
+        return len(self.shapes) + sum(len(items) for columns, items in self.proxies.values()) + len(self.images)
+
+    def _shown(self, shape):
+        """Return True if the viewport shows the shape in full"""
+        entry = self.lod.entries.get(shape)
+        if entry is None or entry[0] < self.level:
+            return False
+        bx1, by1, bx2, by2 = entry[1]
+        x1, y1, x2, y2 = self.box
+        return bx1 <= x2 and x1 <= bx2 and by1 <= y2 and y1 <= by2
+
+    def _style(self, shape):
+        style = shape.style()
+        # Line widths zoom with the drawing
+        style["width"] = shape.width * self.viewport.zoom + (2 if shape in self.selected else 0)
+        return style
+
+    def _create(self, shape):
+        create = getattr(self.canvas, "create_" + shape.kind)
+        tags = (VIEW_TAG, SELECTED_TAG) if shape in self.selected else VIEW_TAG
+        item = create(self.viewport.to_screen(shape.coords), tags=tags, **self._style(shape))
+        shape.item = item
+        self.shapes[item] = shape
+        # Items are created on top: slip it under the next shape up, if any is shown
+        position = bisect_right(self.stack, shape.seq)
+        if position < len(self.stack):
+            self.canvas.tag_lower(item, self.by_seq[self.stack[position]].item)
+        elif "above" in self.images:
+            self.canvas.tag_lower(item, self.images["above"][0])
+        self.stack.insert(position, shape.seq)
+        self.by_seq[shape.seq] = shape
+        return item
+
+    def _delete(self, shape):
+        self.canvas.delete(shape.item)
+        del self.shapes[shape.item]
+        self.stack.pop(bisect_right(self.stack, shape.seq) - 1)
+        del self.by_seq[shape.seq]
+        shape.item = None
+
+    def _sync(self, shape, move=None):
+        """Create, delete or update the item of a shape that changed
+
+        ``move`` is the (dx, dy) window pixels to move an existing item by
+        instead of setting its coords, (0, 0) if it is in place already.
+        """
+        shown = self._shown(shape)
+        if shape.item is None:
+            if shown:
+                self._create(shape)
+        elif not shown:
+            self._delete(shape)
+        elif move is None:
+            self.canvas.coords(shape.item, self.viewport.to_screen(shape.coords))
+        elif move != (0, 0):
+            self.canvas.move(shape.item, *move)
+
+    def _file(self, shape):
+        """Add a shape to the level of detail index, and update the proxies if it needs one"""
+        self.lod.insert(shape)
+        key = self.lod.cell_of(shape, self.level)
+        if key is not None and self.lod.counts[self.level][key] == 1:
+            self._update_proxy_row(key[1])
+
+    def _unfile(self, shape):
+        key = self.lod.cell_of(shape, self.level)
+        self.lod.remove(shape)
+        if key is not None and key not in self.lod.counts[self.level]:
+            self._update_proxy_row(key[1])
+
+    def _refile(self, shape):
+        if self.level == 0:
+            # Nothing is small enough for a proxy
+            self.lod.update(shape)
+            return
+        old = self.lod.cell_of(shape, self.level)
+        self.lod.update(shape)
+        new = self.lod.cell_of(shape, self.level)
+        if old != new:
+            counts = self.lod.counts[self.level]
+            if old is not None and old not in counts:
+                self._update_proxy_row(old[1])
+            if new is not None and counts[new] == 1:
+                self._update_proxy_row(new[1])
+
+    def _update_proxy_row(self, row):
+        """Redraw the proxies of a row after its cells changed"""
+        size = self.lod.sizes[self.level]
+        x1, y1, x2, y2 = self.box
+        if not math.floor(y1 / size) <= row <= math.floor(y2 / size):
+            return
+        counts = self.lod.counts[self.level]
+        self._draw_proxy_row(row, tuple(column for column in range(math.floor(x1 / size), math.floor(x2 / size) + 1)
+                                        if (column, row) in counts))
+
+    def _draw_proxy_row(self, row, columns):
+        """Draw one proxy item per run of adjacent cells of a row holding small shapes"""
+        old_columns, items = self.proxies.pop(row, ((), []))
+        if columns == old_columns:
+            if items:
+                self.proxies[row] = (columns, items)
+            return
+        for item in items:
+            self.canvas.delete(item)
+        items = []
+        size = self.lod.sizes[self.level]
+        start = 0
+        for i, column in enumerate(columns):
+            if i + 1 == len(columns) or columns[i + 1] != column + 1:
+                box = (columns[start] * size, row * size, (column + 1) * size, (row + 1) * size)
+                items.append(self.canvas.create_rectangle(self.viewport.to_screen(box), fill=PROXY_COLOR,
+                                                          outline="", tags=(VIEW_TAG, PROXY_TAG)))
+                start = i + 1
+        if items:
+            # Proxies stand in for the smallest shapes: keep them under the rest
+            self.canvas.tag_lower(PROXY_TAG)
+            if "below" in self.images:
+                self.canvas.tag_lower(self.images["below"][0])
+            self.proxies[row] = (columns, items)
+
+    def _clear(self):
+        """Delete the items of every shape and proxy"""
+        self.canvas.delete(VIEW_TAG)
+        for shape in self.shapes.values():
+            shape.item = None
+        self.shapes.clear()
+        self.stack.clear()
+        self.by_seq.clear()
+        self.proxies.clear()
+
+    def _show(self):
+        """Create the items of the shapes and proxies the viewport shows, and delete the others"""
+        shown = self.lod.query(*self.box, level=self.level)
+        keep = set(shown)
+        for shape in [shape for shape in self.shapes.values() if shape not in keep]:
+            self._delete(shape)
+        for shape in shown:
+            if shape.item is None:
+                self._create(shape)
+        rows = {}
+        for column, row in self.lod.proxies(*self.box, self.level):
+            rows.setdefault(row, []).append(column)
+        for row in [row for row in self.proxies if row not in rows]:
+            self._draw_proxy_row(row, ())
+        for row, columns in rows.items():
+            self._draw_proxy_row(row, tuple(sorted(columns)))
+
+    def _set_live(self):
+        """Give items to the active layer's shapes, if it can be edited, instead of the old live layer's"""
+        live = self.active if self.active is not None and self.active.editable() else None
+        if live is self.live:
+            return
+        if self.live is not None and self.cache is not None:
+            # Its edits were drawn as items, not in its image
+            self.cache.invalidate(self.live)
+        self.live = live
+        self._clear()
+        self.lod = LodIndex()
+        if live is not None:
+            for shape in live.shapes:
+                self.lod.insert(shape)
+        self._show()
+
+    def _cached_layers(self):
+        """Return the visible layers (bottom to top) below and above the live one"""
+        if self.live in self.layers:
+            position = self.layers.index(self.live)
+            below, above = self.layers[:position], self.layers[position + 1:]
+        else:
+            below, above = self.layers, []
+        return [layer for layer in below if layer.visible], [layer for layer in above if layer.visible]
+
+    def _invalidate(self, layer):
+        """Render a layer shown as an image again, once edits pause"""
+        if self.cache is not None:
+            self.cache.invalidate(layer)
+            if layer.visible:
+                self._schedule_images()
+
+    def _schedule_images(self):
+        if self.cache is None:
+            return
+        if self.image_after is not None:
+            self.canvas.after_cancel(self.image_after)
+        self.image_after = self.canvas.after(IMAGE_DELAY_MS, self._update_images)
+
+    def _update_images(self):
+        """Show the layers below and above the live one as the cache's flattened images"""
+        self.image_after = None
+        viewport = self.viewport
+        zoom = viewport.zoom
+        # Whole window pixels around the window, so the images line up with the items
+        x1 = (math.floor(viewport.x * zoom) - IMAGE_MARGIN) / zoom
+        y1 = (math.floor(viewport.y * zoom) - IMAGE_MARGIN) / zoom
+        self.image_box = (x1, y1, x1 + (viewport.width + 2 * IMAGE_MARGIN + 1) / zoom,
+                          y1 + (viewport.height + 2 * IMAGE_MARGIN + 1) / zoom)
+        position = viewport.to_screen(self.image_box[:2])
+        for name, layers in zip(("below", "above"), self._cached_layers()):
+            image = self.cache.flatten(name, layers, zoom, self.image_box)
+            item, old = self.images.pop(name, (None, None))
+            if image is None:
+                if item is not None:
+                    self.canvas.delete(item)
+                continue
+            if item is None:
+                item = self.canvas.create_image(*position, image=image, anchor="nw", tags=IMAGE_TAG)
+                if name == "below":
+                    # The image above is created on top, where it belongs
+                    self.canvas.tag_lower(item)
+            else:
+                self.canvas.coords(item, *position)
+                if image is not old:
+                    self.canvas.itemconfig(item, image=image)
+            self.images[name] = (item, image)
+
+    def refresh(self):
+        """Bring the items up to date with the viewport after a zoom, pan or resize"""
+        zoom, x, y = self.drawn
+        viewport = self.viewport
+        level = self.level
+        self._place()
+        if viewport.zoom != zoom:
+            # Coords and line widths all change: draw everything again. The
+            # layer images are out of scale; they go until they are rendered anew
+            self._clear()
+            self.canvas.delete(IMAGE_TAG)
+            self.images.clear()
+            self.image_box = None
+        elif (viewport.x, viewport.y) != (x, y):
+            self.canvas.move(VIEW_TAG, (x - viewport.x) * zoom, (y - viewport.y) * zoom)
+            self.canvas.move(IMAGE_TAG, (x - viewport.x) * zoom, (y - viewport.y) * zoom)
+        if self.level != level:
+            self.canvas.delete(PROXY_TAG)
+            self.proxies.clear()
+        self._show()
+
+        if self.cache is not None and any(self._cached_layers()):
+            x1, y1, x2, y2 = viewport.visible()
+            box = self.image_box
+            if box is None or not (box[0] <= x1 and box[1] <= y1 and x2 <= box[2] and y2 <= box[3]):
+                self._schedule_images()
+
+    def shape_added(self, shape):
+        if shape.layer is not self.live:
+            self._invalidate(shape.layer)
+            return
+        self._file(shape)
+        self._sync(shape)
+
+    def shape_removed(self, shape):
+        if shape.layer is not self.live:
+            self._invalidate(shape.layer)
+            return
+        self._unfile(shape)
+        if shape.item is not None:
+            self._delete(shape)
+
+    def shape_restored(self, shape):
+        self.shape_added(shape)
+
+    def shape_purged(self, shape):
+        # Removed shapes have no item; nothing is kept for them
+        pass
+
+    def shape_moved(self, shape, dx, dy):
+        if shape.layer is not self.live:
+            self._invalidate(shape.layer)
+            return
+        zoom = self.viewport.zoom
+        self._refile(shape)
+        self._sync(shape, (dx * zoom, dy * zoom))
+
+    def shapes_moved(self, shapes, dx, dy):
+        zoom = self.viewport.zoom
+        move = (dx * zoom, dy * zoom)
+        if len(shapes) == len(self.selected) and self.selected.issuperset(shapes):
+            self.canvas.move(SELECTED_TAG, *move)
+            move = (0, 0)
+        live = self.live
+        for shape in shapes:
+            if shape.layer is not live:
+                self._invalidate(shape.layer)
+                continue
+            self._refile(shape)
+            self._sync(shape, move)
+
+    def shape_restyled(self, shape, style):
+        if shape.layer is not self.live:
+            self._invalidate(shape.layer)
+        elif shape.item is not None:
+            current = self._style(shape)
+            self.canvas.itemconfig(shape.item, **{key: current[key] for key in style if key in current})
+
+    def shape_reshaped(self, shape, kind_changed):
+        if shape.layer is not self.live:
+            self._invalidate(shape.layer)
+            return
+        self._refile(shape)
+        if kind_changed and shape.item is not None:
+            # Canvas items cannot change type: replace the item, in the same stacking slot
+            self._delete(shape)
+        self._sync(shape)
+
+    def layers_reset(self, layers, active):
+        self.layers = list(layers)
+        self.active = active
+        self._set_live()
+        self._schedule_images()
+
+    def layer_added(self, layer, position):
+        # A new layer is empty: nothing to draw yet
+        self.layers.insert(position, layer)
+
+    def layer_removed(self, layer, position):
+        del self.layers[position]
+        if self.cache is not None:
+            self.cache.invalidate(layer)
+        self._schedule_images()
+
+    def layer_moved(self, layer, old, position):
+        del self.layers[old]
+        self.layers.insert(position, layer)
+        self._schedule_images()
+
+    def layer_changed(self, layer, props):
+        if "visible" in props or "locked" in props:
+            self._set_live()
+            self._schedule_images()
+
+    def layer_activated(self, layer):
+        self.active = layer
+        self._set_live()
+        self._schedule_images()
+
+    def highlight(self, shape, on):
+        """Show or clear the selection highlight (a thicker outline)"""
+        if shape.item is not None:
+            width = shape.width * self.viewport.zoom
+            self.canvas.itemconfig(shape.item, width=width + 2 if on else width)
+
+    def select(self, shapes, on):
+        """Add shapes to or take them out of the selection tag, with highlight"""
+        for shape in shapes:
+            self.highlight(shape, on)
+            if on:
+                self.selected.add(shape)
+                if shape.item is not None:
+                    self.canvas.addtag_withtag(SELECTED_TAG, shape.item)
+            else:
+                self.selected.discard(shape)
+                if shape.item is not None:
+                    self.canvas.dtag(shape.item, SELECTED_TAG)
+
+    def drag_selection(self, dx, dy):
+        """Move the selected items on the canvas only, as a drag preview"""
+        zoom = self.viewport.zoom
+        self.canvas.move(SELECTED_TAG, dx * zoom, dy * zoom)
@@ -0,0 +1,88 @@
+"""Frame-paced coalescing of high-rate input events.
+
+Mice and trackpads can report motion hundreds of times per frame. Handlers
+registered through a FrameScheduler only see the latest event of each
+burst: ``submit`` records the event and the pending handlers run together
+from one Tk callback, at most once per frame, so the Tk event queue never
+backs up behind redundant redraws.
+"""
+import time
+
+FRAME_RATE = 60  # handler runs per second at most
+
+
+class FrameScheduler:
+    """Runs each handler at most once per frame with its latest event
+
+    Counts every submitted event as handled, coalesced (superseded by a
+    later event before its frame) or dropped (discarded unhandled).
+    """
+
+    def __init__(self, root, rate=FRAME_RATE):
+        self.root = root
+        self.interval = 1.0 / rate
+        self.pending = {}  # handler -> latest event, in submission order
+        self.after_id = None
+        self.last_run = 0.0
+        self.events = 0
+        self.coalesced = 0
+        self.dropped = 0
+        self.frames = 0
+
+    def set_rate(self, rate):
+        """Change how many times per second handlers may run"""
+        self.interval = 1.0 / rate
+
+    def coalesce(self, handler):
+        """Return an event callback that submits its events to ``handler``"""
+        return lambda event: self.submit(handler, event)
+
+    def submit(self, handler, event):
+        """Have ``handler(event)`` run in the next frame, replacing its pending event"""
+        self.events += 1
+        if handler in self.pending:
+            self.coalesced += 1
+        self.pending[handler] = event
+        if self.after_id is None:
+            delay = self.last_run + self.interval - time.perf_counter()
+            if delay > 0:
+                self.after_id = self.root.after(max(1, int(delay * 1000)), self._run)
+            else:
+                # A frame has passed since the last run: go as soon as Tk is idle
+                self.after_id = self.root.after_idle(self._run)
+
+    def flush(self, handler):
+        """Run ``handler`` now if it has a pending event (e.g. before a button release)"""
+        if handler in self.pending:
+            handler(self.pending.pop(handler))
+        self._cancel_if_idle()
+
+    def discard(self, handler):
+        """Forget the pending event of ``handler`` without running it"""
+        if self.pending.pop(handler, None) is not None:
+            self.dropped += 1
+        self._cancel_if_idle()
+
+    def _cancel_if_idle(self):
+        if not self.pending and self.after_id is not None:
+            self.root.after_cancel(self.after_id)
+            self.after_id = None
+
+    def _run(self):
+        self.after_id = None
+        self.last_run = time.perf_counter()
+        self.frames += 1
+        pending, self.pending = self.pending, {}
+        for handler, event in pending.items():
+            handler(event)
+
+    def report(self):
+        """Return event counts since startup"""
+        return {
+            "events": self.events,
+            "handled": self.events - self.coalesced - self.dropped - len(self.pending),
+            "coalesced": self.coalesced,
+            "dropped": self.dropped,
+            "frames": self.frames,
+            "rate": round(1.0 / self.interval),
+        }
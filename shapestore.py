@@ -0,0 +1,166 @@
+"""Columnar NumPy storage for large numbers of shapes.
+
+A ShapeStore keeps one row per shape in flat arrays instead of one Python
+object per shape:
+
+- ``kinds``: uint8 index into ``SHAPE_TYPES``
+- ``styles``: int32 index into the ``style_table`` of (outline, fill, width)
+- ``offsets``: int64, shape ``i`` owns ``coords[offsets[i]:offsets[i + 1]]``
+  (stores memory-mapped from a .cgd file may use narrower, read-only arrays)
+- ``coords``: one contiguous float32 buffer of x, y pairs (float64 can be
+  requested where coordinates must round-trip exactly, e.g. for undo)
+
+It is used for bulk work on whole drawings and offers vectorized operations
+such as translating every shape, computing all bounding boxes or filtering
+by type. In the app a store holds:
+
+- the before and after of the undo step of File > Open or a recovery
+  (ReplaceCommand), at about 50 bytes a shape instead of a Shape object each
+- a drawing in the .cgd format, which is memory-mapped straight into one
+- what a PNG export, the batch renderer and a cached layer image render
+
+The live Scene is not backed by a store: the index, the view, the history
+and the journal follow each shape by identity, so it keeps one Shape object
+per shape (see scene.py for how those share their styles).
+"""
+import numpy as np
+
+from scene import SHAPE_TYPES, Shape
+
+KIND_CODES = {kind: code for code, kind in enumerate(SHAPE_TYPES)}
+COORD_DTYPE = np.float32
+
+
+class ShapeStore:
+    """Shapes stored column by column"""
+
+    def __init__(self, kinds, styles, offsets, coords, style_table):
+        self.kinds = kinds
+        self.styles = styles
+        self.offsets = offsets
+        self.coords = coords
+        self.style_table = style_table
+
+    @classmethod
+    def empty(cls, dtype=COORD_DTYPE):
+        return cls(np.zeros(0, np.uint8), np.zeros(0, np.int32), np.zeros(1, np.int64),
+                   np.zeros(0, dtype), [])
+
+    @classmethod
+    def _build(cls, rows, dtype):
+        """Build a store from (kind, coords, outline, fill, width) rows"""
+        style_ids = {}
+        kinds = []
+        styles = []
+        lengths = []
+        flat = []
+        for kind, coords, outline, fill, width in rows:
+            kinds.append(KIND_CODES[kind])
+            styles.append(style_ids.setdefault((outline, fill, float(width)), len(style_ids)))
+            lengths.append(len(coords))
+            flat.extend(coords)
+        offsets = np.zeros(len(kinds) + 1, np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        return cls(np.array(kinds, np.uint8), np.array(styles, np.int32), offsets,
+                   np.array(flat, dtype), list(style_ids))
+
+    @classmethod
+    def from_rows(cls, rows, dtype=COORD_DTYPE):
+        """Build a store from (kind, coords, outline, fill, width) tuples"""
+        return cls._build(rows, dtype)
+
+    @classmethod
+    def from_shapes(cls, shapes, dtype=COORD_DTYPE):
+        return cls._build(((s.kind, s.coords, s.outline, s.fill, s.width) for s in shapes), dtype)
+
+    @classmethod
+    def from_records(cls, records, dtype=COORD_DTYPE):
+        """Build a store from File > Save records ({"type", "coords", "options"})"""
+        return cls._build(((r["type"], r["coords"], r["options"].get("outline", ""),
+                            r["options"].get("fill", ""), r["options"].get("width", 1.0))
+                           for r in records), dtype)
+
+    def __len__(self):
+        return len(self.kinds)
+
+    @property
+    def nbytes(self):
+        """Memory held by the arrays (the style table is shared and small)"""
+        return self.kinds.nbytes + self.styles.nbytes + self.offsets.nbytes + self.coords.nbytes
+
+    def row(self, index):
+        """Return (kind, coords, outline, fill, width) for one shape"""
+        outline, fill, width = self.style_table[self.styles[index]]
+        coords = self.coords[self.offsets[index]:self.offsets[index + 1]].tolist()
+        return SHAPE_TYPES[self.kinds[index]], tuple(coords), outline, fill, width
+
+    def rows(self):
+        """Yield (kind, coords, outline, fill, width) for every shape, in order"""
+        # Convert each column to Python once instead of once per shape
+        coords = self.coords.tolist()
+        offsets = self.offsets.tolist()
+        table = self.style_table
+        for i, (kind, style) in enumerate(zip(self.kinds.tolist(), self.styles.tolist())):
+            outline, fill, width = table[style]
+            yield SHAPE_TYPES[kind], coords[offsets[i]:offsets[i + 1]], outline, fill, width
+
+    def shape(self, index):
+        kind, coords, outline, fill, width = self.row(index)
+        return Shape(kind, coords, outline=outline, fill=fill, width=width)
+
+    def to_shapes(self):
+        return [Shape(kind, coords, outline=outline, fill=fill, width=width)
+                for kind, coords, outline, fill, width in self.rows()]
+
+    def to_records(self):
+        """Return File > Save records, in store order"""
+        return [shape.to_dict() for shape in self.to_shapes()]
+
+    def _positions(self, indices):
+        """Return the coords positions owned by the given rows, and each row's length"""
+        # int64 even when the offsets are a narrower memory-mapped type
+        starts = self.offsets[indices].astype(np.int64)
+        lengths = self.offsets[indices + 1] - starts
+        ends = np.cumsum(lengths)
+        positions = np.arange(ends[-1] if len(ends) else 0) + np.repeat(starts - (ends - lengths), lengths)
+        return positions, lengths
+
+    def select(self, indices):
+        """Return a new store holding only the given rows"""
+        indices = np.asarray(indices, np.int64)
+        positions, lengths = self._positions(indices)
+        offsets = np.zeros(len(indices) + 1, np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        return ShapeStore(self.kinds[indices], self.styles[indices], offsets,
+                          self.coords[positions], self.style_table)
+
+    def filter_kind(self, kind):
+        """Return the row indices of all shapes of one type"""
+        return np.flatnonzero(self.kinds == KIND_CODES[kind])
+
+    def translate_all(self, dx, dy):
+        """Move every shape by (dx, dy) in place"""
+        self.coords[0::2] += dx
+        self.coords[1::2] += dy
+
+    def translate(self, indices, dx, dy):
+        """Move the given rows by (dx, dy) in place"""
+        positions, lengths = self._positions(np.asarray(indices, np.int64))
+        self.coords[positions[0::2]] += dx
+        self.coords[positions[1::2]] += dy
+
+    def bboxes(self):
+        """Return an (n, 4) array of x1, y1, x2, y2 for every shape, of the coords' dtype"""
+        if not len(self):
+            return np.zeros((0, 4), self.coords.dtype)
+        points = self.coords.reshape(-1, 2)
+        starts = self.offsets[:-1] // 2
+        return np.hstack((np.minimum.reduceat(points, starts, axis=0),
+                          np.maximum.reduceat(points, starts, axis=0)))
+
+    def bounds(self):
+        """Return the bounding box of the whole drawing, or None if empty"""
+        if not len(self):
+            return None
+        return (float(self.coords[0::2].min()), float(self.coords[1::2].min()),
+                float(self.coords[0::2].max()), float(self.coords[1::2].max()))
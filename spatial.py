@@ -0,0 +1,481 @@
+"""Uniform grid index over shape bounding boxes.
+
+The Scene keeps a GridIndex up to date as shapes are added, moved, reshaped
+and removed, so hit-testing and region queries run against the drawing data
+without asking Tk. Each shape is registered in every grid cell its bounding
+box touches; shapes spanning more than ``MAX_CELLS`` cells are kept in a
+short separate list that every query checks. A cell keeps its shapes in
+insertion order, which is mostly stacking order: it is sorted again only
+when a shape is inserted below the cell's top and a click lands in it, so
+``shape_at`` checks the cell from the top down and stops at the first hit.
+
+Queries:
+
+- ``query_point``/``shape_at``: shapes under a point, using the shape's
+  actual geometry and line width like the Tk canvas does
+- ``query_rect``: shapes whose bounding box overlaps or lies inside a box
+- ``nearest``: the k shapes whose bounding boxes are nearest to a point
+
+A LodIndex files the same shapes by size instead, so a view can find the
+shapes large enough to draw at a zoom level without visiting the small
+ones, and count the small ones per area to draw proxies in their place.
+"""
+import heapq
+import math
+from operator import attrgetter
+
+CELL_SIZE = 64.0
+MAX_CELLS = 256
+HIT_TOLERANCE = 2.0  # pixels of slack around a shape's stroke, like canvas closeenough
+LOD_BASE = 16.0  # cell size of the finest LodIndex level
+LOD_LEVELS = 16  # levels of cells doubling in size, up to 16 * 2**15
+
+
+def _segment_distance(px, py, x1, y1, x2, y2):
+    dx = x2 - x1
+    dy = y2 - y1
+    length = dx * dx + dy * dy
+    t = 0.0 if length == 0 else max(0.0, min(1.0, ((px - x1) * dx + (py - y1) * dy) / length))
+    return math.hypot(px - (x1 + t * dx), py - (y1 + t * dy))
+
+
+def _near_path(coords, x, y, reach, closed):
+    points = list(zip(coords[0::2], coords[1::2]))
+    if closed:
+        points.append(points[0])
+    if len(points) == 1:
+        return math.hypot(x - points[0][0], y - points[0][1]) <= reach
+    return any(_segment_distance(x, y, x1, y1, x2, y2) <= reach
+               for (x1, y1), (x2, y2) in zip(points, points[1:]))
+
+
+def _inside_polygon(coords, x, y):
+    inside = False
+    xs = coords[0::2]
+    ys = coords[1::2]
+    j = len(xs) - 1
+    for i in range(len(xs)):
+        if (ys[i] > y) != (ys[j] > y) and x < (xs[j] - xs[i]) * (y - ys[i]) / (ys[j] - ys[i]) + xs[i]:
+            inside = not inside
+        j = i
+    return inside
+
+
+def _inside_ellipse(cx, cy, rx, ry, x, y):
+    if rx <= 0 or ry <= 0:
+        return False
+    return ((x - cx) / rx) ** 2 + ((y - cy) / ry) ** 2 <= 1.0
+
+
+def hit_test(shape, x, y, tolerance=HIT_TOLERANCE):
+    """Return True if (x, y) is on the shape
+
+    Filled shapes are hit anywhere inside; lines and unfilled shapes only
+    within half the line width plus ``tolerance`` of their stroke.
+    """
+    reach = shape.width / 2 + tolerance
+    coords = shape.coords
+    if shape.kind == "line":
+        return _near_path(coords, x, y, reach, closed=False)
+    if shape.kind == "polygon":
+        return (bool(shape.fill) and _inside_polygon(coords, x, y)) or _near_path(coords, x, y, reach, closed=True)
+
+    x1, x2 = sorted(coords[0::2])
+    y1, y2 = sorted(coords[1::2])
+    if not (x1 - reach <= x <= x2 + reach and y1 - reach <= y <= y2 + reach):
+        return False
+    if shape.kind == "rectangle":
+        inner = x1 + reach < x < x2 - reach and y1 + reach < y < y2 - reach
+    else:
+        cx, cy, rx, ry = (x1 + x2) / 2, (y1 + y2) / 2, (x2 - x1) / 2, (y2 - y1) / 2
+        if not _inside_ellipse(cx, cy, rx + reach, ry + reach, x, y):
+            return False
+        inner = _inside_ellipse(cx, cy, rx - reach, ry - reach, x, y)
+    return bool(shape.fill) or not inner
+
+
+def _box_distance(box, x, y):
+    x1, y1, x2, y2 = box
+    return math.hypot(max(x1 - x, 0.0, x - x2), max(y1 - y, 0.0, y - y2))
+
+
+class GridIndex:
+    """Spatial index of shapes by bounding box"""
+
+    def __init__(self, cell_size=CELL_SIZE):
+        self.cell_size = cell_size
+        self.cells = {}  # (column, row) -> dict of shapes (to None), in insertion order
+        self.unsorted = set()  # cells whose shapes are not in stacking order
+        self.boxes = {}  # shape -> bounding box
+        self.large = set()  # shapes spanning more than MAX_CELLS cells
+        self.extent = None  # (c1, r1, c2, r2) of every cell ever used
+        self.max_width = 0.0  # widest line width ever inserted
+
+    def __len__(self):
+        return len(self.boxes)
+
+    def __contains__(self, shape):
+        return shape in self.boxes
+
+    def _span(self, x1, y1, x2, y2):
+        size = self.cell_size
+        return (math.floor(x1 / size), math.floor(y1 / size),
+                math.floor(x2 / size), math.floor(y2 / size))
+
+    def _keys(self, span):
+        c1, r1, c2, r2 = span
+        return [(c, r) for c in range(c1, c2 + 1) for r in range(r1, r2 + 1)]
+
+    def insert(self, shape):
+        box = shape.bbox()
+        self.boxes[shape] = box
+        self.max_width = max(self.max_width, shape.width)
+        span = self._span(*box)
+        c1, r1, c2, r2 = span
+        if (c2 - c1 + 1) * (r2 - r1 + 1) > MAX_CELLS:
+            self.large.add(shape)
+            return
+        cells = self.cells
+        seq = shape.seq
+        for key in self._keys(span):
+            cell = cells.get(key)
+            if cell is None:
+                cell = cells[key] = {}
+            elif seq < next(reversed(cell)).seq:
+                self.unsorted.add(key)
+            cell[shape] = None
+        if self.extent is None:
+            self.extent = span
+        else:
+            e1, f1, e2, f2 = self.extent
+            self.extent = (min(e1, c1), min(f1, r1), max(e2, c2), max(f2, r2))
+
+    def remove(self, shape):
+        box = self.boxes.pop(shape, None)
+        if box is None:
+            return
+        if shape in self.large:
+            self.large.discard(shape)
+            return
+        cells = self.cells
+        for key in self._keys(self._span(*box)):
+            cell = cells[key]
+            del cell[shape]
+            if not cell:
+                del cells[key]
+                self.unsorted.discard(key)
+
+    def update(self, shape):
+        """Re-register a shape whose coords or width changed"""
+        old = self.boxes.get(shape)
+        if old is None:
+            return
+        self.max_width = max(self.max_width, shape.width)
+        box = shape.bbox()
+        if shape not in self.large and self._span(*box) == self._span(*old):
+            self.boxes[shape] = box
+            return
+        self.remove(shape)
+        self.insert(shape)
+
+    def _candidates(self, x1, y1, x2, y2):
+        """Return the shapes registered in the cells overlapping a box"""
+        found = set(self.large)
+        span = self._span(x1, y1, x2, y2)
+        c1, r1, c2, r2 = span
+        cells = self.cells
+        if (c2 - c1 + 1) * (r2 - r1 + 1) > len(cells):
+            # Cheaper to walk the cells in use than every cell of a huge box
+            for (c, r), cell in cells.items():
+                if c1 <= c <= c2 and r1 <= r <= r2:
+                    found.update(cell)
+            return found
+        for key in self._keys(span):
+            cell = cells.get(key)
+            if cell:
+                found.update(cell)
+        return found
+
+    def query_rect(self, x1, y1, x2, y2, inside=False):
+        """Return the shapes whose bounding box overlaps the box, bottom to top
+
+        With ``inside`` only shapes whose bounding box lies entirely within
+        the box are returned.
+        """
+        x1, x2 = min(x1, x2), max(x1, x2)
+        y1, y2 = min(y1, y2), max(y1, y2)
+        boxes = self.boxes
+        result = []
+        for shape in self._candidates(x1, y1, x2, y2):
+            bx1, by1, bx2, by2 = boxes[shape]
+            if inside:
+                if x1 <= bx1 and bx2 <= x2 and y1 <= by1 and by2 <= y2:
+                    result.append(shape)
+            elif bx1 <= x2 and x1 <= bx2 and by1 <= y2 and y1 <= by2:
+                result.append(shape)
+        result.sort(key=attrgetter("seq"))
+        return result
+
+    def query_point(self, x, y, tolerance=HIT_TOLERANCE):
+        """Return the shapes drawn at (x, y), topmost first"""
+        boxes = self.boxes
+        hits = []
+        # Candidates must be found within the widest possible reach of the point
+        reach = self.max_width / 2 + tolerance
+        for shape in self._candidates(x - reach, y - reach, x + reach, y + reach):
+            reach = shape.width / 2 + tolerance
+            bx1, by1, bx2, by2 = boxes[shape]
+            if bx1 - reach <= x <= bx2 + reach and by1 - reach <= y <= by2 + reach \
+                    and hit_test(shape, x, y, tolerance):
+                hits.append(shape)
+        hits.sort(key=attrgetter("seq"), reverse=True)
+        return hits
+
+    def shape_at(self, x, y, tolerance=HIT_TOLERANCE):
+        """Return the topmost shape at (x, y), or None
+
+        Only the shapes above the best hit so far are checked, from the top
+        of each cell down, so a click costs about the same however many
+        shapes pile up under it.
+        """
+        boxes = self.boxes
+        best = None
+        top = -1
+
+        def hit(shape):
+            reach = shape.width / 2 + tolerance
+            bx1, by1, bx2, by2 = boxes[shape]
+            return bx1 - reach <= x <= bx2 + reach and by1 - reach <= y <= by2 + reach \
+                and hit_test(shape, x, y, tolerance)
+
+        for shape in self.large:
+            if shape.seq > top and hit(shape):
+                best, top = shape, shape.seq
+        reach = self.max_width / 2 + tolerance
+        cells = self.cells
+        c1, r1, c2, r2 = span = self._span(x - reach, y - reach, x + reach, y + reach)
+        if (c2 - c1 + 1) * (r2 - r1 + 1) > len(cells):
+            keys = [(c, r) for c, r in cells if c1 <= c <= c2 and r1 <= r <= r2]
+        else:
+            keys = self._keys(span)
+        for key in keys:
+            cell = cells.get(key)
+            if not cell:
+                continue
+            if key in self.unsorted:
+                cell = cells[key] = dict.fromkeys(sorted(cell, key=attrgetter("seq")))
+                self.unsorted.discard(key)
+            for shape in reversed(cell):
+                if shape.seq <= top:
+                    break
+                if hit(shape):
+                    best, top = shape, shape.seq
+                    break
+        return best
+
+    def nearest(self, x, y, k=1):
+        """Return up to ``k`` shapes nearest to (x, y) by bounding box, nearest first"""
+        if k <= 0 or not self.boxes:
+            return []
+        boxes = self.boxes
+        seen = set()
+        best = []  # heap of (-distance, seq, shape) holding the k nearest so far
+
+        def consider(shapes):
+            for shape in shapes:
+                if shape in seen:
+                    continue
+                seen.add(shape)
+                entry = (-_box_distance(boxes[shape], x, y), shape.seq, shape)
+                if len(best) < k:
+                    heapq.heappush(best, entry)
+                elif entry > best[0]:
+                    heapq.heapreplace(best, entry)
+
+        consider(self.large)
+        if self.extent is not None:
+            size = self.cell_size
+            cx, cy = math.floor(x / size), math.floor(y / size)
+            e1, f1, e2, f2 = self.extent
+            last = max(cx - e1, e2 - cx, cy - f1, f2 - cy, 0)
+            cells = self.cells
+            for ring in range(last + 1):
+                if (2 * ring + 1) ** 2 > 4 * len(cells):
+                    # The rings have grown larger than the drawing: check the rest directly
+                    consider(boxes)
+                    break
+                if ring == 0:
+                    keys = [(cx, cy)]
+                else:
+                    keys = [(cx + i, cy + j) for i in range(-ring, ring + 1) for j in (-ring, ring)]
+                    keys += [(cx + i, cy + j) for i in (-ring, ring) for j in range(-ring + 1, ring)]
+                for key in keys:
+                    cell = cells.get(key)
+                    if cell:
+                        consider(cell)
+                # Every shape not seen yet lies outside the searched square
+                if len(best) == k:
+                    margin = min(x - (cx - ring) * size, (cx + ring + 1) * size - x,
+                                 y - (cy - ring) * size, (cy + ring + 1) * size - y)
+                    if -best[0][0] <= margin:
+                        break
+        return [shape for distance, seq, shape in sorted(best, reverse=True)]
+
+
+class LodIndex:
+    """Shapes filed by size, for drawing with level of detail
+
+    Level k files the shapes whose bounding box is at most ``base * 2**k``
+    wide and high under the level-k cell holding the box's center, so a
+    shape reaches at most half a cell into the neighbouring cells. Shapes
+    too large for the top level are kept in ``huge``. ``counts[k]`` counts,
+    per level-k cell, the shapes of the levels below k centered in it: when
+    level k holds the smallest shapes drawn in full, those cells stand in
+    for everything smaller.
+    """
+
+    def __init__(self, base=LOD_BASE, levels=LOD_LEVELS):
+        self.base = base
+        self.sizes = [base * 2 ** k for k in range(levels)]
+        self.cells = [{} for _ in range(levels)]  # per level: (column, row) -> set of shapes
+        self.counts = [{} for _ in range(levels)]  # per level: (column, row) -> smaller shapes in it
+        self.huge = set()
+        self.entries = {}  # shape -> (level, box, column, row); column and row are level 0 cells
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, shape):
+        return shape in self.entries
+
+    def _entry(self, shape):
+        box = x1, y1, x2, y2 = shape.bbox()
+        size = max(x2 - x1, y2 - y1)
+        level = 0
+        while level < len(self.sizes) and self.sizes[level] < size:
+            level += 1
+        return (level, box, math.floor((x1 + x2) / 2 / self.base), math.floor((y1 + y2) / 2 / self.base))
+
+    def level_of(self, shape):
+        """Return the level a shape is filed at (``len(sizes)`` for huge shapes)"""
+        return self.entries[shape][0]
+
+    def level_for(self, size):
+        """Return the lowest level whose shapes may be ``size`` or larger"""
+        level = 0
+        while level < len(self.sizes) - 1 and self.sizes[level] < size:
+            level += 1
+        return level
+
+    def box_of(self, shape):
+        return self.entries[shape][1]
+
+    def cell_of(self, shape, level):
+        """Return the level cell counting a shape filed below ``level``, or None"""
+        shape_level, box, column, row = self.entries[shape]
+        if shape_level >= level:
+            return None
+        return column >> level, row >> level
+
+    def cell_box(self, level, key):
+        """Return the (x1, y1, x2, y2) area of a level cell"""
+        size = self.sizes[level]
+        return key[0] * size, key[1] * size, (key[0] + 1) * size, (key[1] + 1) * size
+
+    def insert(self, shape):
+        entry = self.entries[shape] = self._entry(shape)
+        level, box, column, row = entry
+        if level == len(self.sizes):
+            self.huge.add(shape)
+            return
+        key = (column >> level, row >> level)
+        cell = self.cells[level].get(key)
+        if cell is None:
+            cell = self.cells[level][key] = set()
+        cell.add(shape)
+        self._count(level, column, row, 1)
+
+    def remove(self, shape):
+        entry = self.entries.pop(shape, None)
+        if entry is None:
+            return
+        level, box, column, row = entry
+        if level == len(self.sizes):
+            self.huge.discard(shape)
+            return
+        key = (column >> level, row >> level)
+        cell = self.cells[level][key]
+        cell.discard(shape)
+        if not cell:
+            del self.cells[level][key]
+        self._count(level, column, row, -1)
+
+    def _count(self, level, column, row, change, until=None):
+        for k in range(level + 1, len(self.sizes)):
+            key = (column >> k, row >> k)
+            if until is not None and key == (until[0] >> k, until[1] >> k):
+                break  # the same cell here and at every level above
+            counts = self.counts[k]
+            count = counts.get(key, 0) + change
+            if count:
+                counts[key] = count
+            else:
+                del counts[key]
+
+    def update(self, shape):
+        """Re-file a shape whose coords changed"""
+        old = self.entries.get(shape)
+        if old is None:
+            return
+        new = self._entry(shape)
+        if new[0] != old[0] or new[0] == len(self.sizes):
+            self.remove(shape)
+            self.insert(shape)
+            return
+        self.entries[shape] = new
+        level, box, column, row = new
+        if (column >> level, row >> level) != (old[2] >> level, old[3] >> level):
+            cells = self.cells[level]
+            key = (old[2] >> level, old[3] >> level)
+            cells[key].discard(shape)
+            if not cells[key]:
+                del cells[key]
+            cells.setdefault((column >> level, row >> level), set()).add(shape)
+        if (column, row) != (old[2], old[3]):
+            # Moving between cells only changes the counts up to the level the two cells merge
+            self._count(level, old[2], old[3], -1, until=(column, row))
+            self._count(level, column, row, 1, until=(old[2], old[3]))
+
+    def _keys(self, table, level, x1, y1, x2, y2):
+        """Return the keys of a level's table whose cells overlap a box"""
+        size = self.sizes[level]
+        c1, r1 = math.floor(x1 / size), math.floor(y1 / size)
+        c2, r2 = math.floor(x2 / size), math.floor(y2 / size)
+        if (c2 - c1 + 1) * (r2 - r1 + 1) > len(table):
+            return [key for key in table if c1 <= key[0] <= c2 and r1 <= key[1] <= r2]
+        return [(c, r) for c in range(c1, c2 + 1) for r in range(r1, r2 + 1) if (c, r) in table]
+
+    def query(self, x1, y1, x2, y2, level=0):
+        """Return the shapes filed at ``level`` or above whose bounding box overlaps a box, bottom to top"""
+        entries = self.entries
+        found = []
+        for k in range(level, len(self.sizes)):
+            cells = self.cells[k]
+            if not cells:
+                continue
+            # Shapes reach half a cell beyond the cell they are filed under
+            reach = self.sizes[k] / 2
+            for key in self._keys(cells, k, x1 - reach, y1 - reach, x2 + reach, y2 + reach):
+                found.extend(cells[key])
+        found.extend(self.huge)
+        result = []
+        for shape in found:
+            bx1, by1, bx2, by2 = entries[shape][1]
+            if bx1 <= x2 and x1 <= bx2 and by1 <= y2 and y1 <= by2:
+                result.append(shape)
+        result.sort(key=attrgetter("seq"))
+        return result
+
+    def proxies(self, x1, y1, x2, y2, level):
+        """Return the level cells overlapping a box that hold shapes filed below ``level``"""
+        return self._keys(self.counts[level], level, x1, y1, x2, y2)
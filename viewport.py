@@ -0,0 +1,56 @@
+"""The visible part of the drawing: zoom and pan.
+
+Shapes keep their drawing (world) coordinates; a Viewport maps them to the
+canvas window (screen) and back. The window's top-left corner shows world
+point (``x``, ``y``) and one world unit is ``zoom`` pixels, so the initial
+viewport shows the drawing exactly as an unzoomed canvas would.
+"""
+ZOOM_MIN = 1 / 256
+ZOOM_MAX = 64.0
+ZOOM_STEP = 1.25  # zoom factor of one mouse wheel notch
+
+
+class Viewport:
+    """Maps drawing coordinates to the canvas window and back"""
+
+    def __init__(self, width=800, height=600):
+        self.width = width
+        self.height = height
+        self.zoom = 1.0
+        self.x = 0.0
+        self.y = 0.0
+
+    def to_world(self, sx, sy):
+        """Return the drawing point shown at window pixel (sx, sy)"""
+        return self.x + sx / self.zoom, self.y + sy / self.zoom
+
+    def to_screen(self, coords):
+        """Return flat x, y, x, y... drawing coords as window coords"""
+        zoom = self.zoom
+        x, y = self.x, self.y
+        return [(c - x) * zoom if i % 2 == 0 else (c - y) * zoom for i, c in enumerate(coords)]
+
+    def visible(self):
+        """Return the (x1, y1, x2, y2) drawing box the window shows"""
+        return self.x, self.y, self.x + self.width / self.zoom, self.y + self.height / self.zoom
+
+    def resize(self, width, height):
+        self.width = width
+        self.height = height
+
+    def pan(self, dx, dy):
+        """Scroll the drawing by (dx, dy) window pixels, as when it is dragged"""
+        self.x -= dx / self.zoom
+        self.y -= dy / self.zoom
+
+    def zoom_at(self, sx, sy, factor):
+        """Zoom by ``factor`` keeping the drawing point under window pixel (sx, sy) in place"""
+        wx, wy = self.to_world(sx, sy)
+        self.zoom = min(max(self.zoom * factor, ZOOM_MIN), ZOOM_MAX)
+        self.x = wx - sx / self.zoom
+        self.y = wy - sy / self.zoom
+
+    def reset(self):
+        """Go back to the unzoomed view of the drawing's origin"""
+        self.zoom = 1.0
+        self.x = self.y = 0.0